@@ -4,6 +4,7 @@
 
 from mesa import Agent
 import numpy as np
+from agents.visitor import Visitor
 
 class Exhibit(Agent):
     """
@@ -16,16 +17,30 @@ class Exhibit(Agent):
         # model: シミュレーションモデル
         super().__init__(unique_id, model)
         self.pos = pos  # 展示物の位置
-        self.visitor_watch_times = {}  # visitor_id: 累積滞在時間
+        self._visitor_watch_times = {}  # visitor_id: 累積滞在時間（モデル側で集計しない場合）
+
+    @property
+    def visitor_watch_times(self):
+        # visitor_id: 累積滞在時間。モデルに集計器があればその行列から作る
+        accumulator = getattr(self.model, 'watch_times', None)
+        if accumulator is not None and self in accumulator.exhibit_index:
+            return accumulator.watch_times_for(self)
+        return self._visitor_watch_times
+
+    @visitor_watch_times.setter
+    def visitor_watch_times(self, value):
+        self._visitor_watch_times = value
 
     def step(self):
+        # 視聴時間はモデルの集計器が全展示物まとめて数える（Museum は展示物をスケジュールに入れない）
+        if getattr(self.model, 'watch_times', None) is not None:
+            return
         # 展示物は毎ステップ、見学者の視野内にいるかをカウント
-        for agent in self.model.schedule.agents:
-            if agent.__class__.__name__.lower().startswith('visitor'):
-                if self.is_visitor_watching(agent):
-                    vid = getattr(agent, 'unique_id', None)
-                    if vid is not None:
-                        self.visitor_watch_times[vid] = self.visitor_watch_times.get(vid, 0) + 1
+        for agent in self.model.schedule.agents_of(Visitor):
+            if self.is_visitor_watching(agent):
+                vid = getattr(agent, 'unique_id', None)
+                if vid is not None:
+                    self._visitor_watch_times[vid] = self._visitor_watch_times.get(vid, 0) + 1
 
     def is_visitor_watching(self, visitor):
         # 視野角・距離・視線方向で判定（仮: 120度, 2.5セル以内, cosθ>0.5）
@@ -1,4 +1,3 @@
-import heapq
 import numpy as np
 from mesa import Agent
 from enum import Enum, auto
@@ -6,6 +5,7 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'event')))
 from event.guide_event import GuideEvent
+from event.event_bus import EventType
 
 # 案内人の行動状態を明確に定義
 class GuideState(Enum):
@@ -28,12 +28,31 @@ class Guide(Agent):
         self.current_path = []
         self.path_step = 0
         
-        self.state = GuideState.PLANNING
+        self._state = GuideState.PLANNING
         self.wait_steps = 0
         self.wait_duration = 100  # 目的地での待機ステップ数
         self.gaze_direction = np.array([1.0, 0.0])
         self.current_event = None
 
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, value):
+        # 状態が変わったら、この案内人を待って休止している見学者を起こし、出発・到着をイベントバスに流す
+        changed = value != self._state
+        self._state = value
+        if changed:
+            self.model.schedule.signal(self)
+            if value == GuideState.MOVING:
+                self._publish(EventType.GUIDE_DEPARTED)
+            elif value == GuideState.WAITING:
+                self._publish(EventType.GUIDE_ARRIVED)
+
+    def _publish(self, event_type):
+        self.model.events.publish(event_type, self, self.pos, self.model.schedule.steps)
+
     @property
     def waiting(self):
         """
@@ -66,21 +85,19 @@ class Guide(Agent):
             if self.current_event is None:
                 self.current_event = GuideEvent(self.pos)
                 self.current_event.start()
-                # 見学者にもイベントを通知
-                for agent in self.model.schedule.agents:
-                    if hasattr(agent, "on_guide_event"):
-                        agent.on_guide_event(self.pos)
+                self._publish(EventType.EXPLANATION_STARTED)
             self.wait_steps += 1
             if self.wait_steps >= self.wait_duration:
                 self.wait_steps = 0
                 if self.current_event:
                     self.current_event.end()
                     self.current_event = None
+                    self._publish(EventType.EXPLANATION_ENDED)
                 self.state = GuideState.PLANNING # 待機完了後、次の計画へ
 
         elif self.state == GuideState.COMPLETED:
-            # 全て完了したら何もしない
-            pass
+            # 全て完了したら何もしない（以後は休止する）
+            self.model.schedule.sleep(self)
 
     def _plan_next_route(self):
         """現在位置から、次に訪問すべき目的地への経路を計画する"""
@@ -142,41 +159,9 @@ class Guide(Agent):
             self.state = GuideState.WAITING
 
     def _astar_search(self, start, end):
-        """A*探索アルゴリズム（障害物回避）"""
-        start_node = tuple(map(round, start))
-        end_node = tuple(map(round, end))
-        
-        open_set = []
-        heapq.heappush(open_set, (0, start_node))
-        came_from = {}
-        g_score = {start_node: 0}
-        f_score = {start_node: np.linalg.norm(np.array(start_node) - np.array(end_node))}
-        
-        while open_set:
-            _, current = heapq.heappop(open_set)
-            
-            if np.linalg.norm(np.array(current) - np.array(end_node)) < 1.0:
-                path = []
-                while current in came_from:
-                    path.append(current)
-                    current = came_from[current]
-                path.append(start_node)
-                # Mesaはfloat座標で動作するため、最終的なパスもfloatに戻す
-                return [tuple(map(float, p)) for p in path[::-1]]
-
-            # 8方向の隣接ノードをチェック
-            for dx, dy in [(0,1), (0,-1), (1,0), (-1,0), (1,1), (1,-1), (-1,1), (-1,-1)]:
-                neighbor = (current[0] + dx, current[1] + dy)
-                
-                if self.model.grid.out_of_bounds(neighbor) or self.model.grid.is_obstacle(neighbor):
-                    continue
-                
-                tentative_g_score = g_score[current] + np.linalg.norm(np.array(current) - np.array(neighbor))
-                
-                if neighbor not in g_score or tentative_g_score < g_score.get(neighbor, float('inf')):
-                    came_from[neighbor] = current
-                    g_score[neighbor] = tentative_g_score
-                    f_score[neighbor] = tentative_g_score + np.linalg.norm(np.array(neighbor) - np.array(end_node))
-                    if neighbor not in [i[1] for i in open_set]:
-                        heapq.heappush(open_set, (f_score[neighbor], neighbor))
-        return None # 経路が見つからない場合
\ No newline at end of file
+        """A*探索アルゴリズム（障害物回避）。探索はモデル共有の経路探索サービスに委譲"""
+        path = self.model.path_planner.find_path(start, end, tolerance=1.0)
+        if path is None:
+            return None # 経路が見つからない場合
+        # Mesaはfloat座標で動作するため、最終的なパスもfloatに戻す
+        return [tuple(map(float, p)) for p in path]
@@ -1,8 +1,15 @@
 import numpy as np
-import random
-import heapq
 from mesa import Agent
 from agents.guide import GuideState
+from event.event_bus import EventType
+
+# 待機中の見学者の休止（skip_dormant 使用時）
+SETTLE_STEPS = 20  # 休止までに留まるステップ数
+SETTLE_RADIUS = 0.5  # 留まっているとみなす移動範囲
+SETTLE_GUIDE_DIST = 3.0  # 案内人からこの距離以内でだけ休止する
+WAKE_RADIUS = 0.7  # 他のエージェントがこの距離まで近づいたら起きる
+
+MAX_FORCE = 2.5  # 操舵力の上限（障害物反発場の事前計算もこの値で上限処理する）
 
 class Visitor(Agent):
     """
@@ -15,8 +22,8 @@ class Visitor(Agent):
         self.guide = guide
         
         # --- 物理的なパラメータ (論文等を参考に調整) ---
-        self.max_speed = (0.23 + random.uniform(-0.01, 0.01)) if max_speed is None else max_speed  # さらに速く
-        self.max_force = 2.5  # さらに強く
+        self.max_speed = (0.23 + model.random.uniform(-0.01, 0.01)) if max_speed is None else max_speed  # さらに速く
+        self.max_force = MAX_FORCE  # さらに強く
         self.velocity = np.array([0.0, 0.0])
         self.mass = 1.0
 
@@ -30,19 +37,41 @@ class Visitor(Agent):
         self.gaze_direction = np.array([1.0, 0.0])
         
         # --- 追加属性 ---
-        self.last_guide_state = None  # 案内人の直前状態を記憶
         self.just_started_following = False  # 追従開始フラグ
         self.last_waypoint_step = 0  # ウェイポイントに留まったステップ数
+        self.settled_steps = 0  # 停止中の案内人のそばで続けて留まっているステップ数（休止の判定用）
+        self.settle_anchor = None  # 留まり始めた位置
+        # 案内人の出発はイベントバスで自分のグループの分だけ受け取る
+        model.events.subscribe(self.on_guide_event, EventType.GUIDE_DEPARTED, group=guide)
+
+    def on_guide_event(self, event):
+        """案内人が出発したら経路をリセットし、次のステップは追従力を強める"""
+        self.current_path = []
+        self.path_step = 0
+        self.just_started_following = True
+
+    def follow(self, guide):
+        """担当の案内人を替える（イベントの購読も付け替える）"""
+        self.model.events.unsubscribe(self.on_guide_event, EventType.GUIDE_DEPARTED, group=self.guide)
+        self.guide = guide
+        self.model.events.subscribe(self.on_guide_event, EventType.GUIDE_DEPARTED, group=guide)
         
     def step(self):
-        # 案内人の状態遷移を検知
-        if self.last_guide_state is not None and self.last_guide_state != self.guide.state:
-            if self.guide.state == GuideState.MOVING:
-                self.current_path = []
-                self.path_step = 0
-                self.just_started_following = True
-        self.last_guide_state = self.guide.state
+        # 一括更新エンジン使用時は、Museum.step でまとめて更新する
+        if getattr(self.model, 'visitor_engine', None) is not None:
+            return
+        self.commit(self.decide())
+
+    @staticmethod
+    def draw_noise(rng, count):
+        """待機中のゆらぎ count 人分 (count, 2)"""
+        return rng.uniform(-0.1, 0.1, size=(count, 2))
 
+    def decide(self, noise=None):
+        """
+        周囲の状態を読んで、このステップの加速度を決める（位置・速度・視線はまだ変えない）
+        - noise: 待機中のゆらぎ (2,)。Noneならモデルの乱数から引く（段階実行では事前にまとめて引いて渡す）
+        """
         # --- 障害物回避力は常に計算 ---
         obstacle_avoidance_force = self.avoid_obstacles()
         exhibit_avoid_force = self.avoid_exhibits()
@@ -58,21 +87,15 @@ class Visitor(Agent):
                 guide_force = np.array([0.0, 0.0])
             # 他の見学者との距離に応じた吸引・反発
             group_force = np.array([0.0, 0.0])
-            for agent in self.model.schedule.agents:
-                if isinstance(agent, Visitor) and agent is not self:
-                    diff = self.pos - np.array(agent.pos)
-                    d = np.linalg.norm(diff)
-                    if 0 < d < 0.7:
-                        group_force += diff / (d + 1e-6) * 0.2
-                    elif 0.7 <= d < 1.5:
-                        group_force -= diff / (d + 1e-6) * 0.1
-            noise = np.random.uniform(-0.1, 0.1, size=2)
+            diff, d = self.neighbor_offsets(1.5)
+            if len(d):
+                unit = diff / (d + 1e-6)[:, None]
+                group_force += unit[(0 < d) & (d < 0.7)].sum(axis=0) * 0.2
+                group_force -= unit[(0.7 <= d) & (d < 1.5)].sum(axis=0) * 0.1
+            if noise is None:
+                noise = self.draw_noise(self.model.np_random, 1)[0]
             # --- 必ず障害物・展示物回避を合成 ---
-            acceleration = guide_force + group_force + noise + obstacle_avoidance_force * 0.5 + exhibit_avoid_force * 0.5
-            self.apply_force(acceleration)
-            self.update_position()
-            self.update_gaze()
-            return
+            return guide_force + group_force + noise + obstacle_avoidance_force * 0.5 + exhibit_avoid_force * 0.5
 
         # --- ここから「案内人が見える場合は直接追従、見えない場合は経路追従」分岐を明示的に復元 ---
         guide_visible = self.is_guide_visible()
@@ -93,45 +116,52 @@ class Visitor(Agent):
             path_following_force = self.seek(target_pos) * 5.0
         separation_force = self.separate() * 0.3
         # --- 障害物・展示物回避は補助的に ---
-        acceleration = path_following_force + obstacle_avoidance_force * 0.5 + separation_force + exhibit_avoid_force * 0.5
+        return path_following_force + obstacle_avoidance_force * 0.5 + separation_force + exhibit_avoid_force * 0.5
+
+    def commit(self, acceleration):
+        """decide で決めた加速度を反映して移動し、視線を更新する"""
         self.apply_force(acceleration)
         self.update_position()
         self.update_gaze()
+        if self.model.schedule.skip_dormant:
+            self.update_dormancy()
+
+    def update_dormancy(self):
+        """
+        停止中の案内人のそば（SETTLE_GUIDE_DIST 以内）で、SETTLE_STEPS ステップの間
+        SETTLE_RADIUS 以内にしか動かなかったら休止する（待機中のゆらぎ程度の動きは省略する）
+        案内人の状態が変わるか、移動中のエージェントが WAKE_RADIUS 内に入ってきたら起こされる
+        （待機中の見学者どうしのゆらぎでは起こし合わない）
+        """
+        near_guide = np.linalg.norm(np.array(self.guide.pos) - self.pos) <= SETTLE_GUIDE_DIST
+        if self.guide.state == GuideState.MOVING or not near_guide:
+            self.settled_steps = 0
+            self.settle_anchor = None
+            return
+        if self.settle_anchor is None or np.linalg.norm(self.pos - self.settle_anchor) > SETTLE_RADIUS:
+            self.settle_anchor = np.array(self.pos, dtype=float)
+            self.settled_steps = 0
+        self.settled_steps += 1
+        if self.settled_steps >= SETTLE_STEPS and self.model.schedule.sleep(self, wake_on=self.guide, wake_radius=WAKE_RADIUS,
+                                                                      wake_filter=self.is_disturbed_by):
+            self.settled_steps = 0
+            self.settle_anchor = None
+            self.velocity[:] = 0.0
+
+    def is_disturbed_by(self, other):
+        """休止中に other が近づいてきたら起きるか（移動中の案内人と、その案内人に付いていく見学者だけ）"""
+        guide = getattr(other, 'guide', other)
+        return getattr(guide, 'state', None) == GuideState.MOVING
 
     def _astar_search(self, start, end):
         """
         A*探索アルゴリズム（開始点・目標点を必ずグリッドにスナップ）
+        同じ案内人を追う見学者同士で探索結果を共有するため、モデルの経路探索サービスに委譲する
         """
-        start_node = tuple(map(int, np.round(start)))
-        end_node = tuple(map(int, np.round(end)))
-        open_set = []
-        heapq.heappush(open_set, (0, start_node))
-        came_from = {}
-        g_score = {start_node: 0}
-        f_score = {start_node: np.linalg.norm(np.array(start_node) - np.array(end_node))}
-        while open_set:
-            _, current = heapq.heappop(open_set)
-            if np.linalg.norm(np.array(current) - np.array(end_node)) < 1.5:
-                path = []
-                while current in came_from:
-                    path.append(current)
-                    current = came_from[current]
-                path.append(start_node)
-                return [np.array(p, dtype=float) for p in path[::-1]]
-            for dx, dy in [(0,1), (0,-1), (1,0), (-1,0), (1,1), (1,-1), (-1,1), (-1,-1)]:
-                neighbor = (current[0] + dx, current[1] + dy)
-                if not (0 <= neighbor[0] < self.model.grid.width and 0 <= neighbor[1] < self.model.grid.height):
-                    continue
-                if self.model.grid.is_obstacle(neighbor):
-                    continue
-                tentative_g_score = g_score[current] + np.linalg.norm(np.array(current) - np.array(neighbor))
-                if neighbor not in g_score or tentative_g_score < g_score.get(neighbor, float('inf')):
-                    came_from[neighbor] = current
-                    g_score[neighbor] = tentative_g_score
-                    f_score[neighbor] = tentative_g_score + np.linalg.norm(np.array(neighbor) - np.array(end_node))
-                    if neighbor not in [i[1] for i in open_set]:
-                        heapq.heappush(open_set, (f_score[neighbor], neighbor))
-        return None
+        path = self.model.path_planner.find_path(start, end, tolerance=1.5, owner=self.guide)
+        if path is None:
+            return None
+        return [np.array(p, dtype=float) for p in path]
 
     def find_nearest_free_cell(self, pos):
         """
@@ -163,6 +193,9 @@ class Visitor(Agent):
         if self.guide.state != GuideState.MOVING:
             self.current_path = []
             return self.guide.pos, True
+        if getattr(self.model, 'navigation', 'astar') == 'flow_field':
+            self.current_path = []
+            return self.get_flow_field_target()
         # --- A*の開始点・目標点をグリッドにスナップ ---
         path = self._astar_search(self.pos, self.guide.pos)
         if path:
@@ -198,25 +231,52 @@ class Visitor(Agent):
         target = self.pos + to_free * 2.0 + guide_vec + avoid
         return target, False
 
+    def get_flow_field_target(self):
+        """
+        案内人を根とする距離場から次のウェイポイントを引く（A*探索・空きセル探索の代わり）
+        ウェイポイントに十分近ければ、距離場をさらに下った先を目標にする
+        """
+        field = self.model.flow_fields.field_for(self.guide, self.guide.pos)
+        cell = (int(round(self.pos[0])), int(round(self.pos[1])))
+        if field.distance_at(cell) < 1.5:
+            return self.guide.pos, True
+        waypoint = field.next_cell(cell)
+        if waypoint is None:
+            # 案内人へ到達できない場合は案内人方向へ直接向かう
+            return self.guide.pos, False
+        for _ in range(3):
+            if np.linalg.norm(self.pos - np.array(waypoint, dtype=float)) >= self.arrival_threshold:
+                break
+            following = field.next_cell(waypoint)
+            if following is None:
+                break
+            waypoint = following
+        return np.array(waypoint, dtype=float), True
+
+    def neighbor_offsets(self, radius):
+        """
+        空間ハッシュで半径 radius 付近の他の見学者を集め、
+        自分からの相対ベクトル (K, 2) と距離 (K,) をまとめて返す
+        """
+        positions = [agent.pos for agent in self.model.grid.agents_near(self.pos, radius)
+                     if isinstance(agent, Visitor) and agent is not self]
+        if not positions:
+            return np.empty((0, 2)), np.empty(0)
+        diff = self.pos - np.array(positions, dtype=float)
+        return diff, np.hypot(diff[:, 0], diff[:, 1])
+
     def separate(self):
         """
         近すぎる他の見学者から離れる「分離」の力を計算する。
         """
         steering = np.array([0.0, 0.0])
         desired_separation = 1.5  # この距離より内側に入ると反発する
-        count = 0
-        for agent in self.model.schedule.agents:
-            if isinstance(agent, Visitor) and agent is not self:
-                ### 修正点 ###
-                # agent.posがタプルである可能性を考慮し、np.array()でNumPy配列に変換する
-                diff = self.pos - np.array(agent.pos)
-                dist = np.linalg.norm(diff)
-                if 0 < dist < desired_separation:
-                    # 距離に反比例した力を加える
-                    steering += diff / dist
-                    count += 1
+        diff, dist = self.neighbor_offsets(desired_separation)
+        close = (0 < dist) & (dist < desired_separation)
+        count = np.count_nonzero(close)
         if count > 0:
-            steering /= count # 平均化
+            # 距離に反比例した力を加えて平均化
+            steering = (diff[close] / dist[close][:, None]).sum(axis=0) / count
 
         return self.calculate_steering_force(steering)
 
@@ -283,7 +343,11 @@ class Visitor(Agent):
     def avoid_obstacles(self):
         """
         障害物を全方向でさらに強く回避する力を返す（Helbing & Molnar, Zanlungo等）。
+        モデルに事前計算した反発場があれば、7x7走査の代わりに補間値を使う。
         """
+        field = getattr(self.model, 'obstacle_field', None)
+        if field is not None and field.is_current():
+            return self.calculate_steering_force(field.sample(self.pos)) * 2.5
         steering = np.array([0.0, 0.0])
         check_radius = 3.0
         for dx in range(-3, 4):
@@ -341,34 +405,6 @@ class Visitor(Agent):
     def is_occluded(self, start, end):
         """
         Bresenham法でstart→end間に障害物があるか判定
+        判定はセル対ごとに結果をキャッシュするモデルの見通しサービスに委譲する
         """
-        x0, y0 = int(round(start[0])), int(round(start[1]))
-        x1, y1 = int(round(end[0])), int(round(end[1]))
-        dx = abs(x1 - x0)
-        dy = abs(y1 - y0)
-        x, y = x0, y0
-        sx = 1 if x1 > x0 else -1
-        sy = 1 if y1 > y0 else -1
-        if dx > dy:
-            err = dx / 2.0
-            while x != x1:
-                if (x, y) != (x0, y0) and (x, y) != (x1, y1):
-                    if self.model.grid.is_obstacle((x, y)):
-                        return True
-                err -= dy
-                if err < 0:
-                    y += sy
-                    err += dx
-                x += sx
-        else:
-            err = dy / 2.0
-            while y != y1:
-                if (x, y) != (x0, y0) and (x, y) != (x1, y1):
-                    if self.model.grid.is_obstacle((x, y)):
-                        return True
-                err -= dx
-                if err < 0:
-                    x += sx
-                    err += dy
-                y += sy
-        return False
\ No newline at end of file
+        return self.model.visibility.is_occluded(start, end)
@@ -0,0 +1,166 @@
+# 見学者の一括更新エンジンの一致確認とベンチマーク
+# 同じチェックポイントから2つのモデルを復元し、一方では各Visitorのメソッドで、もう一方では
+# VisitorBatchEngine で同じ状態の力（障害物・展示物・分離・追従・待機）・可視判定・加速度・移動後の状態を計算して、
+# 差が許容誤差以内かを確かめます。あわせて、同じシードの scheduler="staged" との軌跡の差と実行速度を表示します。
+#
+# 実行方法（test_0703 直下で）:
+#   python benchmarks/bench_batch_engine.py --visitors 100 --steps 300
+#   python benchmarks/bench_batch_engine.py --check   # 一致確認だけ（差が許容誤差を超えると AssertionError）
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from agents.guide import GuideState
+from agents.visitor import Visitor
+from core.batch_engine import VisitorBatchEngine
+from core.museum import Museum
+from core.run import build_model
+
+TOLERANCE = 1e-9  # 同じ状態から計算した力・位置の差の上限（足し合わせる順序の違いによる丸め誤差だけを許す）
+
+
+def quiet():
+    # 案内人の説明終了メッセージを出さない
+    return contextlib.redirect_stdout(open(os.devnull, "w", encoding="utf-8"))
+
+
+def per_agent_state(model):
+    """各Visitorのメソッドで、現在の状態から各項目を計算する"""
+    visitors = model.groups.visitors
+    noise = Visitor.draw_noise(np.random.default_rng(0), len(visitors))
+    result = {
+        "obstacle": np.array([v.avoid_obstacles() for v in visitors]),
+        "exhibit": np.array([v.avoid_exhibits() for v in visitors]),
+        "separation": np.array([v.separate() for v in visitors]),
+        "seek": np.array([v.seek(v.guide.pos) for v in visitors]),
+        "visible": np.array([v.is_guide_visible() for v in visitors]),
+        "acceleration": np.array([v.decide(noise[i]) for i, v in enumerate(visitors)]),
+    }
+    for visitor, acceleration in zip(visitors, result["acceleration"]):
+        visitor.apply_force(acceleration)
+        visitor.update_position()
+        visitor.update_gaze()
+    result["pos"] = np.array([v.pos for v in visitors], dtype=float)
+    result["velocity"] = np.array([v.velocity for v in visitors], dtype=float)
+    result["gaze"] = np.array([v.gaze_direction for v in visitors], dtype=float)
+    return result
+
+
+def batch_state(model):
+    """VisitorBatchEngine で、現在の状態から per_agent_state と同じ項目を計算する"""
+    visitors = model.groups.visitors
+    engine = VisitorBatchEngine(model, visitors)
+    rows = np.arange(len(visitors))
+    guide_pos = np.array([v.guide.pos for v in visitors], dtype=float)
+    noise = Visitor.draw_noise(np.random.default_rng(0), len(visitors))
+    result = {
+        "obstacle": engine.obstacle_forces(),
+        "exhibit": engine.exhibit_forces(),
+        "separation": engine.separation_forces(rows),
+        "seek": engine.seek_forces(rows, guide_pos),
+        "visible": engine.guide_visible(rows, guide_pos),
+        "acceleration": engine.accelerations(noise),
+    }
+    engine.apply(result["acceleration"])
+    result["pos"] = engine.pos.copy()
+    result["velocity"] = engine.velocity.copy()
+    result["gaze"] = engine.gaze.copy()
+    return result
+
+
+def check_kernels(num_visitors, num_guides, seed, checkpoints, every, subdivisions):
+    """
+    checkpoints 回（every ステップごと）の状態で、Visitor のメソッドと一括更新エンジンの結果を比べる
+    戻り値: 項目ごとの最大誤差（可視判定は食い違った人数）
+    """
+    with quiet():
+        model = build_model(num_visitors=num_visitors, num_guides=num_guides, seed=seed, cache_dir=None,
+                            obstacle_field_subdivisions=subdivisions)
+    worst = {}
+    waiting = moving = 0
+    for _ in range(checkpoints):
+        with quiet():
+            for _ in range(every):
+                model.step()
+        data = model.checkpoint()
+        moving_now = sum(v.guide.state == GuideState.MOVING for v in model.groups.visitors)
+        moving += moving_now
+        waiting += num_visitors - moving_now
+        expected = per_agent_state(Museum.restore(data))
+        actual = batch_state(Museum.restore(data))
+        for name, value in expected.items():
+            if name == "visible":
+                error = int(np.count_nonzero(value != actual[name]))
+            else:
+                error = float(np.abs(value - actual[name]).max()) if value.size else 0.0
+            worst[name] = max(worst.get(name, 0), error)
+    return worst, waiting, moving
+
+
+def trajectory_gap(num_visitors, num_guides, seed, steps):
+    """同じシードの batch_visitors=True と scheduler="staged" の見学者の位置の差（ステップごとの最大値）と実行時間"""
+    positions = {}
+    elapsed = {}
+    for name, kwargs in (("staged", {"scheduler": "staged"}), ("batch", {"batch_visitors": True}),
+                         ("random", {})):
+        with quiet():
+            model = build_model(num_visitors=num_visitors, num_guides=num_guides, seed=seed, cache_dir=None, **kwargs)
+            visitors = model.groups.visitors
+            frames = []
+            t0 = time.perf_counter()
+            for _ in range(steps):
+                model.step()
+                frames.append(np.array([tuple(v.pos) for v in visitors], dtype=float))
+            elapsed[name] = time.perf_counter() - t0
+        positions[name] = np.array(frames)
+    gap_staged = np.abs(positions["batch"] - positions["staged"]).max(axis=(1, 2))
+    gap_random = np.abs(positions["batch"] - positions["random"]).max(axis=(1, 2))
+    return gap_staged, gap_random, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="見学者の一括更新エンジンの一致確認とベンチマーク")
+    parser.add_argument("--visitors", type=int, default=60)
+    parser.add_argument("--guides", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--checkpoints", type=int, default=6, help="一致確認に使う状態の数")
+    parser.add_argument("--every", type=int, default=50, help="一致確認の状態を取るステップ間隔")
+    parser.add_argument("--steps", type=int, default=300, help="軌跡の比較と速度計測のステップ数")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--check", action="store_true", help="一致確認だけ行う")
+    args = parser.parse_args()
+
+    for subdivisions in (4, None):
+        worst, waiting, moving = check_kernels(args.visitors, args.guides, args.seed, args.checkpoints, args.every,
+                                               subdivisions)
+        label = f"obstacle field {subdivisions}" if subdivisions else "7x7 obstacle scan"
+        print(f"same-state check ({label}, {waiting} waiting / {moving} moving rows):")
+        for name, error in worst.items():
+            unit = "mismatches" if name == "visible" else "max abs diff"
+            print(f"  {name:12s}: {unit} {error:.3g}")
+        for name, error in worst.items():
+            limit = 0 if name == "visible" else args.tolerance
+            assert error <= limit, f"{name} が Visitor のメソッドと一致しません（{label}）: {error} > {limit}"
+    print(f"  all within tolerance {args.tolerance:g}")
+    if args.check:
+        return
+
+    gap_staged, gap_random, elapsed = trajectory_gap(args.visitors, args.guides, args.seed, args.steps)
+    diverged = np.flatnonzero(gap_staged > args.tolerance)
+    print(f"{args.visitors} visitors x {args.steps} steps, seed {args.seed}")
+    print(f"  batch vs staged : step 1 diff {gap_staged[0]:.3g}, "
+          f"within {args.tolerance:g} until step {diverged[0] if len(diverged) else args.steps} "
+          "(rounding differences grow in crowded phases)")
+    print(f"  batch vs random : step 1 diff {gap_random[0]:.3g} (sequential order and per-visitor noise draws differ)")
+    for name, seconds in elapsed.items():
+        print(f"  {name:7s}: {seconds:7.2f} s  {args.steps / seconds:8.1f} steps/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# 距離場（フローフィールド）計算のマイクロベンチマーク
+# 旧実装（全セルを対象にしたheapqのDijkstra）と、FlowFieldの波面探索を、
+# map1.jsonとその拡大マップで比較し、距離・次の移動先が一致するかも確かめます。
+#
+# 実行方法（test_0703 直下で）:
+#   python benchmarks/bench_flow_field.py --goals 10 --scales 1 4 5
+
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from bench_pathfinding import DEFAULT_MAP, build_environment
+from core.flow_field import NEIGHBOR_STEPS, FlowField
+
+
+def legacy_distance(occupancy, goal_cell):
+    """変更前の FlowField._compute_distance と同じ探索（比較用）"""
+    w, h = occupancy.shape
+    blocked = occupancy.ravel()
+    penalty = float(w * h) * 2.0
+    dist = np.full(w * h, np.inf)
+    start = goal_cell[0] * h + goal_cell[1]
+    dist[start] = 0.0
+    heap = [(0.0, start)]
+    while heap:
+        d, idx = heapq.heappop(heap)
+        if d > dist[idx]:
+            continue
+        x, y = divmod(idx, h)
+        enter = penalty if blocked[idx] else 0.0
+        for dx, dy, cost in NEIGHBOR_STEPS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < w and 0 <= ny < h:
+                nidx = nx * h + ny
+                nd = d + cost + enter
+                if nd < dist[nidx]:
+                    dist[nidx] = nd
+                    heapq.heappush(heap, (nd, nidx))
+    return dist.reshape(w, h)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="距離場計算のベンチマーク")
+    parser.add_argument("--map", default=DEFAULT_MAP)
+    parser.add_argument("--goals", type=int, default=10, help="スケールごとの目標セル数")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 4, 5])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for scale in args.scales:
+        grid = build_environment(args.map, scale)
+        occupancy = grid.occupancy
+        free = [tuple(map(int, c)) for c in np.argwhere(~occupancy)]
+        goals = [rng.choice(free) for _ in range(args.goals)]
+
+        t0 = time.perf_counter()
+        legacy = [legacy_distance(occupancy, goal) for goal in goals]
+        legacy_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        fields = [FlowField(occupancy, goal) for goal in goals]
+        field_time = time.perf_counter() - t0
+
+        max_diff = 0.0
+        hop_mismatches = ties = 0
+        penalty = float(occupancy.size) * 2.0
+        for expected, field in zip(legacy, fields):
+            finite = np.isfinite(expected)
+            assert np.array_equal(finite, np.isfinite(field.distance))
+            max_diff = max(max_diff, float(np.abs(expected[finite] - field.distance[finite]).max()))
+            # 距離が同じ隣接セルが複数あるときは、丸め誤差でどちらを選ぶかが変わりうる
+            reference = object.__new__(FlowField)
+            reference.__dict__.update(field.__dict__, distance=expected)
+            next_x, next_y = reference._compute_next_hops()
+            xs, ys = np.nonzero((next_x != field.next_x) | (next_y != field.next_y))
+            hop_mismatches += len(xs)
+            for x, y in zip(xs, ys):
+                # 旧実装の距離で測って、どちらの移動先も同じ経路長なら同点として数える
+                lengths = [expected[a, b] + np.hypot(a - x, b - y) + (penalty if occupancy[a, b] else 0.0)
+                           for a, b in ((next_x[x, y], next_y[x, y]), (field.next_x[x, y], field.next_y[x, y]))]
+                ties += abs(lengths[0] - lengths[1]) < 1e-9
+        print(f"--- scale {scale}: {grid.grid_width}x{grid.grid_height}, {len(goals)} goals ---")
+        print(f" legacy: {legacy_time * 1000 / len(goals):8.2f} ms/field")
+        print(f"  field: {field_time * 1000 / len(goals):8.2f} ms/field  x{legacy_time / field_time:5.1f}"
+              f"  (includes next hops)")
+        print(f"         max distance diff {max_diff:.3g}, next-hop mismatches {hop_mismatches}"
+              f" ({ties} between equal-length hops)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# A*探索のマイクロベンチマーク
+# 旧実装（open_setの線形走査・np.linalg.normによるコスト計算）と、
+# PathPlannerのA*／ジャンプポイント探索を、map1.jsonとその拡大マップで比較します。
+#
+# 実行方法（test_0703 直下で）:
+#   python benchmarks/bench_pathfinding.py --pairs 50 --scales 1 2 4
+#
+# --tolerance が1より大きいと目標は「目標セル周辺の領域」になり、ヒューリスティックが
+# 領域に対して許容的でなくなるため、手法ごとに経路コストが僅かに異なることがあります。
+# 最短性の比較には --tolerance 1.0 を指定してください。
+
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from core.environment import Environment
+from core.pathfinding import PathPlanner
+
+DEFAULT_MAP = os.path.join(os.path.dirname(__file__), '..', 'map_json', 'map1.json')
+
+
+def legacy_astar_search(grid, start_node, end_node, tolerance):
+    """変更前のGuide/Visitor._astar_searchと同じ探索（比較用）"""
+    open_set = []
+    heapq.heappush(open_set, (0, start_node))
+    came_from = {}
+    g_score = {start_node: 0}
+    while open_set:
+        _, current = heapq.heappop(open_set)
+        if np.linalg.norm(np.array(current) - np.array(end_node)) < tolerance:
+            path = []
+            while current in came_from:
+                path.append(current)
+                current = came_from[current]
+            path.append(start_node)
+            return path[::-1]
+        for dx, dy in [(0,1), (0,-1), (1,0), (-1,0), (1,1), (1,-1), (-1,1), (-1,-1)]:
+            neighbor = (current[0] + dx, current[1] + dy)
+            if grid.out_of_bounds(neighbor) or grid.is_obstacle(neighbor):
+                continue
+            tentative_g_score = g_score[current] + np.linalg.norm(np.array(current) - np.array(neighbor))
+            if neighbor not in g_score or tentative_g_score < g_score.get(neighbor, float('inf')):
+                came_from[neighbor] = current
+                g_score[neighbor] = tentative_g_score
+                f_score = tentative_g_score + np.linalg.norm(np.array(neighbor) - np.array(end_node))
+                if neighbor not in [i[1] for i in open_set]:
+                    heapq.heappush(open_set, (f_score, neighbor))
+    return None
+
+
+def path_cost(path):
+    if path is None:
+        return None
+    return sum(np.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(path, path[1:]))
+
+
+def build_environment(map_path, scale):
+    # 各セルを scale×scale のブロックに拡大したマップを作る
+    with open(map_path, encoding="utf-8") as f:
+        cells = np.array(json.load(f)["map"])
+    cells = np.kron(cells, np.ones((scale, scale), dtype=cells.dtype))
+    return Environment.from_occupancy((cells == 1).T)
+
+
+def run(label, search, pairs):
+    t0 = time.perf_counter()
+    costs = [path_cost(search(s, g)) for s, g in pairs]
+    return label, time.perf_counter() - t0, costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A*探索のベンチマーク")
+    parser.add_argument("--map", default=DEFAULT_MAP)
+    parser.add_argument("--pairs", type=int, default=30, help="スケールごとの開始・目標ペア数")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--legacy-max-scale", type=int, default=2, help="旧実装を計測する最大スケール（遅いため）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for scale in args.scales:
+        grid = build_environment(args.map, scale)
+        free = [tuple(map(int, c)) for c in np.argwhere(~grid.occupancy)]
+        pairs = [(rng.choice(free), rng.choice(free)) for _ in range(args.pairs)]
+        planner = PathPlanner(grid)
+        jps_planner = PathPlanner(grid, use_jps=True)
+        results = [
+            run("astar", lambda s, g: planner._astar_search(s, g, args.tolerance), pairs),
+            run("jps", lambda s, g: jps_planner._astar_search(s, g, args.tolerance), pairs),
+        ]
+        if scale <= args.legacy_max_scale:
+            results.insert(0, run("legacy", lambda s, g: legacy_astar_search(grid, s, g, args.tolerance), pairs))
+        print(f"--- scale {scale}: {grid.grid_width}x{grid.grid_height}, {len(pairs)} pairs ---")
+        base_time = results[0][1]
+        reference = results[-2][2]  # 新A*のコストを基準にする
+        for label, elapsed, costs in results:
+            mismatches = sum(
+                1 for a, b in zip(costs, reference)
+                if (a is None) != (b is None) or (a is not None and abs(a - b) > 1e-6)
+            )
+            print(f"{label:>7}: {elapsed * 1000:9.1f} ms  x{base_time / elapsed:6.1f}  cost mismatches vs astar: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
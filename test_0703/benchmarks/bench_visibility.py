@@ -0,0 +1,119 @@
+# 見通し判定のマイクロベンチマーク
+# 変更前のVisitor.is_occluded（見学者ごとのPythonによるBresenham法）と、
+# VisibilityCacheの1組ずつの判定（LRUキャッシュ）・全員同時のベクトル化判定を比較します。
+#
+# 実行方法（test_0703 直下で）:
+#   python benchmarks/bench_visibility.py --visitors 200 --steps 50
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from core.environment import Environment
+from core.visibility import VisibilityCache
+
+DEFAULT_MAP = os.path.join(os.path.dirname(__file__), '..', 'map_json', 'map1.json')
+
+
+def legacy_is_occluded(grid, start, end):
+    """変更前のVisitor.is_occludedと同じ判定（比較用）"""
+    x0, y0 = int(round(start[0])), int(round(start[1]))
+    x1, y1 = int(round(end[0])), int(round(end[1]))
+    dx = abs(x1 - x0)
+    dy = abs(y1 - y0)
+    x, y = x0, y0
+    sx = 1 if x1 > x0 else -1
+    sy = 1 if y1 > y0 else -1
+    if dx > dy:
+        err = dx / 2.0
+        while x != x1:
+            if (x, y) != (x0, y0) and (x, y) != (x1, y1):
+                if grid.is_obstacle((x, y)):
+                    return True
+            err -= dy
+            if err < 0:
+                y += sy
+                err += dx
+            x += sx
+    else:
+        err = dy / 2.0
+        while y != y1:
+            if (x, y) != (x0, y0) and (x, y) != (x1, y1):
+                if grid.is_obstacle((x, y)):
+                    return True
+            err -= dx
+            if err < 0:
+                x += sx
+                err += dy
+            y += sy
+    return False
+
+
+def build_environment(map_path):
+    with open(map_path, encoding="utf-8") as f:
+        cells = np.array(json.load(f)["map"])
+    return Environment.from_occupancy((cells == 1).T)
+
+
+def make_frames(grid, visitors, steps, view_dist, rng):
+    # 案内人の周り view_dist 以内をうろつく見学者の位置をステップ数分作る
+    free = np.argwhere(~grid.occupancy).astype(float)
+    frames = []
+    guide = free[rng.integers(len(free))]
+    for _ in range(steps):
+        guide = np.clip(guide + rng.uniform(-0.2, 0.2, 2), 1, [grid.width - 2, grid.height - 2])
+        offsets = rng.uniform(-view_dist, view_dist, (visitors, 2))
+        starts = np.clip(guide + offsets, 0, [grid.width - 1, grid.height - 1])
+        frames.append((starts, np.repeat(guide[None, :], visitors, axis=0)))
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="見通し判定のベンチマーク")
+    parser.add_argument("--map", default=DEFAULT_MAP)
+    parser.add_argument("--visitors", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--view-dist", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    grid = build_environment(args.map)
+    frames = make_frames(grid, args.visitors, args.steps, args.view_dist, np.random.default_rng(args.seed))
+    pairs = args.visitors * args.steps
+
+    t0 = time.perf_counter()
+    legacy = [np.array([legacy_is_occluded(grid, s, e) for s, e in zip(starts, ends)]) for starts, ends in frames]
+    t_legacy = time.perf_counter() - t0
+
+    cache = VisibilityCache(grid)
+    t0 = time.perf_counter()
+    scalar = [np.array([cache.is_occluded(s, e) for s, e in zip(starts, ends)]) for starts, ends in frames]
+    t_scalar = time.perf_counter() - t0
+
+    uncached = VisibilityCache(grid, maxsize=0)
+    t0 = time.perf_counter()
+    march = [uncached.occluded_batch(starts, ends) for starts, ends in frames]
+    t_march = time.perf_counter() - t0
+
+    batch_cache = VisibilityCache(grid)
+    t0 = time.perf_counter()
+    batch = [batch_cache.occluded_batch(starts, ends) for starts, ends in frames]
+    t_batch = time.perf_counter() - t0
+
+    same = all(np.array_equal(a, b) and np.array_equal(a, c) and np.array_equal(a, d)
+               for a, b, c, d in zip(legacy, scalar, march, batch))
+    print(f"{args.visitors} visitors x {args.steps} steps = {pairs} rays on {grid.grid_width}x{grid.grid_height}")
+    print(f"  legacy bresenham : {t_legacy * 1000:8.1f} ms")
+    print(f"  cached scalar    : {t_scalar * 1000:8.1f} ms  x{t_legacy / t_scalar:5.1f}  hit rate {cache.hits / pairs:.2f}")
+    print(f"  vectorized march : {t_march * 1000:8.1f} ms  x{t_legacy / t_march:5.1f}")
+    print(f"  vectorized+cache : {t_batch * 1000:8.1f} ms  x{t_legacy / t_batch:5.1f}  hit rate {batch_cache.hits / pairs:.2f}")
+    print(f"  results identical: {same}")
+
+
+if __name__ == "__main__":
+    main()
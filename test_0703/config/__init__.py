@@ -1,3 +1,4 @@
+import os
 import re
 import random
 
@@ -48,6 +49,13 @@ BASE_VISITOR_START_POS = (2, 2)
 DEFAULT_LOG_FILE_PATH = r"simulation_log.txt"
 DEFAULT_LOG_OB_PATH = r"log_ob.txt"
 DEFAULT_AGENT_POSITION_LOG_PATH = r"agent_position_log.txt"
+DEFAULT_TRAJECTORY_DIR = r"trajectory"  # 軌跡の出力先
+DEFAULT_REPLAY_PATH = None  # 軌跡ストアのディレクトリを指定すると ui/app.py は記録を再生する
+DEFAULT_THREADED_SIM = True  # Trueなら ui/app.py はシミュレーションを別スレッドで進め、描画と切り離す
+DEFAULT_FPS = 60  # ui/app.py の描画フレームレートの上限（python ui/app.py --fps 30 のように変更できる）
+DEFAULT_EXPORT_POSITION_CSV = False  # Trueなら終了時に軌跡を DEFAULT_AGENT_POSITION_LOG_PATH へCSVで書き出す
+# 障害物反発場などの事前計算キャッシュ（作業ディレクトリによらず test_0703/cache に置く）
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
 DEFAULT_CELL_SIZE = 32
 DEFAULT_MARGIN = 2
 DEFAULT_STEPS = 1000
@@ -62,7 +70,8 @@ DEFAULT_HEIGHT = scale_value_y(BASE_HEIGHT, SCALE_FACTOR_Y)
 DEFAULT_GUIDE_START_POS = scale_pos(BASE_GUIDE_START_POS, SCALE_FACTOR_X, SCALE_FACTOR_Y)
 DEFAULT_VISITOR_START_POS = scale_pos(BASE_VISITOR_START_POS, SCALE_FACTOR_X, SCALE_FACTOR_Y)
 ## OBSTACLE_LINES, EXHIBIT_GROUPS, EXHIBIT_POSITIONS, DEFAULT_GUIDE_DESTINATIONS, DEFAULT_NUM_EXHIBITS は不要
-def get_visitor_speeds(num_visitors=None):
+def get_visitor_speeds(num_visitors=None, rng=random):
+    # rng: 速度のばらつきに使う乱数生成器（Museum.random を渡すとシードで再現できる）
     speeds = VISITOR_SPEEDS.copy()
     if num_visitors is None:
         num_visitors = DEFAULT_NUM_VISITORS
@@ -70,4 +79,4 @@ def get_visitor_speeds(num_visitors=None):
         return speeds[:num_visitors]
     else:
         base = (speeds * ((num_visitors // len(speeds)) + 1))[:num_visitors]
-        return [round(s + random.uniform(-0.01, 0.01), 3) for s in base]
+        return [round(s + rng.uniform(-0.01, 0.01), 3) for s in base]
@@ -0,0 +1,247 @@
+# 見学者の一括更新エンジンのクラス定義ファイル
+# 全見学者の位置・速度・視線を連続した (N, 2) 配列で保持し、
+# 追従・分離・障害物回避・速度制限・視線更新・衝突判定を数回のNumPy演算でまとめて計算します。
+# Visitorオブジェクトの velocity / gaze_direction / pos はこの配列の行ビューになります。
+
+import numpy as np
+from agents.guide import GuideState
+from agents.visitor import Visitor
+from event.event_bus import EventType
+from .obstacle_field import obstacle_steering
+
+
+class VisitorBatchEngine:
+    """
+    見学者の構造体配列（SoA）による一括ステップ
+    - Visitor.step と同じ力の合成を全員分まとめて計算する
+    - Museum.step でスケジューラより先に呼ばれ、全員がステップ開始時（案内人もまだ動いていない）の
+      状態を見て同時に更新する。待機中のゆらぎも Visitor.draw_noise で全員分を追加順に引くので、
+      同じシードの scheduler="staged"（workers=1）と浮動小数点の誤差の範囲で一致する
+      （RandomActivationの逐次更新とは、先に動いた案内人・見学者が見える順序の影響と、
+      ゆらぎを1人ずつ引く乱数の並びが異なるので一致しない）
+    - 案内人が見えない見学者の経路追従だけは各Visitorのメソッドに委譲する
+    - 各力の計算と Visitor のメソッドとの一致は benchmarks/bench_batch_engine.py --check で確かめられる
+    """
+    def __init__(self, model, visitors, chunk_size=256):
+        # model: Museum
+        # visitors: Visitorのリスト（この順番で配列の行に対応）
+        # chunk_size: 見学者同士の距離計算を何行ずつ行うか（メモリ使用量の上限）
+        self.model = model
+        self.grid = model.grid
+        self.visitors = list(visitors)
+        self.chunk_size = chunk_size
+        n = len(self.visitors)
+        self.pos = np.array([v.pos for v in self.visitors], dtype=float).reshape(n, 2)
+        self.velocity = np.array([v.velocity for v in self.visitors], dtype=float).reshape(n, 2)
+        self.gaze = np.array([v.gaze_direction for v in self.visitors], dtype=float).reshape(n, 2)
+        self.max_speed = np.array([v.max_speed for v in self.visitors], dtype=float)
+        self.max_force = np.array([v.max_force for v in self.visitors], dtype=float)
+        self.mass = np.array([v.mass for v in self.visitors], dtype=float)
+        self.just_started = np.array([v.just_started_following for v in self.visitors], dtype=bool)
+        self.guides = []
+        self._groups_version = None
+        self._build_groups()
+        self._attach()
+
+    def _build_groups(self):
+        """
+        各見学者の担当案内人から guides / guide_idx / groups を作り、出発イベントを購読し直す
+        （購読は各Visitorの on_guide_event より後になるように、毎回登録し直す）
+        """
+        events = self.model.events
+        for guide in self.guides:
+            events.unsubscribe(self.on_guide_departed, EventType.GUIDE_DEPARTED, group=guide)
+        self.guides = list(dict.fromkeys(v.guide for v in self.visitors))
+        guide_index = {guide: k for k, guide in enumerate(self.guides)}
+        self.guide_idx = np.array([guide_index[v.guide] for v in self.visitors], dtype=np.int64)
+        self.groups = [np.flatnonzero(self.guide_idx == k) for k in range(len(self.guides))]
+        for guide in self.guides:
+            events.subscribe(self.on_guide_departed, EventType.GUIDE_DEPARTED, group=guide)
+        registry = getattr(self.model, 'groups', None)
+        self._groups_version = registry.version if registry is not None else None
+
+    def _sync_groups(self):
+        # グループ対応表が変わっていたら（GroupRegistry.assign など）配列を作り直す
+        registry = getattr(self.model, 'groups', None)
+        if registry is not None and registry.version != self._groups_version:
+            self._build_groups()
+
+    def _attach(self):
+        """各Visitorの属性を配列の行ビューに差し替える"""
+        for i, visitor in enumerate(self.visitors):
+            visitor.velocity = self.velocity[i]
+            visitor.gaze_direction = self.gaze[i]
+            self.grid.move_agent(visitor, self.pos[i])
+
+    def step(self):
+        if len(self.visitors) == 0:
+            return
+        self.apply(self.accelerations())
+
+    def accelerations(self, noise=None):
+        """
+        全員分の加速度 (N, 2)（Visitor.decide と同じ。経路追従の状態と追従開始フラグは更新する）
+        - noise: 待機中のゆらぎ (N, 2)。Noneならモデルの乱数から全員分を引く（待機中でない行は使わない）
+        """
+        self._sync_groups()
+        n = len(self.visitors)
+        if noise is None:
+            noise = Visitor.draw_noise(self.model.np_random, n)
+        guide_pos = np.array([g.pos for g in self.guides], dtype=float).reshape(-1, 2)[self.guide_idx]
+        guide_moving = np.array([g.state == GuideState.MOVING for g in self.guides])[self.guide_idx]
+
+        # --- 障害物回避力・展示物回避力は常に計算 ---
+        obstacle_force = self.obstacle_forces()
+        exhibit_force = self.exhibit_forces()
+        acceleration = np.zeros((n, 2))
+
+        # 案内人が説明中（停止中）の見学者は近くで待機
+        waiting = np.flatnonzero(~guide_moving)
+        if len(waiting):
+            to_guide = guide_pos[waiting] - self.pos[waiting]
+            dist = np.hypot(to_guide[:, 0], to_guide[:, 1])
+            guide_force = np.where((dist > 1.0)[:, None], to_guide / (dist + 1e-6)[:, None] * 0.8, 0.0)
+            acceleration[waiting] = (guide_force + self.group_forces(waiting) + noise[waiting]
+                                     + obstacle_force[waiting] * 0.5 + exhibit_force[waiting] * 0.5)
+
+        # 案内人が移動中の見学者は、見えれば直接追従、見えなければ経路追従
+        moving = np.flatnonzero(guide_moving)
+        if len(moving):
+            target = guide_pos[moving].copy()
+            visible = self.guide_visible(moving, guide_pos[moving])
+            for k in np.flatnonzero(~visible):
+                visitor = self.visitors[moving[k]]
+                target[k], _ = visitor.manage_path_and_get_target_v2()
+                if visitor.just_started_following:
+                    self.just_started[moving[k]] = True
+                    visitor.just_started_following = False
+            factor = np.where(self.just_started[moving], 10.0, 5.0)[:, None]
+            self.just_started[moving] = False
+            acceleration[moving] = (self.seek_forces(moving, target) * factor
+                                    + obstacle_force[moving] * 0.5
+                                    + self.separation_forces(moving) * 0.3
+                                    + exhibit_force[moving] * 0.5)
+        return acceleration
+
+    def apply(self, acceleration):
+        """加速度を反映して移動し、視線を更新する（Visitor.commit と同じ）"""
+        self.velocity += acceleration / self.mass[:, None]
+        self.update_positions()
+        self.update_gaze()
+
+    def on_guide_departed(self, event):
+        """
+        案内人が出発したら、そのグループの追従開始フラグを配列側に移す
+        （各Visitorの on_guide_event が先に経路をリセットしてフラグを立てている。購読の登録順）
+        """
+        for i in self.groups[self.guides.index(event.guide)]:
+            self.just_started[i] = True
+            self.visitors[i].just_started_following = False
+
+    def _clamp(self, vectors, limit):
+        # ベクトルの大きさを limit（行ごと）以下に制限する
+        norm = np.hypot(vectors[:, 0], vectors[:, 1])
+        over = norm > limit
+        vectors[over] *= (limit[over] / norm[over])[:, None]
+        return vectors
+
+    def obstacle_forces(self):
+        """Visitor.avoid_obstacles を全員分まとめて計算（事前計算場があれば補間で引く）"""
+        field = getattr(self.model, 'obstacle_field', None)
+        if field is not None and field.is_current():
+            steering = field.sample_batch(self.pos)
+        else:
+            steering = obstacle_steering(self.grid, self.pos)
+        return self._clamp(steering, self.max_force) * 2.5
+
+    def exhibit_forces(self):
+        """Visitor.avoid_exhibits を全員分まとめて計算"""
+        exhibits = np.asarray(getattr(self.model, 'exhibit_positions', []), dtype=float).reshape(-1, 2)
+        if len(exhibits) == 0:
+            return np.zeros_like(self.pos)
+        diff = self.pos[:, None, :] - exhibits[None, :, :]
+        dist = np.hypot(diff[..., 0], diff[..., 1])
+        active = (dist > 0) & (dist < 1.0)
+        weight = np.where(active, 1.0 / (dist + 1e-6) * (1.0 / (dist ** 2 + 1e-6)), 0.0)
+        steering = (diff * weight[..., None]).sum(axis=1)
+        return self._clamp(steering, self.max_force)
+
+    def _pairwise(self, rows):
+        # rows の見学者から全見学者への相対ベクトルと距離を、chunk_size 行ずつ返す
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start:start + self.chunk_size]
+            diff = self.pos[chunk, None, :] - self.pos[None, :, :]
+            yield start, chunk, diff, np.hypot(diff[..., 0], diff[..., 1])
+
+    def group_forces(self, rows):
+        """待機中の見学者同士の吸引・反発（Visitor.step の待機分岐と同じ）"""
+        force = np.zeros((len(rows), 2))
+        for start, chunk, diff, dist in self._pairwise(rows):
+            unit = diff / (dist + 1e-6)[..., None]
+            near = ((0 < dist) & (dist < 0.7))[..., None]
+            middle = ((0.7 <= dist) & (dist < 1.5))[..., None]
+            force[start:start + len(chunk)] = (np.where(near, unit, 0.0).sum(axis=1) * 0.2
+                                               - np.where(middle, unit, 0.0).sum(axis=1) * 0.1)
+        return force
+
+    def separation_forces(self, rows):
+        """Visitor.separate を rows の見学者分まとめて計算"""
+        force = np.zeros((len(rows), 2))
+        for start, chunk, diff, dist in self._pairwise(rows):
+            close = (0 < dist) & (dist < 1.5)
+            count = close.sum(axis=1)
+            unit = np.where(close[..., None], diff / np.where(close, dist, 1.0)[..., None], 0.0)
+            total = unit.sum(axis=1)
+            has = count > 0
+            total[has] /= count[has, None]
+            force[start:start + len(chunk)] = total
+        return self._clamp(force, self.max_force[rows])
+
+    def seek_forces(self, rows, target):
+        """Visitor.seek を rows の見学者分まとめて計算"""
+        desired = target - self.pos[rows]
+        norm = np.hypot(desired[:, 0], desired[:, 1])
+        moving = norm > 0
+        steering = np.zeros_like(desired)
+        desired = desired[moving] / norm[moving, None] * self.max_speed[rows][moving, None]
+        steering[moving] = desired - self.velocity[rows][moving]
+        return self._clamp(steering, self.max_force[rows])
+
+    def guide_visible(self, rows, guide_pos):
+        """Visitor.is_guide_visible を rows の見学者分まとめて判定（遮蔽判定は候補だけまとめて）"""
+        to_guide = guide_pos - self.pos[rows]
+        dist = np.hypot(to_guide[:, 0], to_guide[:, 1])
+        gaze = self.gaze[rows].copy()
+        gaze[np.hypot(gaze[:, 0], gaze[:, 1]) < 1e-3] = (1.0, 0.0)
+        cos_angle = np.einsum('ij,ij->i', gaze, to_guide / (dist + 1e-6)[:, None])
+        angle = np.degrees(np.arccos(np.clip(cos_angle, -1.0, 1.0)))
+        visible = (dist <= 5.0) & (angle <= 60.0)
+        if visible.any():
+            candidates = np.flatnonzero(visible)
+            occluded = self.model.visibility.occluded_batch(self.pos[rows[candidates]], guide_pos[candidates])
+            visible[candidates[occluded]] = False
+        return visible
+
+    def update_positions(self):
+        """速度制限をかけて位置を更新し、画面外や障害物へ入る見学者は止める"""
+        self.velocity[:] = self._clamp(self.velocity, self.max_speed)
+        next_pos = self.pos + self.velocity
+        grid = self.grid
+        ok = ((next_pos[:, 0] >= grid.x_min) & (next_pos[:, 0] < grid.x_max)
+              & (next_pos[:, 1] >= grid.y_min) & (next_pos[:, 1] < grid.y_max))
+        ok[ok] = ~grid.is_obstacle_batch(next_pos[ok])
+        self.pos[ok] = next_pos[ok]
+        self.velocity[~ok] = 0.0
+        for i in np.flatnonzero(ok):
+            grid.move_agent(self.visitors[i], self.pos[i])
+
+    def update_gaze(self):
+        """視線を移動方向へ滑らかに追従させる（Visitor.update_gaze と同じ）"""
+        speed = np.hypot(self.velocity[:, 0], self.velocity[:, 1])
+        moving = speed > 0.01
+        alpha = 0.2
+        gaze = (1 - alpha) * self.gaze[moving] + alpha * self.velocity[moving] / speed[moving, None]
+        norm = np.hypot(gaze[:, 0], gaze[:, 1])
+        valid = norm > 1e-6
+        gaze[valid] /= norm[valid, None]
+        self.gaze[moving] = gaze
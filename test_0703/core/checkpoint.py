@@ -0,0 +1,44 @@
+# Museumのチェックポイント（状態の保存・復元）を行う関数定義ファイル
+# エージェント・スケジューラの順番・乱数状態・案内人の状態遷移・見学者の操舵状態を含む
+# モデル全体を pickle して zlib で圧縮します。作り直せるキャッシュ（距離場・遮蔽判定・
+# 障害物反発場）は各クラスの __getstate__ で除外し、復元後に Museum 側で作り直します。
+
+import os
+import pickle
+import zlib
+
+MAGIC = b"MUSEUMCK"
+CHECKPOINT_VERSION = 1
+
+
+def dumps(model, level=6):
+    """model をチェックポイントのバイト列にする"""
+    payload = zlib.compress(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL), level)
+    return MAGIC + bytes([CHECKPOINT_VERSION]) + payload
+
+
+def loads(data):
+    """チェックポイントのバイト列からモデルを復元する（キャッシュの作り直しは呼び出し側で行う）"""
+    header = len(MAGIC) + 1
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Museumのチェックポイントではありません")
+    if data[len(MAGIC)] != CHECKPOINT_VERSION:
+        raise ValueError(f"対応していないチェックポイントの版です: {data[len(MAGIC)]}")
+    return pickle.loads(zlib.decompress(data[header:]))
+
+
+def save(model, path, level=6):
+    """チェックポイントをファイルに書き出す（書き込み途中のファイルが残らないよう置き換える）"""
+    data = dumps(model, level)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
@@ -0,0 +1,77 @@
+# エージェントデータ収集のクラス定義ファイル
+# mesaのDataCollectorの代わりに、移動するエージェント（案内人・見学者）の座標だけを
+# 事前確保した (記録回数, エージェント数) の float32 配列に書き込みます。
+# get_agent_vars_dataframe で mesa と同じ (Step, AgentID) インデックスのDataFrameを作れます。
+
+import numpy as np
+import pandas as pd
+
+
+class AgentPositionCollector:
+    """
+    移動エージェントの座標収集
+    - every: 何ステップごとに記録するか（schedule.steps が every の倍数のときだけ記録）
+    - capacity: 予定している記録回数（超えたら倍に拡張する）
+    - reporters: 追加で記録する {列名: 関数(agent) -> 数値}（float32で保存）
+    """
+    def __init__(self, agents, every=1, capacity=1024, reporters=None):
+        self.agents = list(agents)
+        self.every = max(1, int(every))
+        self.agent_ids = [agent.unique_id for agent in self.agents]
+        self.agent_types = [agent.__class__.__name__ for agent in self.agents]
+        self.reporters = dict(reporters or {})
+        n = len(self.agents)
+        capacity = max(1, int(capacity))
+        self.steps = np.empty(capacity, dtype=np.int64)
+        self.positions = np.empty((capacity, n, 2), dtype=np.float32)
+        self.values = {name: np.empty((capacity, n), dtype=np.float32) for name in self.reporters}
+        self.count = 0
+
+    def reserve(self, capacity):
+        """記録回数 capacity 分の配列を確保しておく（実行ステップ数が分かっているときに倍々の拡張を避ける）"""
+        extra = int(capacity) - len(self.steps)
+        if extra <= 0:
+            return
+        self.steps = np.concatenate([self.steps, np.empty(extra, dtype=self.steps.dtype)])
+        self.positions = np.concatenate([self.positions, np.empty((extra,) + self.positions.shape[1:], dtype=np.float32)])
+        self.values = {name: np.concatenate([array, np.empty((extra,) + array.shape[1:], dtype=np.float32)])
+                       for name, array in self.values.items()}
+
+    def _grow(self):
+        self.reserve(len(self.steps) * 2)
+
+    def collect(self, model):
+        step = model.schedule.steps
+        if step % self.every:
+            return
+        if self.count == len(self.steps):
+            self._grow()
+        row = self.count
+        self.steps[row] = step
+        positions = self.positions[row]
+        for i, agent in enumerate(self.agents):
+            positions[i] = agent.pos
+        for name, reporter in self.reporters.items():
+            self.values[name][row] = [reporter(agent) for agent in self.agents]
+        self.count += 1
+
+    def get_agent_vars_dataframe(self):
+        """mesa の DataCollector と同じ形 (Step, AgentID) インデックス・x, y, AgentType 列のDataFrame"""
+        n = len(self.agents)
+        count = self.count
+        columns = {
+            "x": self.positions[:count, :, 0].ravel(),
+            "y": self.positions[:count, :, 1].ravel(),
+            "AgentType": np.tile(np.array(self.agent_types, dtype=object), count),
+        }
+        for name, array in self.values.items():
+            columns[name] = array[:count].ravel()
+        index = pd.MultiIndex.from_arrays(
+            [np.repeat(self.steps[:count], n), np.tile(np.array(self.agent_ids, dtype=object), count)],
+            names=["Step", "AgentID"],
+        )
+        return pd.DataFrame(columns, index=index)
+
+    def nbytes(self):
+        # 確保済み配列のバイト数
+        return self.steps.nbytes + self.positions.nbytes + sum(array.nbytes for array in self.values.values())
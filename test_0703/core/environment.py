@@ -1,9 +1,13 @@
 # グリッド環境のクラス定義ファイル
 # このクラスは、障害物や壁の配置を管理するグリッド環境を表現します。
 # シミュレーション空間の外周や館内レイアウトの障害物もここで定義します。
+# 大きなマップでは、障害物セルの配列や占有ビットマップを obstacle_cells / from_occupancy で渡すと、
+# セルごとの place_obstacle を呼ばずに配列演算でまとめて配置します（線分も一括でラスタライズします）。
 # 各メソッドや変数の役割は下記コメントを参照してください。
 
+import numpy as np
 from mesa.space import ContinuousSpace
+from .spatial_index import SpatialHash
 
 class Environment(ContinuousSpace):
     """
@@ -11,74 +15,187 @@ class Environment(ContinuousSpace):
     - 障害物や壁の配置
     - 連続座標(float)でエージェントを管理
     """
-    def __init__(self, width, height, grid_width=None, grid_height=None, obstacle_lines=None):
+    def __init__(self, width, height, grid_width=None, grid_height=None, obstacle_lines=None, neighbor_cell_size=1.5, obstacle_cells=None):
         # width, height: 連続空間の幅・高さ（float）
         # grid_width, grid_height: 描画や障害物配置用のグリッドサイズ（int）
+        # neighbor_cell_size: 近傍探索用空間ハッシュのバケットサイズ
+        # obstacle_cells: 障害物セルの (N, 2) 配列・(x, y) のリスト、または [x, y] のbool占有ビットマップ
         super().__init__(width, height, torus=False)
         self.grid_width = grid_width or int(width)
         self.grid_height = grid_height or int(height)
         self.obstacles = set()  # 障害物のグリッド座標集合（int, int）
+        # 障害物の占有ビットマップ（[x, y] でアクセス、グリッド範囲内のみ）
+        self.occupancy = np.zeros((self.grid_width, self.grid_height), dtype=bool)
+        # 8近傍まで膨張させた占有マスク（壁際判定用）
+        self.inflated_occupancy = np.zeros((self.grid_width, self.grid_height), dtype=bool)
+        self._outside_obstacles = False  # グリッド範囲外に置かれた障害物があるか
+        self.obstacle_version = 0  # 障害物を追加するたびに増える（経路キャッシュの無効化用）
         self.obstacle_lines = obstacle_lines
+        self.agent_index = SpatialHash(neighbor_cell_size)  # エージェント近傍探索用
         self.create_boundary_obstacles()
         self.create_museum_layout()
+        if obstacle_cells is not None:
+            self.place_obstacles(obstacle_cells)
+
+    @classmethod
+    def from_occupancy(cls, occupancy, width=None, height=None, **kwargs):
+        """[x, y] の障害物ビットマップから環境を作る（グリッドサイズはビットマップの形から決まる）"""
+        occupancy = np.asarray(occupancy, dtype=bool)
+        grid_width, grid_height = occupancy.shape
+        return cls(width or grid_width, height or grid_height, grid_width, grid_height, obstacle_cells=occupancy, **kwargs)
+
+    def place_agent(self, agent, pos):
+        super().place_agent(agent, pos)
+        self.agent_index.insert(agent, agent.pos)
+
+    def move_agent(self, agent, pos):
+        super().move_agent(agent, pos)
+        self.agent_index.move(agent, agent.pos)
+
+    def remove_agent(self, agent):
+        super().remove_agent(agent)
+        self.agent_index.remove(agent)
+
+    def agents_near(self, pos, radius):
+        # pos から半径 radius 付近にいるエージェント候補（空間ハッシュのバケット単位）
+        return self.agent_index.query(pos, radius)
 
     def place_obstacle(self, pos):
         # pos: (x, y) int座標またはfloat座標
         ix, iy = int(round(pos[0])), int(round(pos[1]))
         self.obstacles.add((ix, iy))
-        # 8近傍も障害物なら必ず繋げる
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                if dx == 0 and dy == 0:
-                    continue
-                neighbor = (ix + dx, iy + dy)
-                if neighbor in self.obstacles:
-                    self.obstacles.add(neighbor)
+        self.obstacle_version += 1
+        if 0 <= ix < self.grid_width and 0 <= iy < self.grid_height:
+            self.occupancy[ix, iy] = True
+            # 膨張マスクは該当セルの8近傍（範囲内）を立てる
+            self.inflated_occupancy[max(ix - 1, 0):ix + 2, max(iy - 1, 0):iy + 2] = True
+        else:
+            self._outside_obstacles = True
+
+    def place_obstacles(self, cells):
+        """
+        複数の障害物をまとめて配置する（place_obstacle を1セルずつ呼ぶのと同じ結果）
+        - cells: (N, 2) の座標配列（float可、最寄りのセルに丸める）、または [x, y] のbool占有ビットマップ
+        """
+        cells = np.asarray(cells)
+        if cells.dtype == bool:
+            mask = np.zeros_like(self.occupancy)
+            w, h = min(cells.shape[0], self.grid_width), min(cells.shape[1], self.grid_height)
+            mask[:w, :h] = cells[:w, :h]
+            ix, iy = np.nonzero(mask)
+            outside = np.argwhere(cells)
+            outside = outside[(outside[:, 0] >= self.grid_width) | (outside[:, 1] >= self.grid_height)]
+        else:
+            # np.rint は place_obstacle の round と同じ偶数丸め
+            cells = np.rint(cells.astype(float).reshape(-1, 2)).astype(np.int64)
+            inside = ((cells[:, 0] >= 0) & (cells[:, 0] < self.grid_width)
+                      & (cells[:, 1] >= 0) & (cells[:, 1] < self.grid_height))
+            ix, iy = cells[inside, 0], cells[inside, 1]
+            outside = cells[~inside]
+        if len(ix) == 0 and len(outside) == 0:
+            return
+        self.obstacles.update(zip(ix.tolist(), iy.tolist()))
+        self.obstacles.update(zip(outside[:, 0].tolist(), outside[:, 1].tolist()))
+        self.occupancy[ix, iy] = True
+        if len(outside):
+            self._outside_obstacles = True
+        self.obstacle_version += 1
+        # 膨張マスクは占有ビットマップを8近傍に広げたもの
+        inflated = self.occupancy.copy()
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                inflated[max(dx, 0):self.grid_width + min(dx, 0), max(dy, 0):self.grid_height + min(dy, 0)] |= \
+                    self.occupancy[max(-dx, 0):self.grid_width + min(-dx, 0), max(-dy, 0):self.grid_height + min(-dy, 0)]
+        self.inflated_occupancy[:] = inflated
 
     def is_obstacle(self, pos):
         # pos: (x, y) float座標も許容
+        # 中心から0.5未満の誤差に入る障害物セルは最寄りの整数セルだけなので、
+        # そのセルの占有ビットを1回参照すれば判定できる
         x, y = pos
         ix, iy = int(round(x)), int(round(y))
-        # 8近傍も障害物とみなす
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                if (ix + dx, iy + dy) in self.obstacles:
-                    # 0.5未満の誤差なら障害物とみなす
-                    if abs(x - (ix + dx)) < 0.5 and abs(y - (iy + dy)) < 0.5:
-                        return True
+        if abs(x - ix) >= 0.5 or abs(y - iy) >= 0.5:
+            return False
+        if 0 <= ix < self.grid_width and 0 <= iy < self.grid_height:
+            return bool(self.occupancy[ix, iy])
+        return self._outside_obstacles and (ix, iy) in self.obstacles
+
+    def is_obstacle_cell(self, ix, iy):
+        # ix, iy: int座標。範囲外は障害物なしとして扱う
+        if 0 <= ix < self.grid_width and 0 <= iy < self.grid_height:
+            return bool(self.occupancy[ix, iy])
+        return self._outside_obstacles and (ix, iy) in self.obstacles
+
+    def is_obstacle_batch(self, points):
+        """
+        複数座標の障害物判定をまとめて行う
+        - points: (N, 2) の座標配列（float可）
+        - 戻り値: (N,) のbool配列（is_obstacleと同じ判定）
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        # np.rint は round と同じ偶数丸め
+        cells = np.rint(points)
+        result = np.all(np.abs(points - cells) < 0.5, axis=1)
+        ix = cells[:, 0].astype(np.int64)
+        iy = cells[:, 1].astype(np.int64)
+        inside = (ix >= 0) & (ix < self.grid_width) & (iy >= 0) & (iy < self.grid_height)
+        hit = np.zeros(len(points), dtype=bool)
+        hit[inside] = self.occupancy[ix[inside], iy[inside]]
+        if self._outside_obstacles:
+            for k in np.flatnonzero(~inside & result):
+                hit[k] = (int(ix[k]), int(iy[k])) in self.obstacles
+        return result & hit
+
+    def is_near_obstacle(self, pos):
+        # pos のセル自身または8近傍に障害物があるか（膨張マスクを参照）
+        ix, iy = int(round(pos[0])), int(round(pos[1]))
+        if 0 <= ix < self.grid_width and 0 <= iy < self.grid_height:
+            return bool(self.inflated_occupancy[ix, iy])
         return False
 
+    def is_near_obstacle_batch(self, points):
+        # 複数座標の壁際判定。範囲外はFalse
+        cells = np.rint(np.asarray(points, dtype=float).reshape(-1, 2)).astype(np.int64)
+        ix, iy = cells[:, 0], cells[:, 1]
+        inside = (ix >= 0) & (ix < self.grid_width) & (iy >= 0) & (iy < self.grid_height)
+        result = np.zeros(len(cells), dtype=bool)
+        result[inside] = self.inflated_occupancy[ix[inside], iy[inside]]
+        return result
+
     def out_of_bounds(self, pos):
         # pos: (x, y) float座標も許容
         x, y = pos
         return x < 0 or x >= self.width or y < 0 or y >= self.height
 
     def create_boundary_obstacles(self):
-        # グリッド外周に壁を設置（int座標）
-        for x in range(self.grid_width):
-            if (x, 0) != (2, 2):
-                self.place_obstacle((x, 0))
-            if (x, self.grid_height - 1) != (2, 2):
-                self.place_obstacle((x, self.grid_height - 1))
-        for y in range(self.grid_height):
-            if (0, y) != (2, 2):
-                self.place_obstacle((0, y))
-            if (self.grid_width - 1, y) != (2, 2):
-                self.place_obstacle((self.grid_width - 1, y))
+        # グリッド外周に壁を設置（int座標、(2, 2) は除く）
+        boundary = np.zeros((self.grid_width, self.grid_height), dtype=bool)
+        boundary[[0, -1], :] = True
+        boundary[:, [0, -1]] = True
+        if self.grid_width > 2 and self.grid_height > 2:
+            boundary[2, 2] = False
+        self.place_obstacles(boundary)
 
     def create_museum_layout(self):
-        # パラメータから障害物線分リストを取得
-        lines = self.obstacle_lines or []
-        for start, end in lines:
-            x0, y0 = start
-            x1, y1 = end
-            dx = x1 - x0
-            dy = y1 - y0
-            steps = max(abs(dx), abs(dy))
-            if steps == 0:
-                self.place_obstacle((x0, y0))
-                continue
-            for i in range(steps+1):
-                x = x0 + dx * i / steps
-                y = y0 + dy * i / steps
-                self.place_obstacle((x, y))
+        # パラメータの障害物線分リストをまとめてラスタライズして配置
+        if self.obstacle_lines:
+            self.place_obstacles(rasterize_lines(self.obstacle_lines))
+
+
+def rasterize_lines(lines):
+    """
+    線分リスト [[(x0, y0), (x1, y1)], ...] を、線分上の点の (N, 2) 配列にする
+    各線分は max(|dx|, |dy|) 等分した点（両端を含む）を取る。始点と終点が同じなら1点
+    """
+    lines = np.asarray(lines, dtype=float).reshape(-1, 2, 2)
+    if len(lines) == 0:
+        return np.empty((0, 2))
+    start = lines[:, 0]
+    delta = lines[:, 1] - start
+    steps = np.abs(delta).max(axis=1).astype(np.int64)
+    counts = steps + 1
+    line_index = np.repeat(np.arange(len(lines)), counts)
+    i = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    divisor = np.maximum(steps, 1)[line_index, None]
+    # x0 + dx * i / steps と同じ順で計算して丸め結果を揃える
+    return start[line_index] + delta[line_index] * i[:, None] / divisor
@@ -0,0 +1,155 @@
+# 案内人を根とする距離場（フローフィールド）のクラス定義ファイル
+# 案内人のいるセルから逆向きに波面を広げた最短距離場を1回だけ計算し、
+# 見学者は自分のセルから距離が下る隣接セルを引くだけで次のウェイポイントを得られます。
+
+import threading
+import numpy as np
+
+SQRT2 = 2 ** 0.5
+# 8方向の隣接セルと移動コスト
+NEIGHBOR_STEPS = [(0, 1, 1.0), (0, -1, 1.0), (1, 0, 1.0), (-1, 0, 1.0),
+                  (1, 1, SQRT2), (1, -1, SQRT2), (-1, 1, SQRT2), (-1, -1, SQRT2)]
+
+
+class FlowField:
+    """
+    目標セルへの距離場と、各セルの次の移動先（下り勾配の隣接セル）
+    - distance: [x, y] ごとの目標までの経路長（到達不能はinf）
+    - next_x, next_y: [x, y] ごとの次の移動先セル（なければ-1）
+    障害物セルにも大きなコストで距離を与え、壁に食い込んだ見学者の脱出方向も引けるようにする
+    """
+    def __init__(self, occupancy, goal_cell):
+        # occupancy: Environment.occupancy（[x, y] のbool配列）
+        # goal_cell: 目標セル (int, int)
+        self.occupancy = occupancy
+        self.width, self.height = occupancy.shape
+        gx = min(max(int(goal_cell[0]), 0), self.width - 1)
+        gy = min(max(int(goal_cell[1]), 0), self.height - 1)
+        self.goal_cell = (gx, gy)
+        self.distance = self._compute_distance()
+        self.next_x, self.next_y = self._compute_next_hops()
+
+    def _compute_distance(self):
+        """
+        目標セルからの逆向き最短距離（障害物セルへの進入は大きなペナルティ）
+        障害物を越える経路はどの通路経由の経路よりも長いので、まず通路セルだけで波面を広げ、
+        その結果を初期値に障害物セルと、障害物を越えないと届かないセルを埋める
+        """
+        w, h = self.width, self.height
+        penalty = float(w * h) * 2.0
+        # 周囲に1セルの番兵を付けた一次元配列で扱い、隣接セルは添字のずらしで引く
+        blocked = np.pad(self.occupancy, 1, constant_values=True).ravel()
+        inside = np.pad(np.ones((w, h), dtype=bool), 1, constant_values=False).ravel()
+        enter = np.where(blocked, penalty, 0.0)
+        dist = np.full(blocked.shape, np.inf)
+        start = (self.goal_cell[0] + 1) * (h + 2) + self.goal_cell[1] + 1
+        dist[start] = 0.0
+        self._relax(dist, np.array([start]), inside & ~blocked, enter, h + 2)
+        self._relax(dist, np.flatnonzero(np.isfinite(dist)), inside, enter, h + 2)
+        return dist.reshape(w + 2, h + 2)[1:-1, 1:-1].copy()
+
+    @staticmethod
+    def _relax(dist, frontier, allowed, enter, stride):
+        """
+        距離が縮んだセル（frontier）から隣接セルへ一斉に緩和する波面探索（dist をその場で更新）
+        - allowed: 距離を更新してよいセル
+        - enter: そのセルへ進入するコスト（隣接セルから frontier のセルへ進む向きに加算）
+        どのセルの距離も縮まなくなるまで繰り返すので、結果は Dijkstra と同じ最短距離になる
+        """
+        offsets = np.array([dx * stride + dy for dx, dy, _ in NEIGHBOR_STEPS])
+        costs = np.array([cost for _, _, cost in NEIGHBOR_STEPS])
+        updated = np.zeros(dist.shape, dtype=bool)
+        while len(frontier):
+            base = dist[frontier] + enter[frontier]
+            neighbors = (frontier[None, :] + offsets[:, None]).ravel()
+            candidate = (base[None, :] + costs[:, None]).ravel()
+            better = allowed[neighbors] & (candidate < dist[neighbors])
+            neighbors = neighbors[better]
+            np.minimum.at(dist, neighbors, candidate[better])
+            updated[neighbors] = True
+            frontier = np.flatnonzero(updated)
+            updated[frontier] = False
+
+    def _compute_next_hops(self):
+        """各セルについて「隣接セルの距離+移動コスト」が最小の隣接セルをまとめて求める"""
+        w, h = self.width, self.height
+        padded = np.pad(self.distance, 1, constant_values=np.inf)
+        padded_blocked = np.pad(self.occupancy, 1, constant_values=False)
+        penalty = float(w * h) * 2.0
+        candidates = np.empty((len(NEIGHBOR_STEPS), w, h))
+        for k, (dx, dy, cost) in enumerate(NEIGHBOR_STEPS):
+            nb = padded[1 + dx:1 + dx + w, 1 + dy:1 + dy + h]
+            enter = np.where(padded_blocked[1 + dx:1 + dx + w, 1 + dy:1 + dy + h], penalty, 0.0)
+            candidates[k] = nb + cost + enter
+        best = np.argmin(candidates, axis=0)
+        offsets = np.array([(dx, dy) for dx, dy, _ in NEIGHBOR_STEPS])
+        xs, ys = np.meshgrid(np.arange(w), np.arange(h), indexing='ij')
+        next_x = xs + offsets[best, 0]
+        next_y = ys + offsets[best, 1]
+        # 目標セル自身と到達不能セルは移動先なし
+        stop = ~np.isfinite(self.distance) | ~np.isfinite(np.min(candidates, axis=0))
+        stop[self.goal_cell] = True
+        next_x[stop] = -1
+        next_y[stop] = -1
+        return next_x, next_y
+
+    def next_cell(self, cell):
+        # cell: (int, int)。次の移動先セルを返す（なければNone）
+        x, y = cell
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        nx = self.next_x[x, y]
+        if nx < 0:
+            return None
+        return (int(nx), int(self.next_y[x, y]))
+
+    def distance_at(self, cell):
+        x, y = cell
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return np.inf
+        return float(self.distance[x, y])
+
+
+class FlowFieldCache:
+    """
+    追従対象（案内人）ごとの距離場を保持し、目標セルが変わったときだけ再計算する
+    """
+    def __init__(self, grid):
+        # grid: Environment
+        self.grid = grid
+        self._fields = {}  # owner -> FlowField
+        self._obstacle_version = grid.obstacle_version
+        self.rebuilds = 0
+        self._lock = threading.RLock()  # 段階実行で複数スレッドから呼ばれても距離場を二重に作らないため
+
+    def field_for(self, owner, target_pos):
+        # owner: 追従対象（案内人など）、target_pos: 目標座標（float可）
+        with self._lock:
+            return self._field_for(owner, target_pos)
+
+    def _field_for(self, owner, target_pos):
+        if self._obstacle_version != self.grid.obstacle_version:
+            self._fields.clear()
+            self._obstacle_version = self.grid.obstacle_version
+        goal_cell = (int(round(target_pos[0])), int(round(target_pos[1])))
+        field = self._fields.get(owner)
+        if field is None or field.goal_cell != self._clamp(goal_cell):
+            field = FlowField(self.grid.occupancy, goal_cell)
+            self._fields[owner] = field
+            self.rebuilds += 1
+        return field
+
+    def __getstate__(self):
+        # 距離場は目標セルから同じものを作り直せるので、チェックポイントには含めない
+        state = self.__dict__.copy()
+        state['_fields'] = {}
+        state.pop('_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def _clamp(self, cell):
+        w, h = self.grid.occupancy.shape
+        return (min(max(cell[0], 0), w - 1), min(max(cell[1], 0), h - 1))
@@ -0,0 +1,67 @@
+# 案内人と見学者のグループ対応表のクラス定義ファイル
+# 案内人ごとにその案内人に付いている見学者の集合を、見学者ごとに担当の案内人を保持します。
+# 案内人ごとの問い合わせやイベント通知は、全エージェントを走査せずにそのグループだけを対象にできます。
+
+class GroupRegistry:
+    """
+    案内人 ⇔ 見学者のグループ対応表
+    - guides: 登録順の案内人リスト
+    - members[guide]: その案内人のグループの見学者（登録順を保つdict）
+    - guide_of[visitor]: 見学者の担当案内人
+    - version: 対応表が変わるたびに増える（一括更新エンジンなどがグループ配列を作り直す目印）
+    """
+    def __init__(self):
+        self.guides = []
+        self.members = {}  # guide -> {visitor: None}
+        self.guide_of = {}  # visitor -> guide
+        self.version = 0
+
+    def add_guide(self, guide):
+        if guide not in self.members:
+            self.guides.append(guide)
+            self.members[guide] = {}
+            self.version += 1
+
+    def add_visitor(self, visitor, guide):
+        """visitor を guide のグループに入れる（別のグループにいれば移す）"""
+        self.add_guide(guide)
+        previous = self.guide_of.get(visitor)
+        if previous is not None:
+            del self.members[previous][visitor]
+        self.members[guide][visitor] = None
+        self.guide_of[visitor] = guide
+        self.version += 1
+
+    def assign(self, visitor, guide):
+        """見学者の担当案内人を変更する（visitor.follow で visitor.guide とイベントの購読も付け替える）"""
+        self.add_visitor(visitor, guide)
+        visitor.follow(guide)
+
+    def remove(self, agent):
+        """案内人または見学者を対応表から外す（案内人を外すとグループの見学者は担当なしになる）"""
+        if agent in self.members:
+            for visitor in self.members.pop(agent):
+                del self.guide_of[visitor]
+            self.guides.remove(agent)
+        guide = self.guide_of.pop(agent, None)
+        if guide is not None:
+            del self.members[guide][agent]
+        self.version += 1
+
+    def visitors_of(self, guide):
+        """guide のグループの見学者（登録順）"""
+        return list(self.members.get(guide, ()))
+
+    @property
+    def visitors(self):
+        """グループに属する全見学者（登録順）"""
+        return list(self.guide_of)
+
+    def guide_for(self, visitor):
+        return self.guide_of.get(visitor)
+
+    def first_guide(self):
+        return self.guides[0] if self.guides else None
+
+    def __len__(self):
+        return len(self.guides)
@@ -0,0 +1,141 @@
+# マップjsonの読み込み関数定義ファイル
+# マップエディタ（layout_soft）で作成したjsonから、障害物セル・展示物の連結成分と中心座標を取り出します。
+# セル値はNumPy配列に読み込み、展示物の連結成分は横方向の連続区間をまとめて配列演算でラベル付けします。
+# 解析結果はマップファイルのハッシュをキーに .npz としてキャッシュし、同じマップの2回目以降はjsonを解析しません。
+# pygameに依存しないため、UIとヘッドレス実行の両方から利用します。
+
+import hashlib
+import json
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+import config
+
+# セル値
+EMPTY = 0
+OBSTACLE = 1
+EXHIBIT = 2
+
+MAP_CACHE_VERSION = 1  # 解析結果の形式を変えたら上げる（古いキャッシュを使わないため）
+
+
+class MapLayout(NamedTuple):
+    """解析済みのマップ"""
+    grid: np.ndarray  # (高さ, 幅) int8 のセル値（jsonの "map" と同じ行優先）
+    obstacles: np.ndarray  # (N, 2) 障害物セルの (x, y)（行優先順）
+    exhibit_labels: np.ndarray  # (高さ, 幅) int32 展示物の番号（展示物でないセルは -1）
+    exhibit_centers: np.ndarray  # (展示物数, 2) 各展示物のセルの平均座標 (x, y)
+
+    @property
+    def occupancy(self):
+        """Environment.occupancy と同じ [x, y] の障害物ビットマップ"""
+        return (self.grid == OBSTACLE).T
+
+    def exhibit_groups(self):
+        """展示物ごとのセル (x, y) のリスト（展示物は最初のセルの行優先順、セルも行優先順）"""
+        ys, xs = np.nonzero(self.exhibit_labels >= 0)
+        labels = self.exhibit_labels[ys, xs]
+        order = np.argsort(labels, kind="stable")
+        cells = list(zip(xs[order].tolist(), ys[order].tolist()))
+        groups = []
+        start = 0
+        for count in np.bincount(labels, minlength=len(self.exhibit_centers)).tolist():
+            groups.append(cells[start:start + count])
+            start += count
+        return groups
+
+
+def label_components(mask):
+    """
+    mask (高さ, 幅) の4近傍連結成分に番号を付ける（番号は最初のセルの行優先順に0から、mask外は -1）
+    横方向の連続区間を1単位とし、上下に接する区間同士を最小番号の伝播とポインタジャンプでまとめる
+    """
+    mask = np.asarray(mask, dtype=bool)
+    labels = np.full(mask.shape, -1, dtype=np.int32)
+    if not mask.any():
+        return labels
+    starts = mask.copy()
+    starts[:, 1:] &= ~mask[:, :-1]
+    run_ids = np.cumsum(starts.ravel()).reshape(mask.shape) - 1
+    # 上下に隣接する区間の組
+    vertical = mask[:-1] & mask[1:]
+    a = run_ids[:-1][vertical]
+    b = run_ids[1:][vertical]
+    run_labels = np.arange(int(run_ids.max()) + 1)
+    while len(a):
+        merged = np.minimum(run_labels[a], run_labels[b])
+        np.minimum.at(run_labels, a, merged)
+        np.minimum.at(run_labels, b, merged)
+        run_labels = run_labels[run_labels]
+        if np.array_equal(run_labels[a], run_labels[b]):
+            break
+    # 各成分の番号はその成分で最小の区間番号に収束するので、出現順の連番に振り直す
+    _, compact = np.unique(run_labels, return_inverse=True)
+    labels[mask] = compact[run_ids[mask]]
+    return labels
+
+
+def parse_map(grid):
+    """セル値の2次元配列から MapLayout を作る"""
+    grid = np.asarray(grid, dtype=np.int8)
+    ys, xs = np.nonzero(grid == OBSTACLE)
+    obstacles = np.stack([xs, ys], axis=1)
+    exhibit_labels = label_components(grid == EXHIBIT)
+    ey, ex = np.nonzero(exhibit_labels >= 0)
+    labels = exhibit_labels[ey, ex]
+    num_exhibits = int(labels.max()) + 1 if len(labels) else 0
+    counts = np.bincount(labels, minlength=num_exhibits)
+    centers = np.stack([np.bincount(labels, weights=ex, minlength=num_exhibits),
+                        np.bincount(labels, weights=ey, minlength=num_exhibits)], axis=1) / np.maximum(counts, 1)[:, None]
+    return MapLayout(grid, obstacles, exhibit_labels, centers.reshape(-1, 2))
+
+
+def save_map(layout, path):
+    """MapLayout を .npz に保存する（load_map でjsonの代わりに読み込める）"""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, version=MAP_CACHE_VERSION, **layout._asdict())
+    os.replace(tmp_path, path)
+
+
+def _load_npz(path):
+    with np.load(path) as data:
+        if "version" in data and int(data["version"]) != MAP_CACHE_VERSION:
+            raise ValueError(f"マップ形式の版が違います: {path}")
+        return MapLayout(*(data[name] for name in MapLayout._fields))
+
+
+def load_map(map_path, cache_dir=config.DEFAULT_CACHE_DIR):
+    """
+    マップを MapLayout として読み込む
+    - map_path: マップエディタのjson、または save_map で保存した .npz
+    - cache_dir: jsonの解析結果をファイルのハッシュをキーに保存・再利用する（Noneなら毎回解析する）
+    """
+    if map_path.endswith(".npz"):
+        return _load_npz(map_path)
+    with open(map_path, "rb") as f:
+        raw = f.read()
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, f"map_{hashlib.sha1(raw).hexdigest()}.npz")
+        if os.path.exists(cache_path):
+            try:
+                return _load_npz(cache_path)
+            except (OSError, ValueError, KeyError):
+                pass  # 壊れたキャッシュ・古い版は作り直す
+    layout = parse_map(json.loads(raw.decode("utf-8"))["map"])
+    if cache_path:
+        save_map(layout, cache_path)
+    return layout
+
+
+def load_layout_from_json(json_path, cache_dir=config.DEFAULT_CACHE_DIR):
+    """(障害物セルのリスト, 展示物の中心座標のリスト, 展示物ごとのセルのリスト) を返す"""
+    layout = load_map(json_path, cache_dir)
+    obstacle_list = [tuple(p) for p in layout.obstacles.tolist()]
+    exhibit_centers = [tuple(c) for c in layout.exhibit_centers.tolist()]
+    return obstacle_list, exhibit_centers, layout.exhibit_groups()
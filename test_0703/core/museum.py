@@ -2,15 +2,23 @@
 # このクラスは、エージェントや障害物の初期化、シミュレーションの進行管理を行います。
 # 各メソッドや変数の役割は下記コメントを参照してください。
 
-import random
 import pandas as pd
 import numpy as np
 from mesa import Model
-from mesa.time import RandomActivation
-from mesa.datacollection import DataCollector
 from .environment import Environment
 from .id_generator import UniqueIDGenerator
-from agents.visitor import Visitor
+from .pathfinding import PathPlanner
+from .flow_field import FlowFieldCache
+from .batch_engine import VisitorBatchEngine
+from .obstacle_field import ObstacleField
+from .watch_time import WatchTimeAccumulator
+from .data_collector import AgentPositionCollector
+from . import checkpoint as checkpoint_io
+from .visibility import VisibilityCache
+from .groups import GroupRegistry
+from .schedule import TypedRandomActivation, StagedActivation
+from event.event_bus import EventBus
+from agents.visitor import Visitor, MAX_FORCE
 from agents.guide import Guide
 from agents.exhibit import Exhibit
 from config import get_visitor_speeds
@@ -22,17 +30,43 @@ class Museum(Model):
     - エージェントや障害物の初期化
     - シミュレーションの進行管理
     """
-    def __init__(self, width, height, num_visitors=0, num_guides=0, num_exhibits=4, num_obstacles=20, guide_start_pos=(1,1), guide_destinations=None, obstacle_lines=None, visitor_start_pos=None):
-        self.grid = Environment(width, height, grid_width=width, grid_height=height, obstacle_lines=obstacle_lines)
-        self.schedule = RandomActivation(self)
+    def __init__(self, width, height, num_visitors=0, num_guides=0, num_exhibits=4, num_obstacles=20, guide_start_pos=(1,1), guide_destinations=None, obstacle_lines=None, visitor_start_pos=None, navigation="astar", batch_visitors=False, obstacle_field_subdivisions=0, cache_dir=config.DEFAULT_CACHE_DIR, seed=None, visitor_speeds=None, guide_wait_duration=None, collect_every=1, obstacle_cells=None, scheduler="random", workers=1, skip_dormant=False):
+        # navigation: 案内人が見えない見学者の経路追従方式（"astar" または "flow_field"）
+        # batch_visitors: Trueなら見学者を配列でまとめて更新する（VisitorBatchEngine）
+        # obstacle_field_subdivisions: 障害物反発場の1セルあたりの分割数（0 または None なら毎回7x7走査。既定は0）
+        #   反発場を使うと障害物回避力が格子点からの補間値になるので、7x7走査とは軌跡がわずかに変わる
+        # cache_dir: 事前計算結果のキャッシュ先（Noneならディスクに保存しない）
+        # seed: 乱数シード。self.random（mesa）と self.np_random をこの値から作るので、グローバルな乱数状態に依存しない
+        # visitor_speeds: 見学者の最高速度（数値なら全員同じ、リストなら順に割り当て。Noneなら config.get_visitor_speeds）
+        # guide_wait_duration: 案内人の目的地での待機ステップ数（Noneなら Guide の既定値）
+        # collect_every: 案内人・見学者の座標を何ステップごとに self.dc へ記録するか
+        # obstacle_cells: 障害物セルの (N, 2) 配列または [x, y] の占有ビットマップ（obstacle_lines より速く配置できる）
+        # scheduler: "random"（mesaのRandomActivationと同じ逐次更新）または "staged"（見学者を sense → decide → move で同時更新）
+        # workers: scheduler="staged" のとき見学者の decide を評価するスレッド数（使い終わったら close() でスレッドを止める）
+        # skip_dormant: Trueなら巡回を終えた案内人・停止中の案内人のそばで落ち着いた見学者を休止させ、起こされるまで step しない
+        #   （一括更新エンジンは見学者を休止させないので、batch_visitors とは併用できない）
+        if skip_dormant and batch_visitors:
+            raise ValueError("batch_visitors は見学者を全員まとめて更新し休止させないので、skip_dormant とは併用できません")
+        self.np_random = np.random.default_rng(self.random.getrandbits(64))
+        self.visitor_speeds = visitor_speeds
+        self.guide_wait_duration = guide_wait_duration
+        self.grid = Environment(width, height, grid_width=width, grid_height=height, obstacle_lines=obstacle_lines, obstacle_cells=obstacle_cells)
+        self.path_planner = PathPlanner(self.grid)  # 案内人・見学者で共有する経路探索
+        self.flow_fields = FlowFieldCache(self.grid)  # 案内人ごとの距離場（flow_fieldモード用）
+        self.visibility = VisibilityCache(self.grid)  # セル間の遮蔽判定（LRUキャッシュ付き）
+        self.navigation = navigation
+        if scheduler == "staged":
+            if batch_visitors:
+                raise ValueError("batch_visitors は既に見学者を同時更新するので、scheduler='staged' とは併用できません")
+            self.schedule = StagedActivation(self, Visitor, workers=workers, skip_dormant=skip_dormant)
+        elif scheduler == "random":
+            self.schedule = TypedRandomActivation(self, skip_dormant=skip_dormant)  # 種類別のエージェント一覧つき
+        else:
+            raise ValueError(f"未知のスケジューラ: {scheduler}")
+        self.schedule.attach_spatial_index(self.grid.agent_index)  # 近くに来たエージェントで休止中の見学者を起こす
         self.id_generator = UniqueIDGenerator()
-        self.dc = DataCollector(
-            agent_reporters={
-                "x": lambda a: a.pos[0],
-                "y": lambda a: a.pos[1],
-                "AgentType": lambda a: a.__class__.__name__,
-            }
-        )
+        self.groups = GroupRegistry()  # 案内人 ⇔ 見学者のグループ対応
+        self.events = EventBus()  # 案内人の出発・到着・説明の開始/終了（ステップの終わりにまとめて配送）
         self.exhibit_positions = []
         self.create_exhibits(num_exhibits)
         self.set_obstacles(num_obstacles)
@@ -40,9 +74,24 @@ class Museum(Model):
             guide_destinations = [exhibit.pos for exhibit in getattr(self, 'exhibits', [])]
         self.set_init_agent(Guide, num_guides, guide_start_pos, guide_destinations)
         self.set_init_agent(Visitor, num_visitors, guide_start_pos, None, visitor_start_pos=visitor_start_pos)
+        # 障害物はここで確定するので、反発場を一度だけ計算する
+        # （保存する合力の上限は見学者の max_force の最大値。各見学者は自分の max_force で改めて上限処理する）
+        self.obstacle_field = None
+        if obstacle_field_subdivisions:
+            max_force = max((visitor.max_force for visitor in self.groups.visitors), default=MAX_FORCE)
+            self.obstacle_field = ObstacleField(self.grid, obstacle_field_subdivisions, cache_dir, max_force=max_force)
+        self.visitor_engine = None
+        if batch_visitors:
+            self.visitor_engine = VisitorBatchEngine(self, self.groups.visitors)
+        # 展示物の視聴時間は全見学者×全展示物を1回の演算でまとめて数える
+        watch_visitors = self.visitor_engine.visitors if self.visitor_engine is not None else self.groups.visitors
+        self.watch_times = WatchTimeAccumulator(self, watch_visitors, self.exhibits)
+        # 座標の記録は動くエージェントだけを配列に（展示物は毎ステップ同じなので記録しない）
+        self.dc = AgentPositionCollector(self.schedule.agents_of(Guide, Visitor), every=collect_every)
         self.running = True
 
     def create_exhibits(self, num_exhibits):
+        # 展示物の視聴時間は self.watch_times がまとめて数えるので、展示物はスケジュールに入れない（step しない）
         self.exhibits = []
         exhibit_positions = getattr(config, 'EXHIBIT_POSITIONS', None)
         if exhibit_positions:
@@ -51,49 +100,110 @@ class Museum(Model):
             for i, pos in enumerate(self.exhibit_positions):
                 exhibit = Exhibit(f"Exhibit_{i}", pos, self)
                 self.exhibits.append(exhibit)
-                self.schedule.add(exhibit)
         else:
             self.exhibit_positions = [(2, y) for y in range(1, 6)]
             for i in range(num_exhibits):
-                pos = self.exhibit_positions[i] if i < len(self.exhibit_positions) else (random.uniform(0, self.grid.width-1), random.uniform(0, self.grid.height-1))
+                pos = self.exhibit_positions[i] if i < len(self.exhibit_positions) else (self.random.uniform(0, self.grid.width-1), self.random.uniform(0, self.grid.height-1))
                 exhibit = Exhibit(f"Exhibit_{i}", pos, self)
                 self.exhibits.append(exhibit)
-                self.schedule.add(exhibit)
 
     def set_obstacles(self, num_obstacles):
         for _ in range(num_obstacles):
             while True:
-                pos = (random.uniform(0, self.grid.width-1), random.uniform(0, self.grid.height-1))
+                pos = (self.random.uniform(0, self.grid.width-1), self.random.uniform(0, self.grid.height-1))
                 if not self.grid.is_obstacle(pos):
                     self.grid.place_obstacle(pos)
                     break
 
     def set_init_agent(self, agent_class, num_agents, guide_start_pos=(1,1), guide_destinations=None, visitor_start_pos=None):
         destinations = guide_destinations if guide_destinations is not None else [exhibit.pos for exhibit in getattr(self, 'exhibits', [])]
-        guides = [agent for agent in self.schedule.agents if isinstance(agent, Guide)]
-        visitor_speeds = get_visitor_speeds(num_agents) if agent_class.__name__ == "Visitor" else None
+        guides = list(self.groups.guides)
+        visitor_speeds = self.get_visitor_speeds(num_agents) if agent_class.__name__ == "Visitor" else None
         for i in range(num_agents):
             if agent_class == Visitor:
                 if not guides: raise ValueError("案内人エージェントが存在しません。")
-                guide = random.choice(guides)
-                pos = visitor_start_pos if visitor_start_pos else (guide.pos[0] + random.uniform(-0.5, 0.5), guide.pos[1] + random.uniform(-0.5, 0.5))
+                guide = self.random.choice(guides)
+                pos = visitor_start_pos if visitor_start_pos else (guide.pos[0] + self.random.uniform(-0.5, 0.5), guide.pos[1] + self.random.uniform(-0.5, 0.5))
                 agent = agent_class(f"Visitor_{i}", pos, self, guide, visitor_speeds[i] if visitor_speeds else None)
+                self.groups.add_visitor(agent, guide)
             elif agent_class == Guide:
                 agent = agent_class(f"Guide_{i}", guide_start_pos, self, destinations)
+                if self.guide_wait_duration is not None:
+                    agent.wait_duration = self.guide_wait_duration
+                self.groups.add_guide(agent)
             self.grid.place_agent(agent, agent.pos)
             self.schedule.add(agent)
 
+    def get_visitor_speeds(self, num_visitors):
+        # visitor_speeds の指定があればそれを、なければ config の速度表を使う
+        speeds = self.visitor_speeds
+        if speeds is None:
+            return get_visitor_speeds(num_visitors, rng=self.random)
+        if np.isscalar(speeds):
+            return [float(speeds)] * num_visitors
+        speeds = list(speeds)
+        return [speeds[i % len(speeds)] for i in range(num_visitors)]
+
     def step(self):
+        # 一括更新エンジンは案内人が動く前の状態を見る（scheduler="staged" の decide と同じ時点）
+        if self.visitor_engine is not None:
+            self.visitor_engine.step()
         self.schedule.step()
+        self.events.dispatch()
+        self.watch_times.step()
         self.dc.collect(self)
 
+    def close(self):
+        """実行のために確保したスレッドプール（scheduler="staged", workers > 1）を止める（close 後に step すれば作り直す）"""
+        shutdown = getattr(self.schedule, 'shutdown', None)
+        if shutdown is not None:
+            shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def checkpoint(self, path=None):
+        """
+        現在の状態をチェックポイントにする
+        - path を指定するとファイルに書き出してバイト数を、省略するとバイト列を返す
+        """
+        if path is None:
+            return checkpoint_io.dumps(self)
+        return checkpoint_io.save(self, path)
+
+    @classmethod
+    def restore(cls, source, seed=None):
+        """
+        チェックポイント（バイト列またはファイルパス）からモデルを復元する
+        - seed: 指定すると復元後の乱数を振り直す（同じチェックポイントから別々の実行に分岐させる）
+        """
+        model = checkpoint_io.loads(source) if isinstance(source, (bytes, bytearray)) else checkpoint_io.load(source)
+        if not isinstance(model, cls):
+            raise TypeError(f"{cls.__name__} のチェックポイントではありません")
+        model._rebuild_after_restore()
+        if seed is not None:
+            model.reset_randomizer(seed)
+            model.np_random = np.random.default_rng(model.random.getrandbits(64))
+        return model
+
+    def _rebuild_after_restore(self):
+        # チェックポイントに含めなかった反発場を読み直し、一括更新エンジンの行ビューを張り直す
+        if self.obstacle_field is not None:
+            self.obstacle_field.restore_values()
+        if self.visitor_engine is not None:
+            self.visitor_engine._attach()
+
     ### 変更点 ###
-    def get_guide_path_info(self):
+    def get_guide_path_info(self, guide=None):
         """
         見学者が案内人の経路情報を取得するためのヘルパー。
-        複数案内人の場合は最初の案内人を返す。
+        guide を省略した場合は最初の案内人を返す（見学者からは visitor.guide を渡す）。
         """
-        guide = next((agent for agent in self.schedule.agents if isinstance(agent, Guide)), None)
+        if guide is None:
+            guide = self.groups.first_guide()
         if guide and guide.current_path:
             return guide.current_path, guide.path_step
         else:
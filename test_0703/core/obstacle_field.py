@@ -0,0 +1,139 @@
+# 障害物反発力の事前計算場のクラス定義ファイル
+# 障害物はMuseum.__init__以降変化しないため、Visitor.avoid_obstaclesの7x7近傍走査の結果を
+# 細かいサブグリッド上で一度だけ計算し、実行時は双一次補間の配列参照だけで反発力を求めます。
+# 同じレイアウトを繰り返し実行する場合に備え、マップのハッシュをキーにディスクへキャッシュします。
+
+import hashlib
+import os
+import numpy as np
+from agents.visitor import MAX_FORCE
+
+# 障害物回避で調べる7x7近傍（中心を除く）
+WINDOW_OFFSETS = np.array([(dx, dy) for dx in range(-3, 4) for dy in range(-3, 4) if (dx, dy) != (0, 0)])
+CHECK_RADIUS = 3.0
+FIELD_VERSION = 2  # 計算式を変えたら上げる（古いキャッシュを使わないため）
+
+
+def obstacle_steering(grid, points, chunk_size=4096):
+    """
+    Visitor.avoid_obstacles の力の上限処理前の合力を、複数座標についてまとめて計算する
+    - grid: Environment
+    - points: (N, 2) の座標配列
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    steering = np.zeros_like(points)
+    for start in range(0, len(points), chunk_size):
+        pos = points[start:start + chunk_size]
+        cells = np.rint(pos).astype(np.int64)[:, None, :] + WINDOW_OFFSETS[None, :, :]
+        inside = ((cells[..., 0] >= 0) & (cells[..., 0] < grid.width)
+                  & (cells[..., 1] >= 0) & (cells[..., 1] < grid.height))
+        blocked = np.zeros(inside.shape, dtype=bool)
+        blocked[inside] = grid.occupancy[cells[..., 0][inside], cells[..., 1][inside]]
+        diff = pos[:, None, :] - cells
+        dist = np.hypot(diff[..., 0], diff[..., 1])
+        active = blocked & (dist > 0) & (dist < CHECK_RADIUS)
+        weight = np.where(active, 1.0 / (dist + 1e-6) * (2.0 / (dist ** 2 + 1e-6)), 0.0)
+        steering[start:start + chunk_size] = (diff * weight[..., None]).sum(axis=1)
+    return steering
+
+
+class ObstacleField:
+    """
+    障害物反発ベクトル場
+    - subdivisions: 1セルあたりのサンプル数（大きいほど正確・メモリ増）
+    - max_force: 合力の大きさの上限（Museum は見学者の max_force の最大値を渡す）。壁際で発散する合力は
+      上限処理後の値を保存しておくと補間誤差が小さい
+    - values: [i, j] が座標 (i / subdivisions, j / subdivisions) での合力（float32）
+    - cache_dir: 指定するとマップのハッシュをキーに .npy で保存・再利用する
+    """
+    def __init__(self, grid, subdivisions=4, cache_dir=None, max_force=MAX_FORCE):
+        self.grid = grid
+        self.subdivisions = int(subdivisions)
+        self.max_force = float(max_force)
+        self.cache_dir = cache_dir
+        self.obstacle_version = grid.obstacle_version
+        self.loaded_from_cache = False
+        self.values = self._load_or_compute()
+
+    def __getstate__(self):
+        # 反発場はマップから決まるので、チェックポイントには含めず restore_values で読み直す
+        state = self.__dict__.copy()
+        state['values'] = None
+        return state
+
+    def restore_values(self):
+        """チェックポイントから復元した後に、反発場をキャッシュから読み込むか計算し直す"""
+        if self.values is None:
+            self.values = self._load_or_compute()
+
+    def map_hash(self):
+        # 占有ビットマップ・サイズ・分割数・計算式の版から決まるキー
+        digest = hashlib.sha1()
+        digest.update(np.ascontiguousarray(self.grid.occupancy).tobytes())
+        digest.update(repr((self.grid.occupancy.shape, float(self.grid.width), float(self.grid.height),
+                            self.subdivisions, self.max_force, FIELD_VERSION)).encode())
+        return digest.hexdigest()
+
+    def _load_or_compute(self):
+        path = None
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, f"obstacle_field_{self.map_hash()}.npy")
+            if os.path.exists(path):
+                try:
+                    values = np.load(path)
+                    self.loaded_from_cache = True
+                    return values
+                except (OSError, ValueError):
+                    pass  # 壊れたキャッシュは作り直す
+        values = self._compute()
+        if path:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, values)
+            os.replace(tmp_path, path)
+        return values
+
+    def _compute(self):
+        sub = self.subdivisions
+        w, h = self.grid.occupancy.shape
+        xs = np.arange(w * sub + 1) / sub
+        ys = np.arange(h * sub + 1) / sub
+        gx, gy = np.meshgrid(xs, ys, indexing='ij')
+        points = np.stack([gx.ravel(), gy.ravel()], axis=1)
+        steering = obstacle_steering(self.grid, points)
+        norm = np.hypot(steering[:, 0], steering[:, 1])
+        over = norm > self.max_force
+        steering[over] *= (self.max_force / norm[over])[:, None]
+        return steering.reshape(len(xs), len(ys), 2).astype(np.float32)
+
+    def sample_batch(self, points):
+        """複数座標の合力を双一次補間で返す ((N, 2))"""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        nx, ny = self.values.shape[:2]
+        u = np.clip(points[:, 0] * self.subdivisions, 0, nx - 1)
+        v = np.clip(points[:, 1] * self.subdivisions, 0, ny - 1)
+        i0 = np.minimum(u.astype(np.int64), nx - 2)
+        j0 = np.minimum(v.astype(np.int64), ny - 2)
+        fu = (u - i0)[:, None]
+        fv = (v - j0)[:, None]
+        values = self.values
+        return ((1 - fu) * (1 - fv) * values[i0, j0] + fu * (1 - fv) * values[i0 + 1, j0]
+                + (1 - fu) * fv * values[i0, j0 + 1] + fu * fv * values[i0 + 1, j0 + 1])
+
+    def sample(self, pos):
+        """1点の合力を双一次補間で返す"""
+        nx, ny = self.values.shape[:2]
+        u = min(max(float(pos[0]) * self.subdivisions, 0.0), nx - 1.0)
+        v = min(max(float(pos[1]) * self.subdivisions, 0.0), ny - 1.0)
+        i0 = min(int(u), nx - 2)
+        j0 = min(int(v), ny - 2)
+        fu = u - i0
+        fv = v - j0
+        block = self.values[i0:i0 + 2, j0:j0 + 2].astype(float)
+        return ((1 - fu) * ((1 - fv) * block[0, 0] + fv * block[0, 1])
+                + fu * ((1 - fv) * block[1, 0] + fv * block[1, 1]))
+
+    def is_current(self):
+        # 構築後に障害物が追加されていなければTrue
+        return self.obstacle_version == self.grid.obstacle_version
@@ -0,0 +1,353 @@
+# 経路探索サービスのクラス定義ファイル
+# このクラスは、案内人・見学者が共通で利用するA*探索と経路キャッシュを提供します。
+# Museumが1つだけ保持し、同じ(開始セル, 目標セル)への探索を複数エージェントで共有します。
+
+import heapq
+import math
+import threading
+import numpy as np
+
+# 8方向の隣接セル
+NEIGHBOR_OFFSETS = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+SQRT2 = 2 ** 0.5
+INF = float('inf')
+
+
+class PathPlanner:
+    """
+    キャッシュ付きA*経路探索サービス
+    - 経路は (開始セル, 目標セル, 到達判定半径) をキーに保持
+    - 追従対象（owner）の目標セルが変わったら古い目標の経路を破棄
+    - 見つかった経路の途中セルからの部分経路も登録し、後続の探索を省略
+    - tolerance が1より大きいと（案内人・見学者は1.5を使う）目標は目標セル周辺の領域になり、
+      ヒューリスティックが領域に対して許容的でなくなるので、返す経路は最短とは限らない。
+      このため tolerance=1.5 では、この A* と変更前の探索（bench_pathfinding.py の legacy）、
+      ジャンプポイント探索とで、経路コストが互いに異なることがある（tolerance=1.0 ならどれも最短）
+    """
+    def __init__(self, grid, max_goals=64, use_jps=False):
+        # grid: Environment
+        # max_goals: 保持する目標セル数の上限（古いものから破棄）
+        # use_jps: ジャンプポイント探索を使うか（均一コストグリッド向け）
+        self.grid = grid
+        self.max_goals = max_goals
+        self.use_jps = use_jps
+        self._cache = {}  # (目標セル, 到達判定半径) -> {開始セル: 経路タプル or None}
+        self._owner_goals = {}  # owner -> 直前の目標キー
+        self._obstacle_version = grid.obstacle_version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()  # 段階実行で複数スレッドから呼ばれてもキャッシュを壊さないため
+
+    @staticmethod
+    def to_cell(pos):
+        # float座標をグリッドセルにスナップ（roundと同じ偶数丸め）
+        return (int(round(pos[0])), int(round(pos[1])))
+
+    def find_path(self, start, end, tolerance=1.0, owner=None):
+        """
+        start→end のセル経路をタプルで返す（見つからなければNone）
+        - tolerance: 目標セルからこの距離未満のセルに着いたら到達とみなす
+        - owner: 目標を追いかける主体（案内人など）。目標セルが変わったら古いキャッシュを破棄
+        """
+        with self._lock:
+            return self._find_path(start, end, tolerance, owner)
+
+    def _find_path(self, start, end, tolerance, owner):
+        if self._obstacle_version != self.grid.obstacle_version:
+            self.clear()
+            self._obstacle_version = self.grid.obstacle_version
+        start_cell = self.to_cell(start)
+        goal_key = (self.to_cell(end), tolerance)
+        if owner is not None:
+            previous = self._owner_goals.get(owner)
+            if previous != goal_key:
+                self._owner_goals[owner] = goal_key
+                if previous is not None and previous not in self._owner_goals.values():
+                    self._cache.pop(previous, None)
+        bucket = self._cache.get(goal_key)
+        if bucket is None:
+            while len(self._cache) >= self.max_goals:
+                self._cache.pop(next(iter(self._cache)))
+            bucket = self._cache[goal_key] = {}
+        if start_cell in bucket:
+            self.hits += 1
+            return bucket[start_cell]
+        self.misses += 1
+        path = self._astar_search(start_cell, goal_key[0], tolerance)
+        if path is None:
+            bucket[start_cell] = None
+            return None
+        path = tuple(path)
+        bucket[start_cell] = path
+        # 最短経路の部分経路もまた最短経路なので、途中セルからの探索結果として共有する
+        for i in range(1, len(path)):
+            bucket.setdefault(path[i], path[i:])
+        return path
+
+    def clear(self):
+        self._cache.clear()
+        self._owner_goals.clear()
+
+    def __getstate__(self):
+        # チェックポイントには経路キャッシュ（同コスト経路のどれを返すかに影響する）だけを残し、
+        # 平坦化グリッドは復元後の最初の探索で作り直す
+        state = self.__dict__.copy()
+        for name in ('_shape', '_stride', '_walkable', '_steps', '_jump_tables', '_prepared_version', '_lock'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def _prepare_grid(self):
+        """探索用の平坦化グリッドを作る（外周1セルを障害物で埋め、範囲チェックを不要にする）"""
+        w, h = self.grid.occupancy.shape
+        padded = np.ones((w + 2, h + 2), dtype=bool)
+        padded[1:-1, 1:-1] = self.grid.occupancy
+        self._shape = (w, h)
+        self._stride = h + 2
+        self._walkable = (~padded).ravel().tolist()
+        stride = self._stride
+        # (平坦インデックスの差分, 移動コスト, dx, dy)
+        self._steps = [(dx * stride + dy, SQRT2 if dx and dy else 1.0, dx, dy) for dx, dy in NEIGHBOR_OFFSETS]
+        self._jump_tables = self._build_jump_tables(~padded) if self.use_jps else None
+        self._prepared_version = self.grid.obstacle_version
+
+    @staticmethod
+    def _build_jump_tables(walkable):
+        """
+        ジャンプポイント探索の直進ジャンプ用の表（上下左右の4方向）
+        (dx, dy) -> (次の障害物までのセル数, 次の強制隣接セルまでのセル数) の平坦化リスト
+        （強制隣接セルがなければ、どの障害物までのセル数よりも大きな値）。直進のジャンプを1セルずつ進めずに表引きで済ませる
+        """
+        w, h = walkable.shape
+        big = w * h
+        tables = {}
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            # 進行方向の両脇が塞がれていて、その斜め前が空いているセル（強制隣接セルを持つ）
+            side = np.roll(walkable, -1, axis=1) if dx else np.roll(walkable, -1, axis=0)
+            other_side = np.roll(walkable, 1, axis=1) if dx else np.roll(walkable, 1, axis=0)
+            ahead = np.roll(walkable, (-dx, -dy), axis=(0, 1))
+            forced = walkable & ((~side & np.roll(ahead, -1, axis=1 if dx else 0))
+                                 | (~other_side & np.roll(ahead, 1, axis=1 if dx else 0)))
+            axis = 0 if dx else 1
+            step = dx or dy
+            tables[(dx, dy)] = tuple(PathPlanner._steps_to_next(mask, axis, step, big).ravel().tolist()
+                                     for mask in (~walkable, forced))
+        return tables
+
+    @staticmethod
+    def _steps_to_next(mask, axis, step, big):
+        # 各セルから axis 方向へ step ずつ進んだとき、最初に mask が True になるまでのセル数（自身は含めない）
+        n = mask.shape[axis]
+        index = np.arange(n).reshape((-1, 1) if axis == 0 else (1, -1))
+        if step > 0:
+            nearest = np.where(mask, index, big)
+            nearest = np.flip(np.minimum.accumulate(np.flip(nearest, axis), axis=axis), axis)
+            following = np.full(mask.shape, big)
+            if axis == 0:
+                following[:-1] = nearest[1:]
+            else:
+                following[:, :-1] = nearest[:, 1:]
+            return following - index
+        nearest = np.where(mask, index, -big)
+        nearest = np.maximum.accumulate(nearest, axis=axis)
+        following = np.full(mask.shape, -big)
+        if axis == 0:
+            following[1:] = nearest[:-1]
+        else:
+            following[:, 1:] = nearest[:, :-1]
+        return index - following
+
+    def _astar_search(self, start_node, end_node, tolerance):
+        """
+        A*探索アルゴリズム（障害物回避、セル座標で探索）
+        - 平坦インデックス上で、遅延削除ヒープ＋探索済み集合を使う
+        - 移動コストとヒューリスティックはオクタイル距離（1, √2）
+        - use_jps が True の場合はジャンプポイント探索で展開数を減らす
+        """
+        if getattr(self, '_prepared_version', None) != self.grid.obstacle_version:
+            self._prepare_grid()
+        w, h = self._shape
+        if not (0 <= start_node[0] < w and 0 <= start_node[1] < h):
+            return None
+        if self.use_jps:
+            return self._jump_point_search(start_node, end_node, tolerance)
+        stride = self._stride
+        walkable = self._walkable
+        steps = self._steps
+        ex, ey = end_node[0] + 1, end_node[1] + 1
+        tol2 = tolerance * tolerance
+        start = (start_node[0] + 1) * stride + start_node[1] + 1
+        g_score = {start: 0.0}
+        came_from = {}
+        closed = set()
+        open_set = [(0.0, start)]
+        while open_set:
+            _, current = heapq.heappop(open_set)
+            if current in closed:
+                continue  # 古いエントリ（より短い経路で既に確定済み）
+            closed.add(current)
+            cx, cy = divmod(current, stride)
+            if (cx - ex) ** 2 + (cy - ey) ** 2 < tol2:
+                return self._reconstruct(came_from, current)
+            g_current = g_score[current]
+            for offset, cost, _, _ in steps:
+                neighbor = current + offset
+                if not walkable[neighbor] or neighbor in closed:
+                    continue
+                tentative_g_score = g_current + cost
+                if tentative_g_score < g_score.get(neighbor, INF):
+                    came_from[neighbor] = current
+                    g_score[neighbor] = tentative_g_score
+                    nx, ny = divmod(neighbor, stride)
+                    ddx = abs(nx - ex)
+                    ddy = abs(ny - ey)
+                    heuristic = (ddx + ddy) + (SQRT2 - 2.0) * min(ddx, ddy)
+                    heapq.heappush(open_set, (tentative_g_score + heuristic, neighbor))
+        return None
+
+    def _reconstruct(self, came_from, current):
+        stride = self._stride
+        path = []
+        while current in came_from:
+            path.append(current)
+            current = came_from[current]
+        path.append(current)
+        return [(p // stride - 1, p % stride - 1) for p in reversed(path)]
+
+    def _jump_point_search(self, start_node, end_node, tolerance):
+        """
+        ジャンプポイント探索（均一コスト8近傍グリッド、角のすり抜け可）
+        直進のジャンプは _jump_tables の表引きと目標領域との交差の計算で1回で求め、
+        斜めのジャンプだけを1セルずつ進める
+        """
+        stride = self._stride
+        walkable = self._walkable
+        tables = self._jump_tables
+        ex, ey = end_node[0] + 1, end_node[1] + 1
+        tol2 = tolerance * tolerance
+
+        def in_goal(cell):
+            x, y = divmod(cell, stride)
+            return (x - ex) ** 2 + (y - ey) ** 2 < tol2
+
+        def steps_to_goal(cell, dx, dy):
+            # cell から (dx, dy) 方向へ直進して、最初に目標領域に入るまでのセル数（入らなければ None）
+            x, y = divmod(cell, stride)
+            if dx:
+                along, across, center, step = x, y - ey, ex, dx
+            else:
+                along, across, center, step = y, x - ex, ey, dy
+            r2 = tol2 - across * across
+            if r2 <= 0:
+                return None
+            half = math.sqrt(r2)
+            if step > 0:
+                first = max(along + 1, math.floor(center - half) + 1)
+            else:
+                first = min(along - 1, math.ceil(center + half) - 1)
+            if (first - center) ** 2 >= r2:
+                first += step  # 境界の丸め誤差の分を1セルだけ補正する
+                if (first - center) ** 2 >= r2:
+                    return None
+            return (first - along) * step
+
+        def jump_straight(cell, dx, dy):
+            to_wall, to_forced = tables[(dx, dy)]
+            steps = to_forced[cell]
+            to_goal = steps_to_goal(cell, dx, dy)
+            if to_goal is not None and to_goal < steps:
+                steps = to_goal
+            if steps >= to_wall[cell]:
+                return None
+            return cell + steps * (dx * stride + dy)
+
+        def jump(cell, dx, dy):
+            if not (dx and dy):
+                return jump_straight(cell, dx, dy)
+            offset = dx * stride + dy
+            while True:
+                cell += offset
+                if not walkable[cell]:
+                    return None
+                if in_goal(cell):
+                    return cell
+                if ((not walkable[cell - dx * stride] and walkable[cell - dx * stride + dy])
+                        or (not walkable[cell - dy] and walkable[cell + dx * stride - dy])):
+                    return cell  # 強制隣接セルがある
+                if jump_straight(cell, dx, 0) is not None or jump_straight(cell, 0, dy) is not None:
+                    return cell
+
+        def directions(cell, parent):
+            if parent is None:
+                return [(dx, dy) for dx, dy in NEIGHBOR_OFFSETS]
+            px, py = divmod(parent, stride)
+            x, y = divmod(cell, stride)
+            dx = (x > px) - (x < px)
+            dy = (y > py) - (y < py)
+            dirs = []
+            if dx and dy:
+                dirs += [(dx, dy), (dx, 0), (0, dy)]
+                if not walkable[cell - dx * stride]:
+                    dirs.append((-dx, dy))
+                if not walkable[cell - dy]:
+                    dirs.append((dx, -dy))
+            elif dx:
+                dirs.append((dx, 0))
+                if not walkable[cell + 1]:
+                    dirs.append((dx, 1))
+                if not walkable[cell - 1]:
+                    dirs.append((dx, -1))
+            else:
+                dirs.append((0, dy))
+                if not walkable[cell + stride]:
+                    dirs.append((1, dy))
+                if not walkable[cell - stride]:
+                    dirs.append((-1, dy))
+            return dirs
+
+        start = (start_node[0] + 1) * stride + start_node[1] + 1
+        g_score = {start: 0.0}
+        came_from = {}
+        closed = set()
+        open_set = [(0.0, start)]
+        while open_set:
+            _, current = heapq.heappop(open_set)
+            if current in closed:
+                continue
+            closed.add(current)
+            if in_goal(current):
+                return self._expand_jumps(self._reconstruct(came_from, current))
+            cx, cy = divmod(current, stride)
+            g_current = g_score[current]
+            for dx, dy in directions(current, came_from.get(current)):
+                successor = jump(current, dx, dy)
+                if successor is None or successor in closed:
+                    continue
+                sx, sy = divmod(successor, stride)
+                n = max(abs(sx - cx), abs(sy - cy))
+                tentative_g_score = g_current + (SQRT2 if dx and dy else 1.0) * n
+                if tentative_g_score < g_score.get(successor, INF):
+                    came_from[successor] = current
+                    g_score[successor] = tentative_g_score
+                    ddx = abs(sx - ex)
+                    ddy = abs(sy - ey)
+                    heuristic = (ddx + ddy) + (SQRT2 - 2.0) * min(ddx, ddy)
+                    heapq.heappush(open_set, (tentative_g_score + heuristic, successor))
+        return None
+
+    @staticmethod
+    def _expand_jumps(jump_points):
+        # ジャンプポイント間を1セルずつ補間し、通常のA*と同じセル列に戻す
+        path = [jump_points[0]]
+        for x1, y1 in jump_points[1:]:
+            x, y = path[-1]
+            dx = (x1 > x) - (x1 < x)
+            dy = (y1 > y) - (y1 < y)
+            while (x, y) != (x1, y1):
+                x += dx
+                y += dy
+                path.append((x, y))
+        return path
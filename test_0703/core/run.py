@@ -0,0 +1,137 @@
+# ヘッドレス実行スクリプト
+# pygameを使わずに、マップjsonと設定からMuseumを構築し、指定ステップ数をフレームレート制限なしで実行して
+# エージェントの軌跡・展示物の視聴時間・実行サマリーを出力ディレクトリに書き出します。
+# 軌跡は ui/app.py と同じ軌跡ストアに記録するので、python ui/app.py --replay <out>/trajectory で再生できます。
+#
+# 実行方法（test_0703 直下で）:
+#   python -m core.run --map map_json/map1.json --steps 1000 --visitors 10 --out runs/run1
+
+import argparse
+import json
+import os
+import time
+
+import config
+from core.map_loader import load_map
+from core.museum import Museum
+from utils.logger import log_visitor_scores
+from utils.trajectory import mobile_agents
+from utils.trajectory_store import TrajectoryStore
+
+DEFAULT_MAP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'map_json', 'map1.json')
+
+
+def build_model(map_path=DEFAULT_MAP_PATH, num_visitors=config.DEFAULT_NUM_VISITORS, num_guides=config.DEFAULT_NUM_GUIDES,
+                seed=1, width=None, height=None, **museum_kwargs):
+    """
+    マップjsonからui/app.pyと同じ設定でMuseumを構築する
+    - width, height: グリッドの大きさ（Noneならマップの大きさ）
+    - museum_kwargs: navigation, batch_visitors などMuseumへの追加引数
+    """
+    layout = load_map(map_path)
+    map_height, map_width = layout.grid.shape
+    width = map_width if width is None else width
+    height = map_height if height is None else height
+    exhibit_centers = [tuple(center) for center in layout.exhibit_centers.tolist()]
+    model = Museum(
+        width, height, num_visitors, num_guides, len(exhibit_centers), 0,
+        guide_start_pos=config.DEFAULT_GUIDE_START_POS,
+        guide_destinations=exhibit_centers,
+        obstacle_cells=layout.obstacles,
+        visitor_start_pos=config.DEFAULT_VISITOR_START_POS,
+        seed=seed,
+        **museum_kwargs
+    )
+    model.dc.collect(model)
+    return model
+
+
+def run_simulation(model, steps, out_dir=None, write_positions=True, export_positions_csv=False):
+    """
+    model を steps ステップ（model.running が False になればそこまで）実行する
+    out_dir を指定すると、軌跡（out_dir/trajectory）・視聴時間・サマリーを書き出す
+    write_positions: Falseなら軌跡を記録しない。記録する場合は位置・視線・案内人の状態を
+      軌跡ストア（utils.trajectory_store）に書き込む
+    export_positions_csv: Trueなら軌跡を agent_position_log.csv にも書き出す
+    """
+    agents = mobile_agents(model)
+    store = None
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        if write_positions:
+            store = TrajectoryStore.create(os.path.join(out_dir, "trajectory"), agents, steps)
+    model.dc.reserve(model.dc.count + steps // model.dc.every + 1)
+    start_time = time.perf_counter()
+    step = 0
+    try:
+        while step < steps and model.running:
+            model.step()
+            # チェックポイントから再開した場合も通しのステップ番号で記録する
+            if store is not None:
+                store.record(model.schedule.steps - 1)
+            step += 1
+    finally:
+        if store is not None:
+            store.close()
+    elapsed = time.perf_counter() - start_time
+    summary = {
+        "steps": step,
+        "elapsed_sec": elapsed,
+        "steps_per_sec": step / elapsed if elapsed > 0 else None,
+        "num_agents": len(agents),
+        "events": model.events.stats(),
+    }
+    if out_dir:
+        if store is not None and export_positions_csv:
+            store.export_csv(os.path.join(out_dir, "agent_position_log.csv"))
+        log_visitor_scores(model, os.path.join(out_dir, "visitor_scores.csv"))
+        with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="見学施設シミュレーションのヘッドレス実行")
+    parser.add_argument("--map", default=DEFAULT_MAP_PATH, help="マップjsonのパス")
+    parser.add_argument("--steps", type=int, default=config.DEFAULT_STEPS)
+    parser.add_argument("--visitors", type=int, default=config.DEFAULT_NUM_VISITORS)
+    parser.add_argument("--guides", type=int, default=config.DEFAULT_NUM_GUIDES)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--width", type=int, default=None, help="グリッドの幅（省略時はマップの幅）")
+    parser.add_argument("--height", type=int, default=None, help="グリッドの高さ（省略時はマップの高さ）")
+    parser.add_argument("--navigation", choices=["astar", "flow_field"], default="astar")
+    parser.add_argument("--batch", action="store_true", help="見学者を一括更新エンジンで更新する")
+    parser.add_argument("--scheduler", choices=["random", "staged"], default="random",
+                        help="staged: 見学者を sense → decide → move の段階に分けて同時に更新する")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="--scheduler staged で decide を評価するスレッド数（decide はGILに縛られるので速くはならない）")
+    parser.add_argument("--skip-dormant", action="store_true", help="休止中のエージェント（巡回を終えた案内人・待機中の見学者）を step しない")
+    parser.add_argument("--obstacle-field", type=int, default=0,
+                        help="障害物反発場の1セルあたりの分割数（0なら毎回7x7走査。例: 4）")
+    parser.add_argument("--collect-every", type=int, default=1, help="model.dc に座標を記録する間隔（ステップ）")
+    parser.add_argument("--out", default=None, help="出力ディレクトリ（省略時は書き出さない）")
+    parser.add_argument("--no-positions", action="store_true", help="位置ログを書き出さない")
+    parser.add_argument("--csv", action="store_true", help="位置ログをCSVにも書き出す")
+    parser.add_argument("--from-checkpoint", default=None,
+                        help="モデルを作らずにチェックポイントから再開する（マップ・人数などの指定は無視）")
+    parser.add_argument("--fork-seed", type=int, default=None, help="チェックポイントから再開するときに乱数を振り直すシード")
+    parser.add_argument("--save-checkpoint", default=None, help="実行後の状態をチェックポイントとして保存するパス")
+    args = parser.parse_args(argv)
+
+    if args.from_checkpoint:
+        model = Museum.restore(args.from_checkpoint, seed=args.fork_seed)
+    else:
+        model = build_model(args.map, args.visitors, args.guides, seed=args.seed, width=args.width, height=args.height,
+                            navigation=args.navigation, batch_visitors=args.batch,
+                            collect_every=args.collect_every, scheduler=args.scheduler, workers=args.workers,
+                            skip_dormant=args.skip_dormant, obstacle_field_subdivisions=args.obstacle_field)
+    with model:
+        summary = run_simulation(model, args.steps, args.out, write_positions=not args.no_positions,
+                                 export_positions_csv=args.csv)
+        if args.save_checkpoint:
+            model.checkpoint(args.save_checkpoint)
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# 種類別のエージェント一覧を持つスケジューラのクラス定義ファイル
+# mesaの RandomActivation と同じ順番でエージェントを動かしつつ、追加・削除のたびに
+# クラスごとのエージェント一覧を更新します。種類ごとのループは全エージェントを
+# 走査してクラス名で絞り込む代わりに、agents_of で得た一覧をそのまま回します。
+# StagedActivation は見学者を sense → decide → move の段階に分けて同時に更新します。
+# skip_dormant=True のときは、エージェントが sleep で自分を休止させられます。休止中のエージェントは
+# 起こす条件（合図の送り手の signal、見張っている範囲への他のエージェントの進入）が起きるまで step されません。
+
+import math
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from mesa.time import RandomActivation
+
+
+class TypedRandomActivation(RandomActivation):
+    """
+    RandomActivation ＋ 種類別のエージェント一覧 ＋ 休止中エージェントの読み飛ばし
+    - agents_by_type[cls]: {unique_id: agent}（追加順）
+    - agents_of(*classes): それらのクラス（サブクラスを含む）のエージェントをスケジュールへの追加順で返す
+      結果は次の追加・削除まで使い回すので、呼び出し側で書き換えないこと（休止中のエージェントも含む）
+    - skip_dormant: Trueなら sleep / wake による休止を有効にする（Falseなら sleep は何もしない）
+    """
+    def __init__(self, model, skip_dormant=False):
+        super().__init__(model)
+        self.agents_by_type = defaultdict(dict)
+        self._lists = {}  # classes のタプル -> エージェントのリスト
+        self.skip_dormant = skip_dormant
+        self.dormant = {}  # unique_id -> 休止中のエージェント
+        self._subscribers = defaultdict(dict)  # 合図の送り手 -> {起こすエージェント: None}
+        self._wake_senders = {}  # 休止中のエージェント -> 合図の送り手
+        self._wake_radius = {}  # 休止中のエージェント -> (近づいたら起きる半径, 起きる相手の判定 or None)
+        self._active_keys = None  # 起きているエージェントの unique_id（追加順、休止・起床で作り直す）
+        self.spatial_index = None  # 近づいたら起こす見張りに使う空間ハッシュ（SpatialHash）
+
+    def add(self, agent):
+        super().add(agent)
+        self.agents_by_type[type(agent)][agent.unique_id] = agent
+        self._lists.clear()
+        self._active_keys = None
+
+    def remove(self, agent):
+        self.wake(agent)
+        super().remove(agent)
+        del self.agents_by_type[type(agent)][agent.unique_id]
+        self._lists.clear()
+        self._active_keys = None
+
+    def attach_spatial_index(self, spatial_index):
+        """sleep(wake_radius=...) の見張りに使う空間ハッシュをつなぐ"""
+        self.spatial_index = spatial_index
+        spatial_index.on_enter = self.on_neighbor_enter
+
+    def sleep(self, agent, wake_on=None, wake_radius=None, wake_filter=None):
+        """
+        agent を休止させる（休止できたら True）
+        - wake_on: この送り手が signal したら起こす（案内人など）
+        - wake_radius: 他のエージェントがこの半径内に入ってきたら起こす
+          （見張っているバケット内で他のエージェントが動くたびに距離を判定する）
+        - wake_filter: wake_filter(近づいたエージェント) が True の相手にだけ起こされる（Noneなら誰でも）
+        """
+        if not self.skip_dormant or agent.unique_id not in self._agents:
+            return False
+        self.wake(agent)
+        self.dormant[agent.unique_id] = agent
+        if wake_on is not None:
+            self._subscribers[wake_on][agent] = None
+            self._wake_senders[agent] = wake_on
+        if wake_radius is not None and self.spatial_index is not None:
+            self._wake_radius[agent] = (wake_radius, wake_filter)
+            self.spatial_index.watch(agent, agent.pos, wake_radius)
+        self._active_keys = None
+        return True
+
+    def wake(self, agent):
+        """休止中の agent を次のステップから動かす（休止していなければ何もしない）"""
+        if self.dormant.pop(agent.unique_id, None) is None:
+            return
+        sender = self._wake_senders.pop(agent, None)
+        if sender is not None:
+            subscribers = self._subscribers[sender]
+            del subscribers[agent]
+            if not subscribers:
+                del self._subscribers[sender]
+        if self._wake_radius.pop(agent, None) is not None:
+            self.spatial_index.unwatch(agent)
+        self._active_keys = None
+
+    def signal(self, sender):
+        """sender を待っている休止中のエージェントをすべて起こす（案内人の状態が変わったときなど）"""
+        subscribers = self._subscribers.get(sender)
+        if subscribers:
+            for agent in list(subscribers):
+                self.wake(agent)
+
+    def on_neighbor_enter(self, watchers, agent):
+        for watcher in watchers:
+            radius, wake_filter = self._wake_radius.get(watcher, (None, None))
+            if radius is None or math.dist(watcher.pos, agent.pos) >= radius:
+                continue
+            if wake_filter is None or wake_filter(agent):
+                self.wake(watcher)
+
+    def is_dormant(self, agent):
+        return agent.unique_id in self.dormant
+
+    def active_keys(self):
+        """起きているエージェントの unique_id のリスト（呼び出しごとに新しいリスト）"""
+        if self._active_keys is None:
+            self._active_keys = [key for key in self._agents if key not in self.dormant]
+        return list(self._active_keys)
+
+    def step(self):
+        if not self.dormant:
+            super().step()
+            return
+        self.do_each("step", agent_keys=self.active_keys(), shuffle=True)
+        self.steps += 1
+        self.time += 1
+
+    def agents_of(self, *classes):
+        agents = self._lists.get(classes)
+        if agents is None:
+            types = [t for t, members in self.agents_by_type.items() if members and issubclass(t, classes)]
+            if len(types) == 1:
+                agents = list(self.agents_by_type[types[0]].values())
+            else:
+                # 複数のクラスにまたがるときはスケジュール全体の追加順に並べる
+                agents = [agent for agent in self._agents.values() if type(agent) in types]
+            self._lists[classes] = agents
+        return agents
+
+    def count_of(self, *classes):
+        return len(self.agents_of(*classes))
+
+
+class StagedActivation(TypedRandomActivation):
+    """
+    sense → decide → move の段階実行（staged_class のエージェントを同時更新する）
+    - sense/decide: 全員がステップ開始時の状態（誰もまだ動いていない）を読んで加速度を決める
+    - 他のエージェント（案内人）は decide の後に追加順で step する
+    - move: 決めた加速度をまとめて反映する
+    更新結果がスケジュールの並び順に依存しない。待機中のゆらぎは staged_class.draw_noise で
+    スケジュール順にまとめて引いておくので、decide の評価順・スレッド数によっても乱数は変わらない
+    - 休止中のエージェントは decide / step / commit のどれも呼ばない
+    - workers > 1 なら decide を chunk_size 人ずつスレッドプールで評価する（共有キャッシュはロックで保護）
+      ただし同じ長さの経路が複数あるとき、経路キャッシュに先に入った方が使われるので、
+      workers=1 と完全に同じ結果になるとは限らない
+      decide はほとんどが純Pythonの処理でGILを握ったまま動くので、スレッドを増やしても速くならない
+      （200人・4スレッドで workers=1 の0.85倍程度）。スレッドは shutdown（Museum.close）で止める
+    """
+    def __init__(self, model, staged_class, workers=1, chunk_size=64, skip_dormant=False):
+        super().__init__(model, skip_dormant)
+        self.staged_class = staged_class
+        self.workers = int(workers)
+        self.chunk_size = int(chunk_size)
+        self._executor = None
+
+    def __getstate__(self):
+        # スレッドプールはチェックポイントに含めず、復元後の最初のステップで作り直す
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        return state
+
+    def step(self):
+        if self.dormant:
+            active = [self._agents[key] for key in self.active_keys()]
+            staged = [agent for agent in active if isinstance(agent, self.staged_class)]
+        else:
+            active = list(self._agents.values())
+            staged = self.agents_of(self.staged_class)
+        others = [agent for agent in active if not isinstance(agent, self.staged_class)]
+        noise = self.staged_class.draw_noise(self.model.np_random, len(staged))
+        accelerations = self._decide(staged, noise)
+        for agent in others:
+            agent.step()
+        for agent, acceleration in zip(staged, accelerations):
+            agent.commit(acceleration)
+        self.steps += 1
+        self.time += 1
+
+    def _decide(self, agents, noise):
+        if self.workers <= 1 or len(agents) <= self.chunk_size:
+            return [agent.decide(noise[i]) for i, agent in enumerate(agents)]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers)
+
+        def decide_chunk(start):
+            return [agents[i].decide(noise[i]) for i in range(start, min(start + self.chunk_size, len(agents)))]
+
+        chunks = self._executor.map(decide_chunk, range(0, len(agents), self.chunk_size))
+        return [acceleration for chunk in chunks for acceleration in chunk]
+
+    def shutdown(self):
+        """スレッドプールを止める（次に workers > 1 で decide するときに作り直す）"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
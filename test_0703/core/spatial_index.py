@@ -0,0 +1,104 @@
+# エージェント近傍探索用の空間ハッシュのクラス定義ファイル
+# 連続空間を一定サイズのバケットに分割し、各バケットに入っているエージェントを保持します。
+# Environmentがエージェントの配置・移動・削除のたびに差分更新するため、常に最新の位置で検索できます。
+# 休止中のエージェントは周囲のバケットを見張り、他のエージェントがそこへ入ったり、その中で動いたりしたら on_enter で知らされます。
+
+import math
+
+
+class SpatialHash:
+    """
+    一様グリッドによる空間ハッシュ
+    - cell_size: バケット1辺の長さ（よく使う検索半径と同じにすると3x3バケットの走査で済む）
+    - バケット内は挿入順を保つdictで管理し、走査順を実行ごとに安定させる
+    """
+    def __init__(self, cell_size=1.5):
+        self.cell_size = float(cell_size)
+        self._buckets = {}  # (bx, by) -> {agent: None}
+        self._agent_keys = {}  # agent -> (bx, by)
+        self._watchers = {}  # (bx, by) -> {見張っているエージェント: None}
+        self._watched_keys = {}  # 見張っているエージェント -> そのバケットのリスト
+        self.on_enter = None  # on_enter(見張り役のリスト, 入ってきた・動いたエージェント)
+
+    def _keys_around(self, pos, radius):
+        cs = self.cell_size
+        return [(bx, by)
+                for bx in range(math.floor((pos[0] - radius) / cs), math.floor((pos[0] + radius) / cs) + 1)
+                for by in range(math.floor((pos[1] - radius) / cs), math.floor((pos[1] + radius) / cs) + 1)]
+
+    def _key(self, pos):
+        return (math.floor(pos[0] / self.cell_size), math.floor(pos[1] / self.cell_size))
+
+    def insert(self, agent, pos):
+        key = self._key(pos)
+        self._agent_keys[agent] = key
+        self._buckets.setdefault(key, {})[agent] = None
+        self._notify(key, agent)
+
+    def move(self, agent, pos):
+        key = self._key(pos)
+        old_key = self._agent_keys.get(agent)
+        if old_key != key:
+            if old_key is not None:
+                self._discard(agent, old_key)
+            self._agent_keys[agent] = key
+            self._buckets.setdefault(key, {})[agent] = None
+        self._notify(key, agent)
+
+    def remove(self, agent):
+        old_key = self._agent_keys.pop(agent, None)
+        if old_key is not None:
+            self._discard(agent, old_key)
+        self.unwatch(agent)
+
+    def _discard(self, agent, key):
+        bucket = self._buckets[key]
+        del bucket[agent]
+        if not bucket:
+            del self._buckets[key]
+
+    def watch(self, agent, pos, radius):
+        """pos から半径 radius の円に掛かるバケットに他のエージェントが入るか、その中で動いたら on_enter で知らせる"""
+        self.unwatch(agent)
+        keys = self._keys_around(pos, radius)
+        self._watched_keys[agent] = keys
+        for key in keys:
+            self._watchers.setdefault(key, {})[agent] = None
+
+    def unwatch(self, agent):
+        for key in self._watched_keys.pop(agent, ()):
+            watchers = self._watchers[key]
+            del watchers[agent]
+            if not watchers:
+                del self._watchers[key]
+
+    def _notify(self, key, agent):
+        # 見張られているバケット内の移動のたびに呼ばれる（同じバケット内で近づいた分も距離判定できるように）
+        # 見張りのないバケットでは辞書を1回引くだけで終わる
+        watchers = self._watchers.get(key)
+        if watchers and self.on_enter is not None:
+            watchers = [watcher for watcher in watchers if watcher is not agent]
+            if watchers:
+                self.on_enter(watchers, agent)
+
+    def query(self, pos, radius):
+        """
+        pos を中心とする半径 radius の円に掛かるバケット内のエージェントを返す
+        （距離の厳密判定は呼び出し側で行う）
+        """
+        cs = self.cell_size
+        bx0 = math.floor((pos[0] - radius) / cs)
+        bx1 = math.floor((pos[0] + radius) / cs)
+        by0 = math.floor((pos[1] - radius) / cs)
+        by1 = math.floor((pos[1] + radius) / cs)
+        buckets = self._buckets
+        found = []
+        for bx in range(bx0, bx1 + 1):
+            for by in range(by0, by1 + 1):
+                bucket = buckets.get((bx, by))
+                if bucket:
+                    found.extend(bucket)
+        return found
+
+    def __len__(self):
+        return len(self._agent_keys)
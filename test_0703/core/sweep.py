@@ -0,0 +1,167 @@
+# パラメータスイープ（モンテカルロ実行）スクリプト
+# パラメータの組み合わせ×反復回数ぶんのMuseumを ProcessPoolExecutor のワーカーで並列に実行し、
+# 1実行1行のCSV（列＝パラメータと集計値）に終わった順に追記します。
+# 各実行のシードはパラメータと反復番号から決まるので、並列数や実行順によらず同じ結果になります。
+# 出力CSVに既にある実行は飛ばすので、中断したスイープは同じコマンドで再開できます。
+#
+# 実行方法（test_0703 直下で）:
+#   python -m core.sweep --param num_visitors=10,20,40 --param guide_wait_duration=50,100 \
+#       --replicates 5 --steps 1000 --out runs/sweep.csv
+# パラメータ名は core.run.build_model / Museum の引数名（num_visitors, num_guides, visitor_speeds,
+# guide_wait_duration, navigation, batch_visitors など）。値はjsonとして解釈する（例: visitor_speeds=[0.15,0.2]）
+# グリッドの大きさは省略するとマップの大きさになる（width=..., height=... で上書きできる）
+
+import argparse
+import contextlib
+import csv
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from core.run import DEFAULT_MAP_PATH, build_model, run_simulation
+
+KEY_COLUMNS = ["run_key", "replicate", "seed"]
+METRIC_COLUMNS = ["steps", "elapsed_sec", "steps_per_sec", "total_watch_steps", "mean_watch_steps",
+                  "destinations_visited", "mean_guide_distance"]
+
+
+def expand_grid(param_grid):
+    """{名前: 値のリスト} から全組み合わせの {名前: 値} のリストを作る（名前順で固定）"""
+    names = sorted(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+
+
+def run_key(params):
+    # パラメータの組み合わせを表す文字列（CSVの再開判定とシード生成に使う）
+    return json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+
+def run_seed(base_seed, key, replicate):
+    """base_seed・パラメータ・反復番号から決まる実行ごとのシード"""
+    key_hash = int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "little")
+    return int(np.random.SeedSequence([base_seed, key_hash, replicate]).generate_state(1)[0])
+
+
+def collect_metrics(model, summary):
+    """実行後のモデルから1行分の集計値を作る"""
+    counts = model.watch_times.counts
+    guides = model.groups.guides
+    visitors = model.watch_times.visitors
+    distances = [np.hypot(*(np.asarray(v.pos, dtype=float) - np.asarray(v.guide.pos, dtype=float))) for v in visitors]
+    return {
+        "steps": summary["steps"],
+        "elapsed_sec": summary["elapsed_sec"],
+        "steps_per_sec": summary["steps_per_sec"],
+        "total_watch_steps": int(counts.sum()),
+        "mean_watch_steps": float(counts.sum(axis=1).mean()) if len(visitors) else 0.0,
+        "destinations_visited": sum(len(g.all_destinations) - len(g.unvisited_destinations) for g in guides),
+        "mean_guide_distance": float(np.mean(distances)) if distances else 0.0,
+    }
+
+
+def run_one(task):
+    """ワーカーで1実行分を行い、CSVの1行（dict）を返す"""
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        with build_model(task["map_path"], seed=task["seed"], **task["params"]) as model:
+            summary = run_simulation(model, task["steps"])
+            metrics = collect_metrics(model, summary)
+    row = {"run_key": task["run_key"], "replicate": task["replicate"], "seed": task["seed"]}
+    row.update({name: json.dumps(value) for name, value in task["params"].items()})
+    row.update(metrics)
+    return row
+
+
+def _completed_runs(out_path):
+    """出力CSVにある (run_key, replicate) の集合と列名を返す（途中で切れた最終行は削る）"""
+    if not os.path.exists(out_path):
+        return set(), None
+    with open(out_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+    with open(out_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        done = {(row["run_key"], int(row["replicate"])) for row in reader}
+        return done, reader.fieldnames
+
+
+def run_sweep(param_grid, replicates, steps, out_path, map_path=DEFAULT_MAP_PATH, base_seed=0, max_workers=None):
+    """
+    パラメータスイープを並列実行し、out_path のCSVに1実行1行で追記する
+    - param_grid: {Museum/build_modelの引数名: 値のリスト}
+    - 既に out_path にある (組み合わせ, 反復番号) は実行しない
+    戻り値: 今回実行した数
+    """
+    combos = expand_grid(param_grid)
+    fieldnames = KEY_COLUMNS + sorted(param_grid) + METRIC_COLUMNS
+    done, existing_fields = _completed_runs(out_path)
+    if existing_fields is not None and existing_fields != fieldnames:
+        raise ValueError(f"{out_path} の列がこのスイープと一致しません: {existing_fields}")
+    map_path = os.path.abspath(map_path)
+    tasks = []
+    for params in combos:
+        key = run_key(params)
+        for replicate in range(replicates):
+            if (key, replicate) in done:
+                continue
+            tasks.append({"map_path": map_path, "params": params, "run_key": key, "replicate": replicate,
+                          "seed": run_seed(base_seed, key, replicate), "steps": steps})
+    if not tasks:
+        return 0
+    if os.path.dirname(out_path):
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        if existing_fields is None:
+            writer.writeheader()
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(run_one, task) for task in tasks]
+            for finished, future in enumerate(as_completed(futures), 1):
+                writer.writerow(future.result())
+                f.flush()
+                print(f"[{finished}/{len(tasks)}] 完了", flush=True)
+    return len(tasks)
+
+
+def parse_param(text):
+    """ 'name=v1,v2,...' を (name, [値, ...]) にする（値はjsonとして解釈、だめなら文字列） """
+    name, _, values = text.partition("=")
+    if not name or not values:
+        raise argparse.ArgumentTypeError(f"name=v1,v2,... の形式で指定してください: {text}")
+    try:
+        parsed = json.loads(f"[{values}]")
+    except json.JSONDecodeError:
+        parsed = [v.strip() for v in values.split(",")]
+    return name.strip(), parsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="見学施設シミュレーションのパラメータスイープ")
+    parser.add_argument("--param", type=parse_param, action="append", default=[],
+                        help="スイープするパラメータ name=v1,v2,...（複数指定可）")
+    parser.add_argument("--grid", default=None, help="{名前: 値のリスト} のjsonファイル（--paramと併用可）")
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--map", default=DEFAULT_MAP_PATH)
+    parser.add_argument("--seed", type=int, default=0, help="スイープ全体の基準シード")
+    parser.add_argument("--workers", type=int, default=None, help="並列数（省略時はCPUコア数）")
+    parser.add_argument("--out", required=True, help="結果CSVのパス（既にあれば続きから実行）")
+    args = parser.parse_args(argv)
+
+    param_grid = {}
+    if args.grid:
+        with open(args.grid, encoding="utf-8") as f:
+            param_grid.update(json.load(f))
+    param_grid.update(dict(args.param))
+    start_time = time.perf_counter()
+    count = run_sweep(param_grid, args.replicates, args.steps, args.out, args.map, args.seed, args.workers)
+    print(f"{count} 件を {time.perf_counter() - start_time:.1f} 秒で実行しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# 見通し（遮蔽）判定のクラス定義ファイル
+# Visitor.is_occludedと同じBresenham法の判定を、セル対ごとにLRUキャッシュし、
+# 多数の見学者→案内人の視線はNumPyで全員同時に1セルずつ進めてまとめて判定します。
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class VisibilityCache:
+    """
+    セル間の遮蔽判定サービス
+    - is_occluded: 1組の判定（結果を (x0, y0, x1, y1) をキーにLRUキャッシュ）
+    - occluded_batch: 複数組の判定（キャッシュにない組だけをベクトル化したレイマーチで計算）
+    """
+    def __init__(self, grid, maxsize=65536):
+        # grid: Environment
+        # maxsize: キャッシュするセル対の上限
+        self.grid = grid
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._obstacle_version = grid.obstacle_version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()  # 段階実行で複数スレッドから呼ばれてもLRUを壊さないため
+
+    def __getstate__(self):
+        # 判定結果は作り直せるので、チェックポイントにはキャッシュを含めない
+        state = self.__dict__.copy()
+        state['_cache'] = OrderedDict()
+        state.pop('_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(start, end):
+        return (int(round(start[0])), int(round(start[1])), int(round(end[0])), int(round(end[1])))
+
+    def _check_version(self):
+        if self._obstacle_version != self.grid.obstacle_version:
+            self._cache.clear()
+            self._obstacle_version = self.grid.obstacle_version
+
+    def _remember(self, key, value):
+        self._cache[key] = value
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def is_occluded(self, start, end):
+        """start→end間に障害物があるか（Bresenham法、両端セルは除く）"""
+        with self._lock:
+            return self._is_occluded(start, end)
+
+    def _is_occluded(self, start, end):
+        self._check_version()
+        key = self._key(start, end)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        value = self._bresenham_occluded(*key)
+        self._remember(key, value)
+        return value
+
+    def _bresenham_occluded(self, x0, y0, x1, y1):
+        is_obstacle_cell = self.grid.is_obstacle_cell
+        dx = abs(x1 - x0)
+        dy = abs(y1 - y0)
+        x, y = x0, y0
+        sx = 1 if x1 > x0 else -1
+        sy = 1 if y1 > y0 else -1
+        if dx > dy:
+            err = dx / 2.0
+            while x != x1:
+                if (x, y) != (x0, y0) and (x, y) != (x1, y1):
+                    if is_obstacle_cell(x, y):
+                        return True
+                err -= dy
+                if err < 0:
+                    y += sy
+                    err += dx
+                x += sx
+        else:
+            err = dy / 2.0
+            while y != y1:
+                if (x, y) != (x0, y0) and (x, y) != (x1, y1):
+                    if is_obstacle_cell(x, y):
+                        return True
+                err -= dx
+                if err < 0:
+                    x += sx
+                    err += dy
+                y += sy
+        return False
+
+    def occluded_batch(self, starts, ends):
+        """
+        複数の start→end の遮蔽判定をまとめて行う ((N,) のbool配列)
+        キャッシュ済みの組はそれを使い、残りは全員同時にBresenham法で1セルずつ進める
+        """
+        self._check_version()
+        starts = np.rint(np.asarray(starts, dtype=float).reshape(-1, 2)).astype(np.int64)
+        ends = np.rint(np.asarray(ends, dtype=float).reshape(-1, 2)).astype(np.int64)
+        keys = list(zip(starts[:, 0].tolist(), starts[:, 1].tolist(), ends[:, 0].tolist(), ends[:, 1].tolist()))
+        result = np.zeros(len(keys), dtype=bool)
+        missing = []
+        cache = self._cache
+        for k, key in enumerate(keys):
+            cached = cache.get(key)
+            if cached is None:
+                missing.append(k)
+            else:
+                cache.move_to_end(key)
+                result[k] = cached
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            missing = np.array(missing)
+            values = self._march(starts[missing], ends[missing])
+            result[missing] = values
+            for k, value in zip(missing.tolist(), values.tolist()):
+                self._remember(keys[k], value)
+        return result
+
+    def _march(self, starts, ends):
+        """is_occluded と同じ手順のBresenham法を、全ての組で同時に1セルずつ進める"""
+        if self.grid._outside_obstacles:
+            # グリッド範囲外の障害物はビットマップにないので1組ずつ判定する
+            return np.array([self._bresenham_occluded(*s, *e) for s, e in zip(starts.tolist(), ends.tolist())], dtype=bool)
+        occupancy = self.grid.occupancy
+        w, h = occupancy.shape
+        x0, y0 = starts[:, 0], starts[:, 1]
+        x1, y1 = ends[:, 0], ends[:, 1]
+        dx = np.abs(x1 - x0)
+        dy = np.abs(y1 - y0)
+        sx = np.where(x1 > x0, 1, -1)
+        sy = np.where(y1 > y0, 1, -1)
+        x_major = dx > dy
+        err = np.where(x_major, dx, dy) / 2.0
+        x = x0.copy()
+        y = y0.copy()
+        occluded = np.zeros(len(starts), dtype=bool)
+        active = np.where(x_major, x != x1, y != y1)
+        while active.any():
+            check = active & ~((x == x0) & (y == y0)) & ~((x == x1) & (y == y1))
+            check &= (x >= 0) & (x < w) & (y >= 0) & (y < h)
+            hit = np.zeros_like(check)
+            hit[check] = occupancy[x[check], y[check]]
+            occluded |= hit
+            # x方向が主軸の組
+            mx = active & x_major
+            err[mx] -= dy[mx]
+            step = mx & (err < 0)
+            y[step] += sy[step]
+            err[step] += dx[step]
+            x[mx] += sx[mx]
+            # y方向が主軸の組
+            my = active & ~x_major
+            err[my] -= dx[my]
+            step = my & (err < 0)
+            x[step] += sx[step]
+            err[step] += dy[step]
+            y[my] += sy[my]
+            active = np.where(x_major, x != x1, y != y1) & ~occluded
+        return occluded
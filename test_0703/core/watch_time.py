@@ -0,0 +1,60 @@
+# 展示物の視聴時間を集計するクラス定義ファイル
+# 全見学者×全展示物の距離と視線のなす角を1回のブロードキャスト演算で判定し、
+# (見学者数, 展示物数) の整数行列に視聴ステップ数を積み上げます。
+
+import numpy as np
+
+WATCH_DISTANCE = 2.5  # この距離以内の展示物を見ているとみなす
+WATCH_COS = 0.5  # 視線とのなす角のcosがこれより大きければ視野内（60度以内）
+
+
+class WatchTimeAccumulator:
+    """
+    見学者×展示物の視聴ステップ数行列
+    - counts[i, j]: visitors[i] が exhibits[j] を見ていたステップ数
+    - Exhibit.visitor_watch_times はこの行列の列から作られる
+    - Museum.step の全エージェントの移動後に呼ばれるので、そのステップの移動後の位置・視線で数える
+      （展示物ごとの step で数えていたときは、スケジュール順で先に動いた見学者だけ移動後の位置だった）
+    """
+    def __init__(self, model, visitors, exhibits):
+        # model: Museum
+        # visitors: Visitorのリスト（行の順番）
+        # exhibits: Exhibitのリスト（列の順番）
+        self.model = model
+        self.visitors = list(visitors)
+        self.exhibits = list(exhibits)
+        self.visitor_ids = [v.unique_id for v in self.visitors]
+        self.exhibit_index = {exhibit: j for j, exhibit in enumerate(self.exhibits)}
+        self.exhibit_pos = np.array([e.pos for e in self.exhibits], dtype=float).reshape(-1, 2)
+        self.counts = np.zeros((len(self.visitors), len(self.exhibits)), dtype=np.int32)
+
+    def _visitor_state(self):
+        # 一括更新エンジンが同じ並びで配列を持っていればそのまま使う
+        engine = getattr(self.model, 'visitor_engine', None)
+        if engine is not None and engine.visitors == self.visitors:
+            return engine.pos, engine.gaze
+        pos = np.array([np.asarray(v.pos, dtype=float) for v in self.visitors]).reshape(-1, 2)
+        gaze = np.array([np.asarray(getattr(v, 'gaze_direction', (1.0, 0.0)), dtype=float)
+                         for v in self.visitors]).reshape(-1, 2)
+        return pos, gaze
+
+    def watching(self):
+        """現在のステップで見学者iが展示物jを見ているかの (V, E) bool行列"""
+        pos, gaze = self._visitor_state()
+        to_exhibit = self.exhibit_pos[None, :, :] - pos[:, None, :]
+        dist = np.hypot(to_exhibit[..., 0], to_exhibit[..., 1])
+        gaze_norm = np.hypot(gaze[:, 0], gaze[:, 1])
+        dot = np.einsum('ijk,ik->ij', to_exhibit, gaze)
+        valid = (dist <= WATCH_DISTANCE) & (dist > 0) & (gaze_norm > 0)[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_theta = dot / (dist * gaze_norm[:, None])
+        return valid & (cos_theta > WATCH_COS)
+
+    def step(self):
+        if self.counts.size:
+            self.counts += self.watching()
+
+    def watch_times_for(self, exhibit):
+        """展示物ごとの {visitor_id: 累積滞在時間}（0は含めない）"""
+        column = self.counts[:, self.exhibit_index[exhibit]]
+        return {self.visitor_ids[i]: int(column[i]) for i in np.flatnonzero(column)}
@@ -0,0 +1,78 @@
+# モデル全体のイベントバスのクラス定義ファイル
+# 案内人の出発・展示物への到着・説明の開始・終了を型付きのイベントとして発行し、
+# ステップの終わりにまとめて購読者へ配送します。購読は案内人（グループ）ごとに登録でき、
+# 見学者は毎ステップ案内人の状態を見比べる代わりに、自分のグループのイベントだけを受け取ります。
+# 種類ごとの発行数・配送数を数えるので、解析用のフックとしても使えます。
+
+from collections import Counter, defaultdict
+from enum import Enum
+from typing import Any, NamedTuple
+
+
+class EventType(Enum):
+    GUIDE_DEPARTED = "guide_departed"  # 案内人が次の目的地へ移動を始めた
+    GUIDE_ARRIVED = "guide_arrived"  # 案内人が目的地に到着した
+    EXPLANATION_STARTED = "explanation_started"  # 展示物での説明を始めた
+    EXPLANATION_ENDED = "explanation_ended"  # 展示物での説明を終えた
+
+
+class Event(NamedTuple):
+    type: EventType
+    guide: Any  # 発行した案内人（グループのキー）
+    pos: tuple  # 発行時の案内人の位置
+    step: int  # 発行したステップ
+
+
+class EventBus:
+    """
+    イベントの発行・購読
+    - subscribe(handler, event_type, group): event_type（Noneなら全種類）のうち、
+      group（案内人。Noneなら全グループ）のイベントを handler(event) で受け取る
+    - publish: イベントを溜めるだけで、dispatch（Museum.step の終わり）でまとめて配送する
+      配送は発行順、同じイベントの購読者は登録順。配送中に発行されたイベントも同じ dispatch で配る
+    - published[type]: 種類ごとの発行数、delivered: handler を呼んだ回数、batches: イベントがあった dispatch の回数
+    """
+    def __init__(self):
+        self._handlers = defaultdict(list)  # (event_type or None, group or None) -> [handler]
+        self._pending = []
+        self.published = Counter()
+        self.delivered = 0
+        self.batches = 0
+
+    def subscribe(self, handler, event_type=None, group=None):
+        self._handlers[(event_type, group)].append(handler)
+
+    def unsubscribe(self, handler, event_type=None, group=None):
+        handlers = self._handlers.get((event_type, group))
+        if handlers and handler in handlers:
+            handlers.remove(handler)
+            if not handlers:
+                del self._handlers[(event_type, group)]
+
+    def publish(self, event_type, guide, pos, step):
+        self._pending.append(Event(event_type, guide, tuple(pos), step))
+        self.published[event_type] += 1
+
+    def dispatch(self):
+        """溜まっているイベントを購読者に配送する（配送したイベント数を返す）"""
+        if not self._pending:
+            return 0
+        self.batches += 1
+        count = 0
+        while self._pending:
+            events, self._pending = self._pending, []
+            for event in events:
+                for key in ((event.type, event.guide), (event.type, None), (None, event.guide), (None, None)):
+                    for handler in list(self._handlers.get(key, ())):
+                        handler(event)
+                        self.delivered += 1
+            count += len(events)
+        return count
+
+    def stats(self):
+        """スループットの集計（サマリー出力用）"""
+        return {
+            "published": {event_type.value: self.published[event_type] for event_type in EventType},
+            "delivered": self.delivered,
+            "batches": self.batches,
+        }
@@ -0,0 +1,40 @@
+# テスト共通の設定
+# test_0703 直下を import のルートにし（python -m core.run と同じ）、小さなモデルを作る補助を置きます。
+#
+# 実行方法（test_0703 直下で）:
+#   python -m pytest -q tests
+
+import contextlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from core.run import build_model
+
+
+@contextlib.contextmanager
+def quiet():
+    # 案内人の説明終了メッセージを出さない
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+@pytest.fixture
+def small_model():
+    """map1.json の小さなモデルを作る関数"""
+    def make(num_visitors=12, num_guides=2, seed=3, **kwargs):
+        with quiet():
+            return build_model(num_visitors=num_visitors, num_guides=num_guides, seed=seed, cache_dir=None, **kwargs)
+    return make
+
+
+@pytest.fixture
+def run_steps():
+    """model を steps ステップ進める関数"""
+    def run(model, steps):
+        with quiet():
+            for _ in range(steps):
+                model.step()
+    return run
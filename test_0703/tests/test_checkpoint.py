@@ -0,0 +1,66 @@
+# チェックポイントの保存・復元のテスト
+# 復元したモデルを進めた結果が、保存せずに進めた元のモデルとビット単位で一致することを確かめます。
+
+import numpy as np
+import pytest
+
+from core.museum import Museum
+
+
+def agent_state(model):
+    """案内人・見学者の位置・速度・視線と、視聴時間・記録した座標をまとめて返す"""
+    agents = model.groups.guides + model.groups.visitors
+    return {
+        "pos": np.array([np.asarray(a.pos, dtype=float) for a in agents]),
+        "velocity": np.array([np.asarray(getattr(a, 'velocity', (0.0, 0.0)), dtype=float) for a in agents]),
+        "gaze": np.array([np.asarray(getattr(a, 'gaze_direction', (0.0, 0.0)), dtype=float) for a in agents]),
+        "states": [getattr(a, 'state', None) for a in model.groups.guides],
+        "watch": model.watch_times.counts.copy(),
+        "steps": model.schedule.steps,
+    }
+
+
+def assert_same_state(a, b):
+    for name in ("pos", "velocity", "gaze", "watch"):
+        np.testing.assert_array_equal(a[name], b[name], err_msg=name)
+    assert a["states"] == b["states"]
+    assert a["steps"] == b["steps"]
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"scheduler": "staged"},
+    {"batch_visitors": True},
+    {"skip_dormant": True},
+    {"obstacle_field_subdivisions": 4},
+], ids=["random", "staged", "batch", "skip_dormant", "obstacle_field"])
+def test_restore_continues_bit_exact(small_model, run_steps, kwargs):
+    model = small_model(**kwargs)
+    run_steps(model, 60)
+    data = model.checkpoint()
+    restored = Museum.restore(data)
+    assert_same_state(agent_state(model), agent_state(restored))
+
+    run_steps(model, 120)
+    run_steps(restored, 120)
+    assert_same_state(agent_state(model), agent_state(restored))
+
+
+def test_restore_from_file_and_fork_seed(small_model, run_steps, tmp_path):
+    model = small_model()
+    run_steps(model, 40)
+    path = tmp_path / "model.ckpt"
+    assert model.checkpoint(str(path)) == path.stat().st_size
+
+    same = Museum.restore(str(path))
+    forked = Museum.restore(str(path), seed=99)
+    run_steps(model, 80)
+    run_steps(same, 80)
+    run_steps(forked, 80)
+    assert_same_state(agent_state(model), agent_state(same))
+    assert not np.array_equal(agent_state(model)["pos"], agent_state(forked)["pos"])
+
+
+def test_restore_rejects_other_data():
+    with pytest.raises(ValueError):
+        Museum.restore(b"not a checkpoint")
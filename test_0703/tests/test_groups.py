@@ -0,0 +1,65 @@
+# 案内人・見学者のグループ対応表と一括更新エンジンのテスト
+# GroupRegistry.assign で担当を替えた見学者を、一括更新エンジンが新しい案内人のグループとして扱うことを確かめます。
+
+from core.groups import GroupRegistry
+from event.event_bus import EventType
+
+
+def moved_visitor(model):
+    """最初の見学者を別の案内人のグループへ移し、(見学者, 新しい案内人) を返す"""
+    visitor = model.groups.visitors[0]
+    new_guide = next(guide for guide in model.groups.guides if guide is not visitor.guide)
+    model.groups.assign(visitor, new_guide)
+    return visitor, new_guide
+
+
+def test_registry_assign_moves_visitor():
+    registry = GroupRegistry()
+
+    class Agent:
+        guide = None
+
+        def follow(self, guide):
+            self.guide = guide
+
+    guide_a, guide_b, visitor = object(), object(), Agent()
+    registry.add_visitor(visitor, guide_a)
+    version = registry.version
+    registry.assign(visitor, guide_b)
+    assert registry.version > version
+    assert registry.visitors_of(guide_a) == []
+    assert registry.visitors_of(guide_b) == [visitor]
+    assert registry.guide_for(visitor) is guide_b
+    assert visitor.guide is guide_b
+
+
+def test_batch_engine_follows_assigned_guide(small_model, run_steps):
+    model = small_model(num_visitors=10, num_guides=3, batch_visitors=True)
+    run_steps(model, 20)
+    engine = model.visitor_engine
+    visitor, new_guide = moved_visitor(model)
+    run_steps(model, 1)
+
+    row = engine.visitors.index(visitor)
+    assert engine.guides[engine.guide_idx[row]] is new_guide
+    for k, guide in enumerate(engine.guides):
+        expected = [engine.visitors.index(v) for v in model.groups.visitors_of(guide)]
+        assert sorted(engine.groups[k].tolist()) == sorted(expected)
+
+
+def test_batch_engine_reacts_to_new_guide_departure(small_model, run_steps):
+    model = small_model(num_visitors=10, num_guides=3, batch_visitors=True)
+    run_steps(model, 5)
+    engine = model.visitor_engine
+    visitor, new_guide = moved_visitor(model)
+    run_steps(model, 1)
+    row = engine.visitors.index(visitor)
+
+    # 新しい案内人の出発イベントで、配列側の追従開始フラグが立つ（前の案内人のグループは変わらない）
+    engine.just_started[:] = False
+    model.events.publish(EventType.GUIDE_DEPARTED, new_guide, new_guide.pos, model.schedule.steps)
+    model.events.dispatch()
+    assert engine.just_started[row]
+    assert not visitor.just_started_following
+    others = [i for i, v in enumerate(engine.visitors) if v.guide is not new_guide]
+    assert not engine.just_started[others].any()
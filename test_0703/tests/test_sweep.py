@@ -0,0 +1,56 @@
+# パラメータスイープの再開のテスト
+# 途中で止まったスイープ（最終行が書きかけのCSV）を同じ引数で再実行すると、
+# 終わっていない実行だけが追加され、各実行の結果は最初から通しで実行した場合と同じになることを確かめます。
+
+import csv
+
+import pytest
+
+from core.sweep import run_sweep
+
+PARAM_GRID = {"num_visitors": [4, 6], "guide_wait_duration": [20]}
+STEPS = 30
+METRICS = ["steps", "total_watch_steps", "destinations_visited", "mean_guide_distance"]
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def by_run(rows):
+    return {(row["run_key"], row["replicate"]): (row["seed"], [row[name] for name in METRICS]) for row in rows}
+
+
+@pytest.fixture(scope="module")
+def full_sweep(tmp_path_factory):
+    path = tmp_path_factory.mktemp("sweep") / "full.csv"
+    assert run_sweep(PARAM_GRID, 2, STEPS, str(path), max_workers=1) == 4
+    return read_rows(path)
+
+
+def test_rerun_skips_completed_runs(full_sweep, tmp_path):
+    path = tmp_path / "sweep.csv"
+    assert run_sweep(PARAM_GRID, 2, STEPS, str(path), max_workers=1) == 4
+    assert run_sweep(PARAM_GRID, 2, STEPS, str(path), max_workers=1) == 0
+    assert len(read_rows(path)) == 4
+
+
+def test_resume_after_interrupted_write(full_sweep, tmp_path):
+    path = tmp_path / "sweep.csv"
+    assert run_sweep(PARAM_GRID, 1, STEPS, str(path), max_workers=1) == 2
+    # 3行目を書いている途中で止まった状態にする
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        f.write('"{""guide_wait_duration"":20,""num_')
+
+    assert run_sweep(PARAM_GRID, 2, STEPS, str(path), max_workers=1) == 2
+    rows = read_rows(path)
+    assert len(rows) == 4
+    assert by_run(rows) == by_run(full_sweep)
+
+
+def test_resume_rejects_different_columns(tmp_path):
+    path = tmp_path / "sweep.csv"
+    run_sweep(PARAM_GRID, 1, STEPS, str(path), max_workers=1)
+    with pytest.raises(ValueError):
+        run_sweep({"num_visitors": [4]}, 1, STEPS, str(path), max_workers=1)
@@ -0,0 +1,102 @@
+# 軌跡ストアのテスト
+# 容量を超えたときの拡張、任意ステップへの移動（row_for / frame）、CSV出力と、
+# ヘッドレス実行の記録を再生用に開けることを確かめます。
+
+import csv
+
+import numpy as np
+import pytest
+
+from agents.guide import GuideState
+from core.run import run_simulation
+from utils.trajectory import mobile_agents
+from utils.trajectory_store import TrajectoryStore
+
+
+class Walker:
+    """位置・視線・状態だけを持つ記録用のエージェント"""
+    def __init__(self, unique_id, state=None):
+        self.unique_id = unique_id
+        self.pos = (0.0, 0.0)
+        self.gaze_direction = np.array([1.0, 0.0])
+        self.state = state
+
+    def move_to(self, step):
+        self.pos = (float(step), float(step) / 2 + len(self.unique_id))
+        self.gaze_direction = np.array([0.0, 1.0]) if step % 2 else np.array([1.0, 0.0])
+
+
+def record(path, steps, capacity, stride=1):
+    agents = [Walker("a", GuideState.MOVING), Walker("bb")]
+    with TrajectoryStore.create(str(path), agents, capacity, stride=stride) as store:
+        for step in steps:
+            for agent in agents:
+                agent.move_to(step)
+            store.record(step)
+        assert store.capacity >= len(steps)
+    return agents
+
+
+def test_grow_keeps_recorded_rows(tmp_path):
+    record(tmp_path, range(10, 23), capacity=2)
+    store = TrajectoryStore.open(str(tmp_path))
+    assert len(store) == 13
+    assert store.step_range() == (10, 22)
+    np.testing.assert_array_equal(store.steps[:13], np.arange(10, 23))
+    for step in (10, 11, 16, 22):
+        positions, gaze, state = store.frame(step)
+        np.testing.assert_array_equal(positions, [[step, step / 2 + 1], [step, step / 2 + 2]])
+        np.testing.assert_array_equal(gaze[0], [0.0, 1.0] if step % 2 else [1.0, 0.0])
+        assert state.tolist() == [GuideState.MOVING.value, 0]
+
+
+def test_seek_with_stride(tmp_path):
+    record(tmp_path, range(5, 40, 5), capacity=3, stride=5)
+    store = TrajectoryStore.open(str(tmp_path))
+    assert store.row_for(5) == 0
+    assert store.row_for(35) == 6
+    with pytest.raises(KeyError):
+        store.row_for(7)  # 記録していないステップ
+    with pytest.raises(KeyError):
+        store.row_for(40)  # 範囲外
+    # exact=False なら手前の記録、範囲外は最初・最後の行
+    assert store.row_for(7, exact=False) == 0
+    assert store.row_for(24, exact=False) == 3
+    assert store.row_for(-10, exact=False) == 0
+    assert store.row_for(1000, exact=False) == 6
+
+
+def test_record_rejects_steps_off_stride(tmp_path):
+    agents = [Walker("a")]
+    with TrajectoryStore.create(str(tmp_path), agents, 4, stride=2) as store:
+        store.record(0)
+        with pytest.raises(ValueError):
+            store.record(3)
+
+
+def test_apply_and_export_csv(tmp_path):
+    agents = record(tmp_path / "store", range(4), capacity=1)
+    store = TrajectoryStore.open(str(tmp_path / "store"))
+    targets = {agent.unique_id: Walker(agent.unique_id) for agent in agents}
+    store.apply(2, targets)
+    assert targets["bb"].pos == (2.0, 3.0)
+    assert targets["a"].state == GuideState.MOVING
+
+    csv_path = tmp_path / "positions.csv"
+    store.export_csv(str(csv_path), chunk_steps=3)
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 8
+    assert rows[-1] == {"step": "3", "agent_type": "Walker", "unique_id": "bb", "x": "3.0", "y": "3.5"}
+
+
+def test_headless_run_is_replayable(small_model, tmp_path):
+    model = small_model(num_visitors=5, num_guides=1)
+    summary = run_simulation(model, 25, str(tmp_path))
+    store = TrajectoryStore.open(str(tmp_path / "trajectory"))
+    assert len(store) == summary["steps"] == 25
+    assert store.step_range() == (0, 24)
+    agents = mobile_agents(model)
+    assert store.meta["unique_ids"] == [agent.unique_id for agent in agents]
+    positions, _, _ = store.frame(24)
+    np.testing.assert_allclose(positions, [np.asarray(agent.pos, dtype=float) for agent in agents], rtol=1e-6)
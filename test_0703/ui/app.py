@@ -10,53 +10,20 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'c
 
 import pygame
 import time
-import random
 from core.museum import Museum
-from utils.logger import log_guide_positions
+from utils.trajectory import mobile_agents
+from utils.trajectory_store import TrajectoryStore
+from ui.layers import StaticLayer, DirtyRectRenderer
+from ui.resources import UIResources, FrameTimer
+from ui.sim_thread import SimulationThread, Snapshot, take_snapshot, interpolate
+from agents.guide import Guide, GuideState
 import config
 
 
 
 
 # --- jsonレイアウト反映（1か所のみ） ---
-import json
-def load_layout_from_json(json_path):
-    with open(json_path, encoding="utf-8") as f:
-        data = json.load(f)
-    grid = data["map"]
-    h, w = len(grid), len(grid[0])
-    obstacle_list = []
-    exhibit_grid = [[False]*w for _ in range(h)]
-    for y, row in enumerate(grid):
-        for x, v in enumerate(row):
-            if v == 1:
-                obstacle_list.append((x, y))
-            elif v == 2:
-                exhibit_grid[y][x] = True
-    # --- 展示物: 連結成分ごとに1つの展示物とみなす ---
-    from collections import deque
-    visited = [[False]*w for _ in range(h)]
-    exhibit_groups = []
-    for y in range(h):
-        for x in range(w):
-            if exhibit_grid[y][x] and not visited[y][x]:
-                # BFSで連結成分を探索
-                q = deque()
-                q.append((x, y))
-                group = []
-                visited[y][x] = True
-                while q:
-                    cx, cy = q.popleft()
-                    group.append((cx, cy))
-                    for dx, dy in [(-1,0),(1,0),(0,-1),(0,1)]:
-                        nx, ny = cx+dx, cy+dy
-                        if 0<=nx<w and 0<=ny<h and exhibit_grid[ny][nx] and not visited[ny][nx]:
-                            visited[ny][nx] = True
-                            q.append((nx, ny))
-                exhibit_groups.append(group)
-    # グループごとに中心座標も計算
-    exhibit_centers = [ (sum(p[0] for p in group)/len(group), sum(p[1] for p in group)/len(group)) for group in exhibit_groups ]
-    return obstacle_list, exhibit_centers, exhibit_groups
+from core.map_loader import load_map
 
 MAP_JSON_PATH = r"D:\高橋研\高橋研_シミュレーション実装\test_0703\map_json\map1.json"
 print(f"[DEBUG] MAP_JSON_PATH = {MAP_JSON_PATH}")
@@ -64,14 +31,13 @@ if not os.path.exists(MAP_JSON_PATH):
     print(f"[ERROR] 指定されたMAP_JSON_PATHが存在しません: {MAP_JSON_PATH}")
     print(f"[INFO] カレントディレクトリ: {os.getcwd()}")
     raise FileNotFoundError(f"MAP_JSON_PATHが存在しません: {MAP_JSON_PATH}")
-obstacle_list, exhibit_centers, exhibit_groups = load_layout_from_json(MAP_JSON_PATH)
-def to_obstacle_lines_from_points(points):
-    return [[pt, pt] for pt in points]
-OBSTACLE_LINES = to_obstacle_lines_from_points(obstacle_list)
-GUIDE_DESTINATIONS = exhibit_centers
-EXHIBIT_GROUPS = exhibit_groups
+layout = load_map(MAP_JSON_PATH)
+OBSTACLE_CELLS = layout.obstacles  # 障害物セルの (N, 2) 配列（Environmentにまとめて配置する）
+GUIDE_DESTINATIONS = [tuple(center) for center in layout.exhibit_centers.tolist()]
+EXHIBIT_GROUPS = layout.exhibit_groups()
 log_ob_path = config.DEFAULT_LOG_OB_PATH
 AGENT_POSITION_LOG_PATH = config.DEFAULT_AGENT_POSITION_LOG_PATH
+TRAJECTORY_DIR = config.DEFAULT_TRAJECTORY_DIR
 
 # --- パラメータ設定 ---
 WIDTH = config.DEFAULT_WIDTH
@@ -86,6 +52,21 @@ NUM_VISITORS = config.DEFAULT_NUM_VISITORS
 NUM_GUIDES = config.DEFAULT_NUM_GUIDES
 NUM_EXHIBITS = len(EXHIBIT_GROUPS)  # 展示物数はjsonから取得
 
+# --- 記録済み軌跡の再生モード（python ui/app.py --replay <軌跡ストアのディレクトリ>） ---
+# 再生中は Museum.step を実行せず、ストアから各ステップの位置・視線・案内人の状態を読み込んで描画する
+REPLAY_PATH = sys.argv[sys.argv.index("--replay") + 1] if "--replay" in sys.argv[:-1] else config.DEFAULT_REPLAY_PATH
+replay_store = None
+if REPLAY_PATH:
+    replay_store = TrajectoryStore.open(REPLAY_PATH)
+    if len(replay_store) == 0:
+        raise ValueError(f"軌跡が記録されていません: {REPLAY_PATH}")
+    NUM_VISITORS = replay_store.meta["agent_types"].count("Visitor")
+    NUM_GUIDES = replay_store.meta["agent_types"].count("Guide")
+    STEPS = replay_store.step_range()[1] + 1
+REPLAY_SEEK_STEPS = 100  # ←→キーで移動するステップ数
+# 描画フレームレートの上限（python ui/app.py --fps <値>）。再生速度は経過時間で進めるので、上限を変えても変わらない
+FPS = int(sys.argv[sys.argv.index("--fps") + 1]) if "--fps" in sys.argv[:-1] else config.DEFAULT_FPS
+
 
 
 # --- Pygame初期化 ---
@@ -113,29 +94,55 @@ screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.RESIZABLE
 pygame.display.set_caption("見学施設シミュレーション (Pygame)")
 clock = pygame.time.Clock()
 
-random.seed(1)
-np.random.seed(1)
-model = Museum(
-    WIDTH, HEIGHT, NUM_VISITORS, NUM_GUIDES, NUM_EXHIBITS, 0,
-    guide_start_pos=GUIDE_START_POS,
-    guide_destinations=GUIDE_DESTINATIONS,
-    obstacle_lines=OBSTACLE_LINES,
-    visitor_start_pos=config.DEFAULT_VISITOR_START_POS
-)
-model.dc.collect(model)
+SEED = 1  # 再生のたびに同じ結果になるよう、モデルの乱数はこのシードから作る
+# 記録の再生ではモデルを作らず、壁・展示物の描画にはマップのレイアウトだけを使う
+model = None
+if replay_store is None:
+    model = Museum(
+        WIDTH, HEIGHT, NUM_VISITORS, NUM_GUIDES, NUM_EXHIBITS, 0,
+        guide_start_pos=GUIDE_START_POS,
+        guide_destinations=GUIDE_DESTINATIONS,
+        obstacle_cells=OBSTACLE_CELLS,
+        visitor_start_pos=config.DEFAULT_VISITOR_START_POS,
+        seed=SEED
+    )
+    model.dc.collect(model)
 
 if os.path.dirname(LOG_FILE_PATH):
     os.makedirs(os.path.dirname(LOG_FILE_PATH), exist_ok=True)
 with open(LOG_FILE_PATH, "w", encoding="utf-8") as log_file:
     log_file.write("シミュレーションログ\n")
 
-if os.path.dirname(AGENT_POSITION_LOG_PATH):
-    os.makedirs(os.path.dirname(AGENT_POSITION_LOG_PATH), exist_ok=True)
-with open(AGENT_POSITION_LOG_PATH, "w", encoding="utf-8") as f:
-    f.write("step,agent_type,unique_id,x,y\n")
-
-def draw_grid(screen, model, cell_size, margin):
-    screen.fill((255, 255, 255))
+# 位置・視線・案内人の状態はメモリマップの軌跡ストアに記録する（CSVは終了時に必要なら書き出す）
+store = None
+if replay_store is None:
+    store = TrajectoryStore.create(TRAJECTORY_DIR, mobile_agents(model), STEPS)
+
+# シミュレーションは別スレッドで進め、描画ループはスナップショットを補間して再生する
+THREADED_SIM = config.DEFAULT_THREADED_SIM
+BASE_STEPS_PER_SECOND = 90  # 再生速度 x1 のときの1秒あたりのステップ数（従来の 3ステップ/フレーム × 30fps）
+PLAYBACK_SPEEDS = [0.25, 0.5, 1, 2, 4, 8, 16]
+sim_thread = None
+
+def start_sim_thread():
+    global sim_thread
+    sim_thread = SimulationThread(model, mobile_agents(model), STEPS, on_step=store.record)
+    sim_thread.start()
+
+def replay_snapshot(t):
+    # 記録済みの軌跡から、再生位置 t の前後2ステップを補間したスナップショットを作る
+    base = int(np.floor(t))
+    positions, gaze, states = replay_store.frame(base, exact=False)
+    a = Snapshot(base, positions, gaze, states)
+    if t <= base or base + 1 > STEPS - 1:
+        return a
+    return interpolate(a, Snapshot(base + 1, *replay_store.frame(base + 1, exact=False)), t - base)
+
+# 壁・展示物は拡大率ごとに一度だけ描画し、毎フレームは動く要素の矩形だけを更新する
+renderer = DirtyRectRenderer(StaticLayer(layout.occupancy if model is None else model.grid.occupancy, EXHIBIT_GROUPS))
+
+def draw_grid(screen, snapshot, is_guide, cell_size, margin):
+    # snapshot: 描画するステップの位置・視線（Snapshot）、is_guide: 各行が案内人かどうか
     win_w, win_h = screen.get_size()
     
     ### 変更点 ###
@@ -145,59 +152,31 @@ def draw_grid(screen, model, cell_size, margin):
     offset_x = (win_w - total_grid_width) / 2
     offset_y = (win_h - total_grid_height) / 2
 
-    # --- 障害物セルを直接描画 ---
-    if hasattr(model, 'grid'):
-        for x_grid in range(model.grid.width):
-            for y_grid in range(model.grid.height):
-                if model.grid.is_obstacle((x_grid, y_grid)):
-                    rect = pygame.Rect(
-                        offset_x + x_grid * cell_size,
-                        offset_y + y_grid * cell_size,
-                        cell_size, cell_size
-                    )
-                    pygame.draw.rect(screen, (100, 100, 100), rect)
-
-    # 展示物（jsonの値そのまま、1マスずつ真四角で描画）
-    for group in EXHIBIT_GROUPS:
-        for (x, y) in group:
-            rect = pygame.Rect(
-                offset_x + x * cell_size,
-                offset_y + y * cell_size,
-                cell_size, cell_size
-            )
-            pygame.draw.rect(screen, (0, 200, 0), rect)
-
-    # エージェント
-    for agent in model.schedule.agents:
-        if agent.__class__.__name__.lower().startswith('exhibit'): continue
-        pos = getattr(agent, 'pos', None)
-        if pos is None: continue
-        
+    # 障害物セル・展示物は静的レイヤーから塗り戻す（前フレームのエージェントを消す）
+    renderer.begin(screen, cell_size, (offset_x, offset_y))
+
+    # エージェント（案内人・見学者）
+    for i, guide in enumerate(is_guide):
         ### 変更点 ###
         # 整数に丸めず、float座標をそのまま使って滑らかに描画
-        x_float, y_float = pos
+        x_float, y_float = snapshot.positions[i]
         cx = offset_x + x_float * cell_size + cell_size / 2
         cy = offset_y + y_float * cell_size + cell_size / 2
 
-        cls_name = agent.__class__.__name__.lower()
-        if cls_name.startswith('guide') or cls_name.startswith('visitor'):
-            color = (0, 128, 255) if cls_name.startswith('guide') else (255, 0, 0)
-            gaze = getattr(agent, 'gaze_direction', None)
-            if gaze is not None and np.linalg.norm(gaze) > 0:
-                import math
-                angle = math.atan2(gaze[1], gaze[0])
-                r = cell_size / 2 - 2
-                tip = (int(cx + r * math.cos(angle)), int(cy + r * math.sin(angle)))
-                base_angle1 = angle + math.radians(130)
-                base_angle2 = angle - math.radians(130)
-                base1 = (int(cx + r * 0.7 * math.cos(base_angle1)), int(cy + r * 0.7 * math.sin(base_angle1)))
-                base2 = (int(cx + r * 0.7 * math.cos(base_angle2)), int(cy + r * 0.7 * math.sin(base_angle2)))
-                pygame.draw.polygon(screen, color, [tip, base1, base2])
-            else:
-                pygame.draw.ellipse(screen, color, pygame.Rect(cx - cell_size/2, cy - cell_size/2, cell_size, cell_size))
+        color = (0, 128, 255) if guide else (255, 0, 0)
+        gaze = snapshot.gaze[i]
+        if np.linalg.norm(gaze) > 0:
+            import math
+            angle = math.atan2(gaze[1], gaze[0])
+            r = cell_size / 2 - 2
+            tip = (int(cx + r * math.cos(angle)), int(cy + r * math.sin(angle)))
+            base_angle1 = angle + math.radians(130)
+            base_angle2 = angle - math.radians(130)
+            base1 = (int(cx + r * 0.7 * math.cos(base_angle1)), int(cy + r * 0.7 * math.sin(base_angle1)))
+            base2 = (int(cx + r * 0.7 * math.cos(base_angle2)), int(cy + r * 0.7 * math.sin(base_angle2)))
+            renderer.track(pygame.draw.polygon(screen, color, [tip, base1, base2]))
         else:
-            color = (200, 0, 0)
-            pygame.draw.ellipse(screen, color, pygame.Rect(cx - cell_size/2, cy - cell_size/2, cell_size, cell_size))
+            renderer.track(pygame.draw.ellipse(screen, color, pygame.Rect(cx - cell_size/2, cy - cell_size/2, cell_size, cell_size)))
 
     return offset_x, offset_y
 
@@ -205,40 +184,53 @@ def main_loop():
     running = True
     paused = False
     step = 0
-    font = pygame.font.SysFont(None, 18)
+    resources = UIResources()  # フォントと文字画像は一度だけ作って使い回す
+    frame_timer = FrameTimer(resources)
+    show_timing = False  # Fキーでフレーム時間の内訳を表示
     cell_size = CELL_SIZE
     margin = MARGIN
     global screen, model
 
-    steps_per_frame = 3
+    # 同期実行（THREADED_SIM = False）のときに1フレームで進めるステップ数（1秒あたり約 BASE_STEPS_PER_SECOND ステップ）
+    steps_per_frame = max(1, round(BASE_STEPS_PER_SECOND / FPS))
+    speed_index = PLAYBACK_SPEEDS.index(1)
+    playback = -1.0  # 再生位置（表示中のスナップショットのステップ番号、小数なら前後を補間）
+    dt = 0.0
+    # スナップショットの各行が案内人かどうか（再生時は記録したエージェントの種類から）
+    if replay_store is not None:
+        is_guide = [agent_type == Guide.__name__ for agent_type in replay_store.meta["agent_types"]]
+    else:
+        is_guide = [isinstance(agent, Guide) for agent in mobile_agents(model)]
+    if replay_store is None and THREADED_SIM:
+        start_sim_thread()
 
     replay_message_timer = 0  # リプレイメッセージ表示用
-    REPLAY_MESSAGE_DURATION = 60  # フレーム数（約2秒）
+    REPLAY_MESSAGE_DURATION = 2 * FPS  # フレーム数（約2秒）
 
     def reset_simulation():
-        global model, step
-        random.seed(1)
-        np.random.seed(1)
+        global model, store
+        if sim_thread is not None:
+            sim_thread.stop()
+        model.close()
         model = Museum(
             WIDTH, HEIGHT, NUM_VISITORS, NUM_GUIDES, NUM_EXHIBITS, 0,
             guide_start_pos=GUIDE_START_POS,
             guide_destinations=GUIDE_DESTINATIONS,
-            obstacle_lines=OBSTACLE_LINES,
-            visitor_start_pos=config.DEFAULT_VISITOR_START_POS
+            obstacle_cells=OBSTACLE_CELLS,
+            visitor_start_pos=config.DEFAULT_VISITOR_START_POS,
+            seed=SEED
         )
         model.dc.collect(model)
-        step = 0
         # ログファイルもリセット
         if os.path.dirname(LOG_FILE_PATH):
             os.makedirs(os.path.dirname(LOG_FILE_PATH), exist_ok=True)
         with open(LOG_FILE_PATH, "w", encoding="utf-8") as log_file:
             log_file.write("シミュレーションログ\n")
-        if os.path.dirname(AGENT_POSITION_LOG_PATH):
-            os.makedirs(os.path.dirname(AGENT_POSITION_LOG_PATH), exist_ok=True)
-        with open(AGENT_POSITION_LOG_PATH, "w", encoding="utf-8") as f:
-            f.write("step,agent_type,unique_id,x,y\n")
-        screen.fill((255,255,255))
-        pygame.display.flip()
+        store.close()
+        store = TrajectoryStore.create(TRAJECTORY_DIR, mobile_agents(model), STEPS)
+        if THREADED_SIM:
+            start_sim_thread()
+        renderer.invalidate()
         nonlocal replay_message_timer
         replay_message_timer = REPLAY_MESSAGE_DURATION  # リプレイメッセージ表示
 
@@ -247,34 +239,59 @@ def main_loop():
             for event in pygame.event.get():
                 if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_x):
                     running = False
+                elif event.type in (pygame.VIDEOEXPOSE, pygame.VIDEORESIZE):
+                    renderer.invalidate()  # ウィンドウが再表示・変形されたら全体を描き直す
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_SPACE:
                         paused = not paused
+                    elif event.key == pygame.K_f:
+                        show_timing = not show_timing
                     elif event.key == pygame.K_UP:
                         cell_size += 2
                     elif event.key == pygame.K_DOWN and cell_size > 4:
                         cell_size -= 2
                     elif event.key == pygame.K_r:
-                        reset_simulation()
+                        if replay_store is None:
+                            reset_simulation()
+                        step = 0
+                        playback = -1.0
                         paused = False
+                    elif replay_store is not None and event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                        # 記録済みなので任意のステップへ直接移動できる
+                        delta = REPLAY_SEEK_STEPS if event.key == pygame.K_RIGHT else -REPLAY_SEEK_STEPS
+                        playback = min(max(playback + delta, -1.0), STEPS - 1.0)
+                    elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                        speed_index = min(speed_index + 1, len(PLAYBACK_SPEEDS) - 1)
+                    elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                        speed_index = max(speed_index - 1, 0)
             
-            if not paused and step < STEPS:
-                for _ in range(steps_per_frame):
-                    if step >= STEPS: break
-                    model.step()
-                    with open(AGENT_POSITION_LOG_PATH, "a", encoding="utf-8") as f:
-                        for agent in model.schedule.agents:
-                            if agent.__class__.__name__.lower().startswith(('guide', 'visitor')):
-                                f.write(f"{step},{agent.__class__.__name__},{agent.unique_id},{agent.pos[0]},{agent.pos[1]}\n")
-                    step += 1
-            offset_x, offset_y = draw_grid(screen, model, cell_size, margin)
+            frame_timer.start("sim")
+            if replay_store is not None or THREADED_SIM:
+                # 再生速度に応じて再生位置を進める（シミュレーションが追いつかなければ最新のステップで待つ）
+                if sim_thread is not None:
+                    sim_thread.check()  # シミュレーションが例外で止まっていたら、固まった画面のままにせず終了する
+                if not paused:
+                    latest = STEPS - 1 if replay_store is not None else sim_thread.latest_step()
+                    playback = min(playback + PLAYBACK_SPEEDS[speed_index] * BASE_STEPS_PER_SECOND * dt, latest)
+                snapshot = replay_snapshot(playback) if replay_store is not None else sim_thread.frame_at(playback)
+                step = int(np.floor(playback)) + 1
+            else:
+                if not paused and step < STEPS:
+                    for _ in range(steps_per_frame):
+                        if step >= STEPS: break
+                        model.step()
+                        store.record(step)
+                        step += 1
+                snapshot = take_snapshot(mobile_agents(model), step - 1)
+            frame_timer.stop("sim")
+            frame_timer.start("draw")
+            offset_x, offset_y = draw_grid(screen, snapshot, is_guide, cell_size, margin)
             
             # --- 案内人の「説明中」吹き出し描画 ---
-            for agent in model.schedule.agents:
-                 if agent.__class__.__name__.lower().startswith('guide'):
-                    is_waiting = getattr(agent, 'state', None)
-                    if is_waiting and str(is_waiting).endswith('WAITING'):
-                        pos = getattr(agent, 'pos', None)
+            for i, guide in enumerate(is_guide):
+                 if guide:
+                    if snapshot.states[i] == GuideState.WAITING.value:
+                        pos = snapshot.positions[i]
                         if pos is not None:
                             cx_float = offset_x + pos[0] * cell_size + cell_size / 2
                             cy_float = offset_y + pos[1] * cell_size + cell_size / 2
@@ -283,48 +300,54 @@ def main_loop():
 
                             bubble_w, bubble_h = 60, 28
                             bubble_rect = pygame.Rect(cx - bubble_w//2, cy - cell_size//2 - bubble_h - 8, bubble_w, bubble_h)
-                            pygame.draw.rect(screen, (255,255,220), bubble_rect, border_radius=8)
-                            pygame.draw.rect(screen, (180,180,120), bubble_rect, 2, border_radius=8)
+                            renderer.track(pygame.draw.rect(screen, (255,255,220), bubble_rect, border_radius=8))
+                            renderer.track(pygame.draw.rect(screen, (180,180,120), bubble_rect, 2, border_radius=8))
                             triangle = [(cx, cy - cell_size//2 - 8), (cx - 6, cy - cell_size//2), (cx + 6, cy - cell_size//2)]
-                            pygame.draw.polygon(screen, (255,255,220), triangle)
-                            pygame.draw.line(screen, (180,180,120), (cx-6, cy-cell_size//2), (cx, cy-cell_size//2-8), 2)
-                            pygame.draw.line(screen, (180,180,120), (cx+6, cy-cell_size//2), (cx, cy-cell_size//2-8), 2)
+                            renderer.track(pygame.draw.polygon(screen, (255,255,220), triangle))
+                            # 太さ2の枠線も吹き出しの矩形からはみ出すので、描いた範囲を更新対象に含める
+                            renderer.track(pygame.draw.line(screen, (180,180,120), (cx-6, cy-cell_size//2), (cx, cy-cell_size//2-8), 2))
+                            renderer.track(pygame.draw.line(screen, (180,180,120), (cx+6, cy-cell_size//2), (cx, cy-cell_size//2-8), 2))
 
-                            font_bubble = pygame.font.SysFont(["meiryo", "msgothic", "MS Gothic", "Yu Gothic", "Noto Sans CJK JP"], 18)
-                            text_surface = font_bubble.render("説明中", True, (80, 60, 0))
+                            text_surface = resources.text("説明中", 18, (80, 60, 0))
                             text_rect = text_surface.get_rect(center=bubble_rect.center)
-                            screen.blit(text_surface, text_rect)
+                            renderer.track(screen.blit(text_surface, text_rect))
             
-            text = font.render(f"Step: {step}/{STEPS}", True, (0, 0, 180))
-            screen.blit(text, (5, 5))
+            step_label = f"Step: {step}/{STEPS}"
+            if replay_store is not None or THREADED_SIM:
+                step_label += f"  x{PLAYBACK_SPEEDS[speed_index]:g}"
+            text = resources.text(step_label, 18, (0, 0, 180), name=None)
+            renderer.track(screen.blit(text, (5, 5)))
 
             # --- キー操作ガイド描画 ---
-            guide_font = pygame.font.SysFont(["meiryo", "msgothic", "MS Gothic", "Yu Gothic", "Noto Sans CJK JP"], 15)
             guide_lines = [
                 "SPACE: 一時停止/再開",
                 "R: リプレイ",
                 "X: 終了",
-                "↑↓: 拡大縮小"
+                "↑↓: 拡大縮小",
+                "F: 処理時間表示"
             ]
+            if replay_store is not None or THREADED_SIM:
+                guide_lines.append("+-: 再生速度")
+            if replay_store is not None:
+                guide_lines.append(f"←→: {REPLAY_SEEK_STEPS}ステップ移動")
             guide_color = (0,60,200)
             margin_top = 8
             margin_right = 8
             line_height = 18
             for i, line in enumerate(guide_lines):
-                guide_surface = guide_font.render(line, True, guide_color)
+                guide_surface = resources.text(line, 15, guide_color)
                 guide_rect = guide_surface.get_rect()
                 guide_rect.top = margin_top + i * line_height
                 guide_rect.right = screen.get_width() - margin_right
-                screen.blit(guide_surface, guide_rect)
+                renderer.track(screen.blit(guide_surface, guide_rect))
 
             # --- 状態メッセージ描画 ---
             center_x = screen.get_width() // 2
             center_y = screen.get_height() // 2
             if paused:
-                pause_font = pygame.font.SysFont(["meiryo", "msgothic", "MS Gothic", "Yu Gothic", "Noto Sans CJK JP"], 36, bold=True)
-                pause_surface = pause_font.render("一時停止中", True, (0,0,0), (255,255,200))
+                pause_surface = resources.text("一時停止中", 36, (0,0,0), (255,255,200), bold=True)
                 pause_rect = pause_surface.get_rect(center=(center_x, center_y))
-                screen.blit(pause_surface, pause_rect)
+                renderer.track(screen.blit(pause_surface, pause_rect))
             # リプレイメッセージは非表示に
             # if replay_message_timer > 0:
             #     replay_font = pygame.font.SysFont(["meiryo", "msgothic", "MS Gothic", "Yu Gothic", "Noto Sans CJK JP"], 36, bold=True)
@@ -333,13 +356,29 @@ def main_loop():
             #     screen.blit(replay_surface, replay_rect)
             #     replay_message_timer -= 1
 
-            pygame.display.flip()
-            clock.tick(30)
+            # --- 処理時間の内訳（前フレームまでの移動平均） ---
+            if show_timing:
+                for i, line in enumerate(frame_timer.lines() + [f"fps: {clock.get_fps():5.1f}"]):
+                    renderer.track(screen.blit(resources.text(line, 16, (120, 0, 120), (255, 255, 255), name=None),
+                                               (5, 25 + i * 16)))
+            renderer.end()
+            frame_timer.stop("draw")
+            frame_timer.end_frame()
+            dt = clock.tick(FPS) / 1000.0
         except Exception as e:
             import traceback
             traceback.print_exc()
             running = False
 
+    if sim_thread is not None:
+        sim_thread.stop()
+    if model is not None:
+        model.close()
+    if store is not None:
+        store.close()
+        if config.DEFAULT_EXPORT_POSITION_CSV:
+            store.export_csv(AGENT_POSITION_LOG_PATH)
+
 if __name__ == "__main__":
     main_loop()
     pygame.quit()
\ No newline at end of file
@@ -0,0 +1,91 @@
+# pygame描画のレイヤー管理のクラス定義ファイル
+# 壁・展示物など動かない要素は拡大率ごとに1枚のSurfaceへ一度だけ描画しておき、
+# 毎フレームはエージェントや文字など動く要素だけを描き直して、変化した矩形だけを画面に反映します。
+
+import numpy as np
+import pygame
+
+BACKGROUND_COLOR = (255, 255, 255)
+OBSTACLE_COLOR = (100, 100, 100)
+EXHIBIT_COLOR = (0, 200, 0)
+
+
+class StaticLayer:
+    """
+    壁・展示物の静的レイヤー
+    - 1セル1画素の色配列を作っておき、拡大率（cell_size）ごとに拡大したSurfaceをキャッシュする
+    """
+    def __init__(self, occupancy, exhibit_groups, max_cached=4):
+        # occupancy: [x, y] の障害物ビットマップ
+        # exhibit_groups: 展示物セルのリストのリスト
+        w, h = occupancy.shape
+        colors = np.empty((w, h, 3), dtype=np.uint8)
+        colors[:] = BACKGROUND_COLOR
+        colors[occupancy] = OBSTACLE_COLOR
+        for group in exhibit_groups:
+            for x, y in group:
+                if 0 <= x < w and 0 <= y < h:
+                    colors[x, y] = EXHIBIT_COLOR
+        self.colors = colors
+        self.max_cached = max_cached
+        self._surfaces = {}
+
+    def surface_for(self, cell_size):
+        surface = self._surfaces.get(cell_size)
+        if surface is None:
+            w, h = self.colors.shape[:2]
+            surface = pygame.transform.scale(pygame.surfarray.make_surface(self.colors), (w * cell_size, h * cell_size))
+            if len(self._surfaces) >= self.max_cached:
+                self._surfaces.pop(next(iter(self._surfaces)))
+            self._surfaces[cell_size] = surface
+        return surface
+
+
+class DirtyRectRenderer:
+    """
+    差分描画
+    - begin: 前フレームで描いた矩形の下を背景（白地＋静的レイヤー）で塗り戻す
+    - track: そのフレームで描いた矩形を記録する（pygame.draw / blit の戻り値を渡す）
+    - end: 塗り戻した矩形と新しく描いた矩形だけを pygame.display.update に渡す
+    拡大率やウィンドウサイズが変わったフレームは画面全体を描き直す
+    """
+    def __init__(self, static_layer):
+        self.static_layer = static_layer
+        self._background = None
+        self._background_key = None
+        self._previous = []
+        self._current = []
+        self._full_redraw = True
+        self._screen = None
+
+    def invalidate(self):
+        """次のフレームで画面全体を描き直す（レイアウトを差し替えたときなど）"""
+        self._full_redraw = True
+
+    def begin(self, screen, cell_size, offset):
+        key = (screen.get_size(), cell_size, (int(offset[0]), int(offset[1])))
+        if key != self._background_key:
+            self._background = pygame.Surface(screen.get_size())
+            self._background.fill(BACKGROUND_COLOR)
+            self._background.blit(self.static_layer.surface_for(cell_size), key[2])
+            self._background_key = key
+            self._full_redraw = True
+        self._screen = screen
+        if self._full_redraw:
+            screen.blit(self._background, (0, 0))
+        else:
+            for rect in self._previous:
+                screen.blit(self._background, rect, rect)
+        self._current = []
+
+    def track(self, rect):
+        self._current.append(rect)
+        return rect
+
+    def end(self):
+        if self._full_redraw:
+            pygame.display.flip()
+            self._full_redraw = False
+        else:
+            pygame.display.update(self._previous + self._current)
+        self._previous = [rect.inflate(2, 2) for rect in self._current]
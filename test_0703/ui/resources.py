@@ -0,0 +1,84 @@
+# pygame UIのリソース（フォント・文字画像）キャッシュと、フレーム時間計測のクラス定義ファイル
+# SysFont の検索は重いので、(フォント名, サイズ, 太字) ごとに一度だけ解決し、
+# 同じ文字列・色の描画結果（Surface）も使い回します。
+# FrameTimer はシミュレーション・描画・フォント処理の時間をフレームごとに集計して画面に表示します。
+
+import time
+from collections import OrderedDict
+import pygame
+
+JAPANESE_FONTS = ["meiryo", "msgothic", "MS Gothic", "Yu Gothic", "Noto Sans CJK JP"]
+
+
+class UIResources:
+    """
+    フォントと文字画像のキャッシュ
+    - font(size, bold, name): SysFont を一度だけ解決して使い回す（name=None で日本語フォント一覧）
+    - text(...): 同じ引数の描画結果を使い回す（最大 max_texts 件のLRU）
+    - font_time: フォント解決・文字描画に使った累積秒数（FrameTimerの内訳表示用）
+    """
+    def __init__(self, max_texts=512):
+        self.max_texts = max_texts
+        self._fonts = {}
+        self._texts = OrderedDict()
+        self.font_time = 0.0
+
+    def font(self, size, bold=False, name=JAPANESE_FONTS):
+        key = (tuple(name) if isinstance(name, list) else name, size, bold)
+        font = self._fonts.get(key)
+        if font is None:
+            start = time.perf_counter()
+            font = pygame.font.SysFont(name, size, bold=bold)
+            self.font_time += time.perf_counter() - start
+            self._fonts[key] = font
+        return font
+
+    def text(self, content, size, color, background=None, bold=False, name=JAPANESE_FONTS):
+        key = (content, size, tuple(color), tuple(background) if background else None, bold,
+               tuple(name) if isinstance(name, list) else name)
+        surface = self._texts.get(key)
+        if surface is not None:
+            self._texts.move_to_end(key)
+            return surface
+        font = self.font(size, bold, name)
+        start = time.perf_counter()
+        surface = font.render(content, True, color, background)
+        self.font_time += time.perf_counter() - start
+        self._texts[key] = surface
+        if len(self._texts) > self.max_texts:
+            self._texts.popitem(last=False)
+        return surface
+
+
+class FrameTimer:
+    """
+    フレームごとの時間内訳（シミュレーション・描画・フォント）
+    - start(name) / stop(name): 区間の時間を加算する
+    - end_frame(): そのフレームの値を指数移動平均に反映する
+    """
+    def __init__(self, resources, smoothing=0.1):
+        self.resources = resources
+        self.smoothing = smoothing
+        self.averages = {"sim": 0.0, "draw": 0.0, "font": 0.0}
+        self._frame = dict.fromkeys(self.averages, 0.0)
+        self._started = {}
+        self._font_mark = resources.font_time
+
+    def start(self, name):
+        self._started[name] = time.perf_counter()
+
+    def stop(self, name):
+        self._frame[name] += time.perf_counter() - self._started.pop(name)
+
+    def end_frame(self):
+        font_time = self.resources.font_time - self._font_mark
+        self._font_mark = self.resources.font_time
+        self._frame["font"] = font_time
+        # フォント処理は描画区間の中で行われるので、描画時間からは差し引いて表示する
+        self._frame["draw"] = max(self._frame["draw"] - font_time, 0.0)
+        for name, value in self._frame.items():
+            self.averages[name] += (value - self.averages[name]) * self.smoothing
+            self._frame[name] = 0.0
+
+    def lines(self):
+        return [f"{name}: {value * 1000:5.1f} ms" for name, value in self.averages.items()]
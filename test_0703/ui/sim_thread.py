@@ -0,0 +1,119 @@
+# シミュレーションを描画ループから切り離して進めるスレッドのクラス定義ファイル
+# 別スレッドで Museum.step を回し、各ステップ後の位置・視線・案内人の状態を読み取り専用の
+# スナップショットとして上限付きのリングバッファに積みます。描画側は再生位置（小数のステップ）に
+# 応じて前後2枚のスナップショットを補間して描くので、再生速度はシミュレーションの重さと無関係に決められます。
+# pygameに依存しないので、描画なしでも使えます。
+
+import threading
+from collections import deque
+from typing import NamedTuple
+
+import numpy as np
+
+from utils.trajectory_store import fill_agent_state
+
+
+class Snapshot(NamedTuple):
+    """1ステップ分の描画用の状態（配列は書き込み不可）"""
+    step: int
+    positions: np.ndarray  # (N, 2)
+    gaze: np.ndarray  # (N, 2)
+    states: np.ndarray  # (N,) GuideState.value（案内人以外は0）
+
+
+def take_snapshot(agents, step):
+    """agents の現在の状態から Snapshot を作る"""
+    n = len(agents)
+    positions = np.empty((n, 2), dtype=np.float32)
+    gaze = np.empty((n, 2), dtype=np.float32)
+    states = np.empty(n, dtype=np.int8)
+    fill_agent_state(agents, positions, gaze, states)
+    for array in (positions, gaze, states):
+        array.flags.writeable = False
+    return Snapshot(step, positions, gaze, states)
+
+
+def interpolate(a, b, t):
+    """a→b を t (0〜1) で補間した Snapshot（状態は a のもの、視線は正規化し直す）"""
+    positions = a.positions + (b.positions - a.positions) * t
+    gaze = a.gaze + (b.gaze - a.gaze) * t
+    norm = np.hypot(gaze[:, 0], gaze[:, 1])
+    valid = norm > 1e-6
+    gaze[valid] /= norm[valid, None]
+    return Snapshot(a.step, positions, gaze, a.states)
+
+
+class SimulationThread(threading.Thread):
+    """
+    シミュレーションの生産者スレッド
+    - バッファが buffer_size 枚に達したら、描画側が読み進めるまで待つ
+    - frame_at(t): 再生位置 t（ステップ）のスナップショットを補間して返し、t より古いものは捨てる
+    - on_step(step): 各ステップ後にこのスレッド上で呼ぶ処理（軌跡の記録など）
+    - error: Museum.step などが送出した例外（描画側は check で自分のスレッドに送出し直す）
+    """
+    def __init__(self, model, agents, max_steps, start_step=0, buffer_size=256, on_step=None):
+        super().__init__(daemon=True)
+        self.model = model
+        self.agents = list(agents)
+        self.max_steps = max_steps
+        self.next_step = start_step
+        self.buffer_size = buffer_size
+        self.on_step = on_step
+        self.error = None
+        self._buffer = deque([take_snapshot(self.agents, start_step - 1)])
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    def run(self):
+        try:
+            while self.next_step < self.max_steps and self.model.running:
+                with self._condition:
+                    while len(self._buffer) >= self.buffer_size and not self._stopped:
+                        self._condition.wait()
+                    if self._stopped:
+                        return
+                step = self.next_step
+                self.model.step()
+                if self.on_step is not None:
+                    self.on_step(step)
+                snapshot = take_snapshot(self.agents, step)
+                with self._condition:
+                    self._buffer.append(snapshot)
+                    self._condition.notify_all()
+                self.next_step = step + 1
+        except Exception as e:
+            self.error = e
+            raise
+
+    def check(self):
+        """生産中に例外で止まっていれば、呼び出し側のスレッドで RuntimeError として送出する"""
+        if self.error is not None:
+            raise RuntimeError(f"シミュレーションスレッドが停止しました: {self.error!r}") from self.error
+
+    def latest_step(self):
+        """バッファにある最新のステップ番号"""
+        with self._condition:
+            return self._buffer[-1].step
+
+    def frame_at(self, t):
+        with self._condition:
+            # 補間に使う直前の1枚だけ残して古いものを捨て、空いた分を生産者に知らせる
+            dropped = False
+            while len(self._buffer) >= 2 and self._buffer[1].step <= t:
+                self._buffer.popleft()
+                dropped = True
+            if dropped:
+                self._condition.notify_all()
+            a = self._buffer[0]
+            b = self._buffer[1] if len(self._buffer) >= 2 else None
+        if b is None or t <= a.step:
+            return a
+        return interpolate(a, b, (t - a.step) / (b.step - a.step))
+
+    def stop(self, timeout=None):
+        """生産を止めてスレッドの終了を待つ（実行中の1ステップは最後まで進む）"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self.is_alive():
+            self.join(timeout)
@@ -3,6 +3,9 @@
 # シミュレーションの進行状況を外部ファイルに保存する用途で利用します。
 
 import os
+import numpy as np
+from agents.guide import Guide
+from agents.visitor import Visitor
 
 def log_guide_positions(model, log_file_path):
     # model: シミュレーションモデル
@@ -10,15 +13,19 @@ def log_guide_positions(model, log_file_path):
     # 各ステップごとにガイドのIDと座標を記録します。
     with open(log_file_path, "a", encoding="utf-8") as log_file:
         log_file.write(f"Step {model.schedule.steps}:\n")
-        for agent in model.schedule.agents:
-            if agent.__class__.__name__ == "Guide":
-                log_file.write(f"  {agent.unique_id}: {agent.pos}\n")
+        for agent in model.schedule.agents_of(Guide):
+            log_file.write(f"  {agent.unique_id}: {agent.pos}\n")
 
 def log_visitor_scores(model, log_file_path):
     # 各見学者の展示物ごとの滞在スコアを記録
     with open(log_file_path, "w", encoding="utf-8") as log_file:
         log_file.write("visitor_id,exhibit_id,watch_time\n")
-        for agent in model.schedule.agents:
-            if agent.__class__.__name__.lower().startswith('visitor'):
-                for eid, score in getattr(agent, 'exhibit_watch_times', {}).items():
-                    log_file.write(f"{agent.unique_id},{eid},{score}\n")
+        accumulator = getattr(model, 'watch_times', None)
+        if accumulator is not None:
+            # モデルの視聴時間行列から書き出す
+            for i, j in np.argwhere(accumulator.counts):
+                log_file.write(f"{accumulator.visitor_ids[i]},{accumulator.exhibits[j].unique_id},{accumulator.counts[i, j]}\n")
+            return
+        for agent in model.schedule.agents_of(Visitor):
+            for eid, score in getattr(agent, 'exhibit_watch_times', {}).items():
+                log_file.write(f"{agent.unique_id},{eid},{score}\n")
@@ -0,0 +1,35 @@
+# エージェントの軌跡の記録対象とCSV出力の関数定義ファイル
+# 軌跡そのものは utils.trajectory_store の軌跡ストアに記録します（ヘッドレス実行・UIで共通の形式）。
+# CSV（step,agent_type,unique_id,x,y）は必要なときだけ TrajectoryStore.export_csv で作ります。
+
+import os
+import numpy as np
+import pandas as pd
+
+from agents.guide import Guide
+from agents.visitor import Visitor
+
+
+def mobile_agents(model):
+    """記録対象（案内人・見学者）のエージェントをスケジュール順で返す"""
+    return list(model.schedule.agents_of(Guide, Visitor))
+
+
+def write_position_csv(csv_path, unique_ids, agent_types, chunks):
+    """(steps, positions) のチャンク列を step,agent_type,unique_id,x,y のCSVに書き出す"""
+    unique_ids = np.array(unique_ids, dtype=object)
+    agent_types = np.array(agent_types, dtype=object)
+    n = len(unique_ids)
+    if os.path.dirname(csv_path):
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        f.write("step,agent_type,unique_id,x,y\n")
+        for steps, positions in chunks:
+            frame = pd.DataFrame({
+                "step": np.repeat(steps, n),
+                "agent_type": np.tile(agent_types, len(steps)),
+                "unique_id": np.tile(unique_ids, len(steps)),
+                "x": positions[:, :, 0].ravel(),
+                "y": positions[:, :, 1].ravel(),
+            })
+            frame.to_csv(f, header=False, index=False, lineterminator="\n")
@@ -0,0 +1,206 @@
+# メモリマップ方式の軌跡ストアのクラス定義ファイル
+# 1回の実行の位置・視線・案内人の状態を、ステップを行とした固定長の .npy ファイルに
+# np.memmap で直接書き込みます。行番号は (step - first_step) // stride で求まるので、
+# 再生・解析側は任意のステップへO(1)で移動し、必要な行だけをディスクから読み込めます。
+#
+# ストアディレクトリの中身:
+#   meta.json         エージェントのID・種類、記録したステップ数、first_step, stride
+#   steps.npy         (容量,) 各行のステップ番号（未記録は -1）
+#   positions.npy     (容量, エージェント数, 2) 座標 (float32)
+#   gaze.npy          (容量, エージェント数, 2) 視線方向 (float32)
+#   state.npy         (容量, エージェント数) 案内人の状態 GuideState.value（見学者は0）(int8)
+
+import json
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from agents.guide import GuideState
+from utils.trajectory import write_position_csv
+
+META_FILE = "meta.json"
+FIELDS = {
+    "positions": (2, np.float32),
+    "gaze": (2, np.float32),
+    "state": (None, np.int8),
+}
+
+
+def fill_agent_state(agents, positions, gaze, state):
+    """agents の位置・視線・状態（GuideState.value、案内人以外は0）を与えられた配列の行に書き込む"""
+    for i, agent in enumerate(agents):
+        positions[i] = agent.pos
+        gaze[i] = getattr(agent, 'gaze_direction', (0.0, 0.0))
+        agent_state = getattr(agent, 'state', None)
+        state[i] = agent_state.value if isinstance(agent_state, GuideState) else 0
+
+
+class TrajectoryStore:
+    """
+    軌跡のメモリマップストア
+    - TrajectoryStore.create(path, agents, capacity): 書き込み用に作成し、record(step) で1行ずつ追記
+    - TrajectoryStore.open(path): 読み込み用に開き、frame(step) / apply(step, agents) で任意ステップを参照
+    """
+    def __init__(self, path, meta, arrays, writable, agents=None):
+        self.path = path
+        self.meta = meta
+        self.steps = arrays["steps"]
+        self.positions = arrays["positions"]
+        self.gaze = arrays["gaze"]
+        self.state = arrays["state"]
+        self.writable = writable
+        self.agents = agents
+
+    @classmethod
+    def create(cls, path, agents, capacity, stride=1):
+        """
+        書き込み用ストアを作成する（path の既存ストアは上書き）
+        - agents: 記録するエージェントのリスト（列の順番）
+        - capacity: 予定している記録回数（超えたら倍に拡張する）
+        - stride: 記録するステップ間隔（record に渡すステップ番号の間隔）
+        """
+        agents = list(agents)
+        os.makedirs(path, exist_ok=True)
+        meta = {
+            "unique_ids": [agent.unique_id for agent in agents],
+            "agent_types": [agent.__class__.__name__ for agent in agents],
+            "count": 0,
+            "first_step": None,
+            "stride": int(stride),
+        }
+        arrays = cls._allocate(path, len(agents), max(1, int(capacity)))
+        store = cls(path, meta, arrays, True, agents)
+        store._write_meta()
+        return store
+
+    @classmethod
+    def open(cls, path):
+        """読み込み専用で開く（配列はメモリマップなので、参照した行だけが読み込まれる）"""
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ("steps",) + tuple(FIELDS)}
+        return cls(path, meta, arrays, False)
+
+    @staticmethod
+    def _allocate(path, num_agents, capacity, old=None):
+        arrays = {"steps": open_memmap(os.path.join(path, "steps.npy.tmp"), mode="w+", dtype=np.int64, shape=(capacity,))}
+        arrays["steps"][:] = -1
+        for name, (width, dtype) in FIELDS.items():
+            shape = (capacity, num_agents) if width is None else (capacity, num_agents, width)
+            arrays[name] = open_memmap(os.path.join(path, f"{name}.npy.tmp"), mode="w+", dtype=dtype, shape=shape)
+        if old is not None:
+            for name, array in old.items():
+                arrays[name][:len(array)] = array
+        for name in list(arrays):
+            arrays[name].flush()
+            del arrays[name]
+            os.replace(os.path.join(path, f"{name}.npy.tmp"), os.path.join(path, f"{name}.npy"))
+            arrays[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r+")
+        return arrays
+
+    def _write_meta(self):
+        tmp_path = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.path, META_FILE))
+
+    def __len__(self):
+        return self.meta["count"]
+
+    @property
+    def capacity(self):
+        return len(self.steps)
+
+    def step_range(self):
+        """記録されている (最初のステップ, 最後のステップ)。未記録なら None"""
+        if len(self) == 0:
+            return None
+        return self.meta["first_step"], int(self.steps[len(self) - 1])
+
+    # --- 書き込み ---
+    def record(self, step):
+        """self.agents の現在の位置・視線・状態を step の行として書き込む"""
+        row = self.meta["count"]
+        if row == 0:
+            self.meta["first_step"] = int(step)
+        elif step != self.meta["first_step"] + row * self.meta["stride"]:
+            raise ValueError(f"ステップ {step} は stride={self.meta['stride']} の並びになっていません")
+        if row == self.capacity:
+            self._grow()
+        fill_agent_state(self.agents, self.positions[row], self.gaze[row], self.state[row])
+        self.steps[row] = step
+        self.meta["count"] = row + 1
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        old = {name: np.array(getattr(self, name)) for name in ("steps",) + tuple(FIELDS)}
+        # 古いメモリマップを先に手放す（開いたままだとファイルを置き換えられない環境がある）
+        self.steps = self.positions = self.gaze = self.state = None
+        arrays = self._allocate(self.path, len(self.meta["unique_ids"]), capacity, old)
+        self.steps = arrays["steps"]
+        self.positions = arrays["positions"]
+        self.gaze = arrays["gaze"]
+        self.state = arrays["state"]
+
+    def flush(self):
+        """書き込んだ行をディスクに反映し、meta.json の記録数を更新する"""
+        if not self.writable:
+            return
+        for name in ("steps",) + tuple(FIELDS):
+            getattr(self, name).flush()
+        self._write_meta()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # --- 読み込み ---
+    def row_for(self, step, exact=True):
+        """
+        step が何行目に記録されているか（O(1)）
+        - exact=True: 記録されていなければ KeyError
+        - exact=False: step 以前で最も近い記録の行（範囲外は最初・最後の行）
+        """
+        if len(self) == 0:
+            raise KeyError(step)
+        offset = step - self.meta["first_step"]
+        row, remainder = divmod(offset, self.meta["stride"])
+        if not exact:
+            return min(max(row, 0), len(self) - 1)
+        if remainder or not 0 <= row < len(self) or self.steps[row] != step:
+            raise KeyError(step)
+        return row
+
+    def frame(self, step, exact=True):
+        """step の (positions, gaze, state) を返す（メモリマップの行ビュー）"""
+        row = self.row_for(step, exact)
+        return self.positions[row], self.gaze[row], self.state[row]
+
+    def apply(self, step, agents, exact=False):
+        """
+        step の記録を agents（{unique_id: agent} またはリスト）に書き戻す
+        Museum.step を実行せずに、記録した状態を描画するときに使う
+        """
+        if not isinstance(agents, dict):
+            agents = {agent.unique_id: agent for agent in agents}
+        positions, gaze, state = self.frame(step, exact)
+        for i, unique_id in enumerate(self.meta["unique_ids"]):
+            agent = agents.get(unique_id)
+            if agent is None:
+                continue
+            agent.pos = (float(positions[i, 0]), float(positions[i, 1]))
+            agent.gaze_direction = np.array(gaze[i], dtype=float)
+            if state[i]:
+                agent.state = GuideState(int(state[i]))
+
+    def export_csv(self, csv_path, chunk_steps=4096):
+        """step,agent_type,unique_id,x,y のCSVに書き出す"""
+        count = len(self)
+        chunks = ((self.steps[start:min(start + chunk_steps, count)], self.positions[start:min(start + chunk_steps, count)])
+                  for start in range(0, count, chunk_steps))
+        write_position_csv(csv_path, self.meta["unique_ids"], self.meta["agent_types"], chunks)